@@ -3,6 +3,12 @@ __all__ = [
     "liaison_manager",
     "translator_service",
     "command_rewritter",
+    "conversion_table",
     "unit_conversion",
-    "delta_backend"
+    "delta_backend",
+    "persistent_state_cache",
+    "filters",
+    "coalescing_backend",
+    "throttled_backend",
+    "instrumented_backend",
 ]
\ No newline at end of file
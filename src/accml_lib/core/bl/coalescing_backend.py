@@ -0,0 +1,172 @@
+"""Share identical reads between concurrent consumers
+
+Typical situation: the tune monitor, the feedback controller and the
+logger read the same device property at the same time. The proxies
+here forward only one of these reads to the backend.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Sequence, Tuple
+
+from ..interfaces.backend.backend import BackendR, BackendRW
+from ..model.utils.command import Command, ReadCommand
+
+logger = logging.getLogger("accml")
+
+
+@dataclass
+class CoalescingStatistics:
+    #: reads requested by the consumers
+    requests: int = 0
+    #: reads forwarded to the backend
+    backend_reads: int = 0
+    #: reads that joined a read in flight
+    coalesced: int = 0
+    #: reads served from the freshness window
+    fresh_hits: int = 0
+
+
+def _retrieve_exception(fut: asyncio.Future):
+    # all waiters could be gone: avoid "exception never retrieved"
+    if not fut.cancelled():
+        fut.exception()
+
+
+class CoalescingBackendRProxy(BackendR):
+    """single flight reads
+
+    While a read of (dev_id, prop_id) is in flight, further reads of
+    the same property await the same result instead of issuing their
+    own. If `freshness_ms` is larger than 0, a result is also handed
+    out to reads starting within this many milliseconds after it
+    arrived.
+
+    A consumer cancelling its read does not cancel the shared read.
+    Errors are passed to all consumers waiting for the read and are
+    never cached.
+    """
+
+    def __init__(
+        self,
+        *,
+        backend: BackendR,
+        freshness_ms: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.freshness = freshness_ms * 1e-3
+        self.clock = clock
+        self.statistics = CoalescingStatistics()
+        self._in_flight: Dict[Tuple[Hashable, str], asyncio.Future] = dict()
+        self._fresh: Dict[Tuple[Hashable, str], Tuple[float, object]] = dict()
+        #: incremented by each invalidation: results of reads started
+        #: before are handed to their waiters, but not kept as fresh
+        self._generation = 0
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(backend={self.backend}, freshness_ms={self.freshness * 1e3})"
+
+    def get_natural_view_name(self):
+        return self.backend.get_natural_view_name()
+
+    async def trigger(self, dev_id: str, prop_id: str):
+        return await self.backend.trigger(dev_id=dev_id, prop_id=prop_id)
+
+    async def trigger_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        return await self.backend.trigger_many(cmds)
+
+    async def read(self, dev_id: str, prop_id: str) -> object:
+        key = (dev_id, prop_id)
+        self.statistics.requests += 1
+
+        if self.freshness > 0:
+            entry = self._fresh.get(key, None)
+            if entry is not None:
+                stamp, value = entry
+                if self.clock() - stamp <= self.freshness:
+                    self.statistics.fresh_hits += 1
+                    return value
+                del self._fresh[key]
+
+        fut = self._in_flight.get(key, None)
+        if fut is None:
+            self.statistics.backend_reads += 1
+            fut = asyncio.ensure_future(self._read(key, self._generation))
+            fut.add_done_callback(_retrieve_exception)
+            self._in_flight[key] = fut
+        else:
+            self.statistics.coalesced += 1
+        return await asyncio.shield(fut)
+
+    async def read_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        return await asyncio.gather(
+            *[self.read(dev_id=cmd.id, prop_id=cmd.property) for cmd in cmds]
+        )
+
+    async def _read(self, key: Tuple[Hashable, str], generation: int) -> object:
+        """generation: when the read was requested"""
+        dev_id, prop_id = key
+        try:
+            value = await self.backend.read(dev_id=dev_id, prop_id=prop_id)
+            if self.freshness > 0 and self._generation == generation:
+                self._fresh[key] = (self.clock(), value)
+            return value
+        finally:
+            # only if not invalidated meanwhile
+            if self._in_flight.get(key, None) is asyncio.current_task():
+                del self._in_flight[key]
+
+    def invalidate(self, dev_id: str, prop_id: str):
+        """reads from now on need to go to the backend
+
+        Reads in flight are still delivered to the consumers already
+        waiting for them
+        """
+        key = (dev_id, prop_id)
+        self._generation += 1
+        self._in_flight.pop(key, None)
+        self._fresh.pop(key, None)
+
+    def clear(self):
+        self._generation += 1
+        self._in_flight.clear()
+        self._fresh.clear()
+
+
+class CoalescingBackendRWProxy(CoalescingBackendRProxy, BackendRW):
+    """single flight reads, a set invalidates all shared results
+
+    Not only the property set: a set of a magnet changes e.g. the tune
+    or the orbit. Invalidated when the set starts and again when it is
+    done: reads made while the set is in progress can return the old
+    values, but are not shared with reads made after it.
+    """
+
+    def __init__(
+        self,
+        *,
+        backend: BackendRW,
+        freshness_ms: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(backend=backend, freshness_ms=freshness_ms, clock=clock)
+        self.backend = backend
+
+    async def set(self, dev_id: str, prop_id: str, value: object):
+        self.clear()
+        try:
+            return await self.backend.set(dev_id=dev_id, prop_id=prop_id, value=value)
+        finally:
+            self.clear()
+
+    async def set_many(self, cmds: Sequence[Command]) -> Sequence[object]:
+        self.clear()
+        try:
+            return await self.backend.set_many(cmds)
+        finally:
+            self.clear()
+
+
+__all__ = ["CoalescingBackendRProxy", "CoalescingBackendRWProxy", "CoalescingStatistics"]
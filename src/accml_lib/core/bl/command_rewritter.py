@@ -4,9 +4,14 @@ Please note:
     here we have to map (lattice_name, property) -> (device_name, property)
 """
 
-from typing import Sequence
+import logging
+from numbers import Real
+from typing import Sequence, Union
 
-from ..model.utils.command import ReadCommand
+import numpy as np
+
+from ..model.utils.command import ReadCommand, TransactionCommand
+from .unit_conversion import linear_coefficients, linear_forward, linear_inverse
 from ...core.interfaces.utils.command_rewritter import CommandRewriterBase
 from ...core.interfaces.utils.liaison_manager import LiaisonManagerBase
 from ...core.interfaces.utils.translator_service import TranslatorServiceBase
@@ -16,6 +21,9 @@ from ...core.model.utils.identifiers import (
     LatticeElementPropertyID,
     ConversionID,
 )
+from ...core.interfaces.utils.state_conversion import StateConversion
+
+logger = logging.getLogger("accml")
 
 
 class CommandRewriter(CommandRewriterBase):
@@ -122,6 +130,93 @@ class CommandRewriter(CommandRewriterBase):
         )
         return ncmd
 
+    def forward_many(
+        self, commands: Union[Sequence[Command], TransactionCommand]
+    ) -> Sequence[Command]:
+        """Forward a batch of commands, e.g. a whole magnet family
+
+        Linear conversions are evaluated together as one numpy
+        expression, all others one by one.
+
+        Returns:
+            the rewritten commands in input order
+        """
+        if isinstance(commands, TransactionCommand):
+            commands = commands.transaction
+
+        dev_prop_ids = []
+        conversions = []
+        for cmd in commands:
+            rcmd = self.forward_read_command(cmd)
+            dev_prop_id = DevicePropertyID(device_name=rcmd.id, property=rcmd.property)
+            lat_prop_id = LatticeElementPropertyID(
+                element_name=cmd.id, property=cmd.property
+            )
+            conversions.append(
+                self.translator_service.get(
+                    ConversionID(
+                        lattice_property_id=lat_prop_id, device_property_id=dev_prop_id
+                    )
+                )
+            )
+            dev_prop_ids.append(dev_prop_id)
+
+        values = convert_many(
+            conversions, [cmd.value for cmd in commands], direction="forward"
+        )
+        return [
+            Command(
+                id=dev_prop_id.device_name,
+                property=dev_prop_id.property,
+                value=value,
+                behaviour_on_error=cmd.behaviour_on_error,
+            )
+            for cmd, dev_prop_id, value in zip(commands, dev_prop_ids, values)
+        ]
+
+    def inverse_many(
+        self, commands: Union[Sequence[Command], TransactionCommand]
+    ) -> Sequence[Command]:
+        """Inverse of a batch of commands
+
+        Returns:
+            the rewritten commands flattened in input order: one device
+            property can map to more than one lattice element property
+        """
+        if isinstance(commands, TransactionCommand):
+            commands = commands.transaction
+
+        items = []
+        for cmd in commands:
+            dev_prop_id = DevicePropertyID(device_name=cmd.id, property=cmd.property)
+            if dev_prop_id.device_name is None:
+                raise ValueError(
+                    "Device name cannot be None in device property identifier."
+                )
+            for r in self.inverse_read_command(cmd):
+                lat_prop_id = LatticeElementPropertyID(element_name=r.id, property=r.property)
+                conversion = self.translator_service.get(
+                    ConversionID(
+                        lattice_property_id=lat_prop_id, device_property_id=dev_prop_id
+                    )
+                )
+                items.append((cmd, lat_prop_id, conversion))
+
+        values = convert_many(
+            [conversion for _, __, conversion in items],
+            [cmd.value for cmd, _, __ in items],
+            direction="inverse",
+        )
+        return [
+            Command(
+                id=lat_prop_id.element_name,
+                property=lat_prop_id.property,
+                value=value,
+                behaviour_on_error=cmd.behaviour_on_error,
+            )
+            for (cmd, lat_prop_id, _), value in zip(items, values)
+        ]
+
     def forward_read_command(self, command: ReadCommand) -> ReadCommand:
         lat_prop_id = LatticeElementPropertyID(
             element_name=command.id, property=command.property
@@ -139,4 +234,50 @@ class CommandRewriter(CommandRewriterBase):
         ]
 
 
-__all__ = ["CommandRewriter"]
+def convert_many(
+    conversions: Sequence[StateConversion], values: Sequence[object], *, direction: str
+) -> Sequence[object]:
+    """Apply conversion[i] to values[i], vectorising all linear ones
+
+    Args:
+        conversions: one conversion object per value
+        values: the states to convert
+        direction: "forward" or "inverse"
+
+    Returns:
+        converted values in input order. Results of the linear
+        conversions are plain python floats
+    """
+    vectorised = dict(forward=linear_forward, inverse=linear_inverse)[direction]
+    result = [None] * len(values)
+
+    linear_idx = []
+    coefficients = []
+    for idx, (conversion, value) in enumerate(zip(conversions, values)):
+        coeffs = linear_coefficients(conversion)
+        if coeffs is None or not _is_scalar(value):
+            # e.g. Tune conversion: handled by the object itself
+            result[idx] = getattr(conversion, direction)(value)
+            continue
+        linear_idx.append(idx)
+        coefficients.append(coeffs)
+
+    if not linear_idx:
+        return result
+
+    intercept, slope, brho = np.array(coefficients, dtype=float).T
+    state = np.array([values[idx] for idx in linear_idx], dtype=float)
+    logger.debug(
+        "convert_many: %s %d linear conversions in one go", direction, len(linear_idx)
+    )
+    converted = vectorised(state, intercept, slope, brho)
+    for idx, value in zip(linear_idx, converted.tolist()):
+        result[idx] = value
+    return result
+
+
+def _is_scalar(value: object) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+__all__ = ["CommandRewriter", "convert_many"]
@@ -0,0 +1,236 @@
+"""Precompiled conversion plan for linear conversions
+
+:class:`CommandRewriter` resolves every command by building
+identifiers and looking them up in the liaison manager and the
+translator service. For a fixed set of commands, e.g. all tune
+correction quadrupoles, this resolution can be made once: the
+conversion table assigns a dense index to each lattice property and
+each device property and keeps the linear conversion coefficients in
+contiguous arrays. A :class:`ConversionPlan` then converts a vector
+of values without any per element lookup.
+
+Only conversions that :func:`linear_coefficients` understands are
+compiled into the table. Anything else (e.g. tune) needs to be
+handled by the command rewriter.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Hashable, Sequence
+
+import numpy as np
+
+from .liaison_manager import LiaisonManager
+from .translator_service import TranslatorService
+from .unit_conversion import linear_coefficients, linear_forward, linear_inverse
+from ..model.utils.command import BehaviourOnError, Command, ReadCommand
+from ..model.utils.identifiers import (
+    ConversionID,
+    DevicePropertyID,
+    LatticeElementPropertyID,
+)
+
+logger = logging.getLogger("accml")
+
+
+@dataclass(frozen=True)
+class ConversionPlan:
+    """Conversion of a fixed sequence of lattice properties
+
+    Coefficients are sliced out of the table once, so that
+    :meth:`forward` and :meth:`inverse` are pure numpy expressions.
+    """
+
+    #: lattice properties in the order the values are expected
+    lattice_property_ids: Sequence[LatticeElementPropertyID]
+    #: device property each lattice property is mapped to
+    device_property_ids: Sequence[DevicePropertyID]
+    #: index of the lattice properties within the table
+    lattice_indices: np.ndarray
+    #: index of the device properties within the table
+    device_indices: np.ndarray
+    intercept: np.ndarray
+    slope: np.ndarray
+    brho: np.ndarray
+
+    def __len__(self):
+        return len(self.lattice_indices)
+
+    def forward(self, values: Sequence[float]) -> np.ndarray:
+        """lattice property values -> device property values"""
+        return linear_forward(
+            np.asarray(values, dtype=float), self.intercept, self.slope, self.brho
+        )
+
+    def inverse(self, values: Sequence[float]) -> np.ndarray:
+        """device property values -> lattice property values"""
+        return linear_inverse(
+            np.asarray(values, dtype=float), self.intercept, self.slope, self.brho
+        )
+
+    def forward_commands(
+        self,
+        values: Sequence[float],
+        behaviour_on_error: BehaviourOnError = BehaviourOnError.stop,
+    ) -> Sequence[Command]:
+        """device commands for the given lattice property values"""
+        return [
+            Command(
+                id=dev_prop_id.device_name,
+                property=dev_prop_id.property,
+                value=value,
+                behaviour_on_error=behaviour_on_error,
+            )
+            for dev_prop_id, value in zip(
+                self.device_property_ids, self.forward(values).tolist()
+            )
+        ]
+
+    def device_read_commands(self) -> Sequence[ReadCommand]:
+        return [
+            ReadCommand(id=dev_prop_id.device_name, property=dev_prop_id.property)
+            for dev_prop_id in self.device_property_ids
+        ]
+
+
+class ConversionTable:
+    """Dense index for lattice / device properties and linear coefficients
+
+    Typically built once from the output of `build_managers` by
+    :meth:`from_managers`.
+    """
+
+    def __init__(
+        self,
+        *,
+        lattice_property_ids: Sequence[LatticeElementPropertyID],
+        device_property_ids: Sequence[DevicePropertyID],
+        device_of_lattice: Sequence[int],
+        intercept: Sequence[float],
+        slope: Sequence[float],
+        brho: Sequence[float],
+    ):
+        n = len(lattice_property_ids)
+        assert len(device_of_lattice) == n
+        assert len(intercept) == n and len(slope) == n and len(brho) == n
+
+        self.lattice_property_ids = tuple(lattice_property_ids)
+        self.device_property_ids = tuple(device_property_ids)
+        self.lattice_index: Dict[LatticeElementPropertyID, int] = {
+            id_: idx for idx, id_ in enumerate(self.lattice_property_ids)
+        }
+        self.device_index: Dict[DevicePropertyID, int] = {
+            id_: idx for idx, id_ in enumerate(self.device_property_ids)
+        }
+        self.device_of_lattice = np.asarray(device_of_lattice, dtype=np.intp)
+        self.intercept = np.ascontiguousarray(intercept, dtype=float)
+        self.slope = np.ascontiguousarray(slope, dtype=float)
+        self.brho = np.ascontiguousarray(brho, dtype=float)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}("
+            f"n_lattice_properties={len(self.lattice_property_ids)},"
+            f" n_device_properties={len(self.device_property_ids)})"
+        )
+
+    def __len__(self):
+        return len(self.lattice_property_ids)
+
+    @classmethod
+    def from_managers(
+        cls, liaison_manager: LiaisonManager, translator_service: TranslatorService
+    ) -> "ConversionTable":
+        """compile the linear conversions known to both managers"""
+        lattice_property_ids = []
+        device_of_lattice = []
+        coefficients = []
+        device_index = {}
+
+        for lat_prop_id, dev_prop_id in liaison_manager.forward_lut.items():
+            conversion = translator_service.lut.get(
+                ConversionID(
+                    lattice_property_id=lat_prop_id, device_property_id=dev_prop_id
+                ),
+                None,
+            )
+            coeffs = None if conversion is None else linear_coefficients(conversion)
+            if coeffs is None:
+                logger.debug(
+                    "%s: no linear conversion for %s -> %s, not compiled",
+                    cls.__name__, lat_prop_id, dev_prop_id,
+                )
+                continue
+            lattice_property_ids.append(lat_prop_id)
+            device_of_lattice.append(device_index.setdefault(dev_prop_id, len(device_index)))
+            coefficients.append(coeffs)
+
+        intercept, slope, brho = (
+            np.array(coefficients, dtype=float).reshape(-1, 3).T
+        )
+        return cls(
+            lattice_property_ids=lattice_property_ids,
+            device_property_ids=list(device_index),
+            device_of_lattice=device_of_lattice,
+            intercept=intercept,
+            slope=slope,
+            brho=brho,
+        )
+
+    def indices(self, lat_prop_ids: Sequence[LatticeElementPropertyID]) -> np.ndarray:
+        """dense indices of the given lattice properties
+
+        Raises:
+            KeyError: if one of the properties is not in the table
+        """
+        try:
+            return np.fromiter(
+                (self.lattice_index[id_] for id_ in lat_prop_ids),
+                dtype=np.intp,
+                count=len(lat_prop_ids),
+            )
+        except KeyError as ke:
+            logger.error(f"{self.__class__.__name__}: id {ke} not in conversion table")
+            raise ke
+
+    def plan(self, element_names: Sequence[Hashable], property: str) -> ConversionPlan:
+        """resolve the same property of many lattice elements once"""
+        return self.plan_for(
+            [
+                LatticeElementPropertyID(element_name=name, property=property)
+                for name in element_names
+            ]
+        )
+
+    def plan_for(self, lat_prop_ids: Sequence[LatticeElementPropertyID]) -> ConversionPlan:
+        lat_idx = self.indices(lat_prop_ids)
+        dev_idx = self.device_of_lattice[lat_idx]
+        return ConversionPlan(
+            lattice_property_ids=tuple(lat_prop_ids),
+            device_property_ids=tuple(self.device_property_ids[idx] for idx in dev_idx),
+            lattice_indices=lat_idx,
+            device_indices=dev_idx,
+            intercept=self.intercept[lat_idx],
+            slope=self.slope[lat_idx],
+            brho=self.brho[lat_idx],
+        )
+
+    def forward(self, indices: np.ndarray, values: Sequence[float]) -> np.ndarray:
+        """lattice values at table indices -> device values"""
+        return linear_forward(
+            np.asarray(values, dtype=float),
+            self.intercept[indices],
+            self.slope[indices],
+            self.brho[indices],
+        )
+
+    def inverse(self, indices: np.ndarray, values: Sequence[float]) -> np.ndarray:
+        """device values for the lattice properties at table indices -> lattice values"""
+        return linear_inverse(
+            np.asarray(values, dtype=float),
+            self.intercept[indices],
+            self.slope[indices],
+            self.brho[indices],
+        )
+
+
+__all__ = ["ConversionPlan", "ConversionTable"]
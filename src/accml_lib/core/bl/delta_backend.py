@@ -1,27 +1,52 @@
+import asyncio
 import logging
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Hashable, Iterable, Mapping, Optional, Sequence, Tuple, Union
 
 from ..interfaces.backend.backend import BackendRW, BackendR
 from ..interfaces.backend.filter import FilterInterface
-from ..model.utils.command import ReadCommand
+from ..interfaces.backend.state_cache import StateCacheInterface
+from ..model.utils.command import Command, ReadCommand, TransactionCommand
 
 logger = logging.getLogger("accml")
 
 
-class StateCache:
-    """
-    Todo:
-        abstract interface
+class StateCache(StateCacheInterface):
+    """reference values in memory, with snapshots
+
+    Snapshots share the dictionary with the cache (copy on write):
+    taking one costs nothing, the first change after it copies the
+    dictionary once. At most `max_snapshots` are kept, the least
+    recently used ones are dropped first.
     """
 
-    def __init__(self, *, name: str):
+    def __init__(self, *, name: str, max_snapshots: int = 16):
+        if max_snapshots < 1:
+            raise ValueError(f"{self.__class__.__name__}: max_snapshots must be at least 1, got {max_snapshots}")
         self.cache = dict()
         self.name = name
+        self.max_snapshots = max_snapshots
+        #: incremented on each change
+        self.version = 0
+        self._snapshots: "OrderedDict[Hashable, dict]" = OrderedDict()
+        # cache dict is referenced by a snapshot
+        self._shared = False
 
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name})"
 
+    def _writeable(self) -> dict:
+        if self._shared:
+            self.cache = dict(self.cache)
+            self._shared = False
+        self.version += 1
+        return self.cache
+
     def clear(self):
         self.cache = dict()
+        self._shared = False
+        self.version += 1
 
     def keys(self):
         return self.cache.keys()
@@ -36,7 +61,48 @@ class StateCache:
 
     def set(self, id, value):
         assert self.cache is not None
-        self.cache[id] = value
+        self._writeable()[id] = value
+
+    def get_many(self, ids: Sequence, default=None) -> Sequence[object]:
+        cache = self.cache
+        return [cache.get(id, default) for id in ids]
+
+    def set_many(self, items: Iterable[Tuple[object, object]]):
+        self._writeable().update(items)
+
+    def snapshot(self, name: Optional[Hashable] = None) -> Hashable:
+        if name is None:
+            name = self.version
+        self._snapshots[name] = self.cache
+        self._snapshots.move_to_end(name)
+        self._shared = True
+        while len(self._snapshots) > self.max_snapshots:
+            dropped, _ = self._snapshots.popitem(last=False)
+            logger.debug(f"{self}: dropped least recently used snapshot {dropped}")
+        return name
+
+    def _snapshot(self, name: Hashable) -> dict:
+        try:
+            d = self._snapshots[name]
+        except KeyError as ke:
+            logger.error(f"{self}: no snapshot {name}, kept {list(self._snapshots)}")
+            raise ke
+        self._snapshots.move_to_end(name)
+        return d
+
+    def restore(self, name: Hashable):
+        self.cache = self._snapshot(name)
+        self._shared = True
+        self.version += 1
+
+    def snapshot_values(self, name: Hashable) -> Mapping:
+        return MappingProxyType(self._snapshot(name))
+
+    def snapshots(self) -> Sequence[Hashable]:
+        return list(self._snapshots)
+
+    def drop_snapshot(self, name: Hashable):
+        del self._snapshots[name]
 
 
 def delta_property(prop_id: str) -> (bool, str):
@@ -54,7 +120,7 @@ class NOOPFilter(FilterInterface):
 class DeltaBackendRProxy(BackendR):
     """handle delta properties"""
 
-    def __init__(self, *, backend: BackendR, cache: StateCache, filter:FilterInterface=NOOPFilter()):
+    def __init__(self, *, backend: BackendR, cache: StateCacheInterface, filter:FilterInterface=NOOPFilter()):
         self.backend = backend
         self.cache = cache
         self.filter = filter
@@ -83,6 +149,61 @@ class DeltaBackendRProxy(BackendR):
         # to get some zero of proper type
         return self._calculate_delta_read(rcmd, r)
 
+    async def trigger_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        return await self.backend.trigger_many(
+            [ReadCommand(id=cmd.id, property=delta_property(cmd.property)[1]) for cmd in cmds]
+        )
+
+    async def read_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        """all reads in one request to the backend"""
+        flags = []
+        rcmds = []
+        for cmd in cmds:
+            flag, orig_prop_id = delta_property(cmd.property)
+            flags.append(flag)
+            rcmds.append(ReadCommand(id=cmd.id, property=orig_prop_id))
+
+        values = await self.backend.read_many(rcmds)
+
+        r = []
+        for flag, rcmd, value in zip(flags, rcmds, values):
+            if not flag:
+                r.append(value)
+                continue
+            if self.cache.get(rcmd, None) is None:
+                self.cache.set(rcmd, value)
+            r.append(self._calculate_delta_read(rcmd, value))
+        return r
+
+    async def prefetch_references(self, read_commands: Iterable[ReadCommand]) -> int:
+        """read all missing reference values in one request to the backend
+
+        Accepts plain or delta properties. Commands whose reference is
+        already cached are skipped.
+
+        Returns:
+            number of reference values read
+        """
+        rcmds = list(
+            dict.fromkeys(
+                ReadCommand(id=cmd.id, property=delta_property(cmd.property)[1])
+                for cmd in read_commands
+            )
+        )
+        missing = [
+            rcmd for rcmd, ref in zip(rcmds, self.cache.get_many(rcmds)) if ref is None
+        ]
+        if not missing:
+            return 0
+        values = await self.backend.read_many(missing)
+        # could have been set while waiting for the backend
+        self.cache.set_many(
+            (rcmd, value)
+            for rcmd, value in zip(missing, values)
+            if self.cache.get(rcmd, None) is None
+        )
+        return len(missing)
+
     def _calculate_delta_read(self, rcmd: ReadCommand, value):
         """
         For overloading in derived classes e.g. for processing ophyd-async data
@@ -99,9 +220,25 @@ class DeltaBackendRProxy(BackendR):
 class DeltaBackendRWProxy(DeltaBackendRProxy, BackendRW):
     """handle delta properties"""
 
-    def __init__(self, backend: BackendRW, cache: StateCache, filter: FilterInterface=NOOPFilter()):
+    def __init__(
+        self,
+        backend: BackendRW,
+        cache: StateCacheInterface,
+        filter: FilterInterface = NOOPFilter(),
+        *,
+        auto_prefetch: bool = False,
+    ):
+        """
+        Args:
+            auto_prefetch: references missing for sets issued together
+                           (e.g. the commands of a transaction set
+                           concurrently) are read in one request
+        """
         super().__init__(backend=backend, cache=cache, filter=filter)
         self.backend = backend
+        self.auto_prefetch = auto_prefetch
+        # references requested in this loop iteration, read together
+        self._pending: Dict[ReadCommand, asyncio.Future] = dict()
 
     async def set(self, dev_id: str, prop_id: str, value: object):
         flag, orig_prop_id = delta_property(prop_id)
@@ -110,16 +247,78 @@ class DeltaBackendRWProxy(DeltaBackendRProxy, BackendRW):
 
         rcmd = ReadCommand(id=dev_id, property=orig_prop_id)
         ref = self.cache.get(rcmd, None)
-        if not ref:
-            r = await self.backend.read(dev_id=dev_id, prop_id=orig_prop_id)
-            # Todo: refactor the classes here so this does not need
-            #        to be repeated here
-            self.cache.set(rcmd, r)
+        if ref is None:
+            await self._fetch_reference(rcmd)
         total_val = self._calculate_delta_set(rcmd, value)
         return await self.backend.set(
             dev_id=dev_id, prop_id=orig_prop_id, value=total_val
         )
 
+    async def set_many(
+        self, cmds: Union[Sequence[Command], TransactionCommand]
+    ) -> Sequence[object]:
+        """all sets in one request to the backend
+
+        Missing references are read in one request beforehand
+        """
+        if isinstance(cmds, TransactionCommand):
+            cmds = cmds.transaction
+        flags = []
+        rcmds = []
+        for cmd in cmds:
+            flag, orig_prop_id = delta_property(cmd.property)
+            flags.append(flag)
+            rcmds.append(ReadCommand(id=cmd.id, property=orig_prop_id))
+
+        await self.prefetch_references(
+            [rcmd for flag, rcmd in zip(flags, rcmds) if flag]
+        )
+
+        ncmds = [
+            Command(
+                id=rcmd.id,
+                property=rcmd.property,
+                value=self._calculate_delta_set(rcmd, cmd.value) if flag else cmd.value,
+                behaviour_on_error=cmd.behaviour_on_error,
+            )
+            for flag, rcmd, cmd in zip(flags, rcmds, cmds)
+        ]
+        return await self.backend.set_many(ncmds)
+
+    async def _fetch_reference(self, rcmd: ReadCommand):
+        if not self.auto_prefetch:
+            r = await self.backend.read(dev_id=rcmd.id, prop_id=rcmd.property)
+            # Todo: refactor the classes here so this does not need
+            #        to be repeated here
+            self.cache.set(rcmd, r)
+            return
+
+        fut = self._pending.get(rcmd, None)
+        if fut is None:
+            loop = asyncio.get_event_loop()
+            if not self._pending:
+                # after all sets issued together asked for their reference
+                loop.call_soon(self._prefetch_pending)
+            fut = self._pending[rcmd] = loop.create_future()
+        await asyncio.shield(fut)
+
+    def _prefetch_pending(self):
+        pending, self._pending = self._pending, dict()
+        task = asyncio.ensure_future(self.prefetch_references(list(pending)))
+
+        def done(task: asyncio.Future):
+            for fut in pending.values():
+                if fut.done():
+                    continue
+                if task.cancelled():
+                    fut.cancel()
+                elif task.exception() is not None:
+                    fut.set_exception(task.exception())
+                else:
+                    fut.set_result(None)
+
+        task.add_done_callback(done)
+
     def _calculate_delta_set(self, rcmd: ReadCommand, value):
         """
         For overloading in derived classes e.g. for processing ophyd-async data
@@ -0,0 +1,367 @@
+"""Rolling window filters for noisy readings
+
+The filters keep the last samples of a reading in a preallocated ring
+buffer and work elementwise. Readings can be scalars, numpy arrays,
+:class:`ArrayOrbit`, :class:`Orbit` or :class:`Tune`: these are
+flattened to a float vector on the way in and restored on the way out.
+A reading of different shape (e.g. other bpms) restarts the filter.
+
+The filters are stateful: use one per property, e.g. by
+:class:`FilteredBackendRProxy`, which can be put below a
+:class:`DeltaBackendRProxy`.
+"""
+import logging
+from typing import Callable, Dict, Hashable, Optional, Sequence
+
+import numpy as np
+
+from ..interfaces.backend.backend import BackendR, BackendRW
+from ..interfaces.backend.filter import FilterInterface
+from ..model.output.orbit import ArrayOrbit, Orbit
+from ..model.output.tune import Tune
+from ..model.utils.command import Command, ReadCommand
+
+logger = logging.getLogger("accml")
+
+
+class _Codec:
+    """flattens a reading to a float vector and back"""
+
+    def __init__(self, sample):
+        self.kind = type(sample)
+        self.names = None
+        if isinstance(sample, ArrayOrbit):
+            self.names = sample.names
+            self.shape = sample.data.shape
+        elif isinstance(sample, Orbit):
+            self.names = tuple(sample.identifiers())
+            self.shape = (len(ArrayOrbit.channels), len(self.names))
+        elif isinstance(sample, Tune):
+            self.shape = (2,)
+        else:
+            self.shape = np.shape(sample)
+        self.size = int(np.prod(self.shape, dtype=int))
+
+    def matches(self, sample) -> bool:
+        if isinstance(sample, ArrayOrbit):
+            return self.kind is ArrayOrbit and sample.names == self.names
+        if isinstance(sample, Orbit):
+            return self.kind is Orbit and tuple(sample.identifiers()) == self.names
+        if isinstance(sample, Tune):
+            return self.kind is Tune
+        # float, numpy scalars and arrays alike
+        return self.kind not in (ArrayOrbit, Orbit, Tune) and np.shape(sample) == self.shape
+
+    def encode(self, sample) -> np.ndarray:
+        if isinstance(sample, ArrayOrbit):
+            return sample.data.reshape(-1)
+        if isinstance(sample, Orbit):
+            return sample.to_array_orbit().data.reshape(-1)
+        if isinstance(sample, Tune):
+            return np.array([sample.x, sample.y], dtype=float)
+        return np.asarray(sample, dtype=float).reshape(-1)
+
+    def decode(self, values: np.ndarray):
+        if self.kind is ArrayOrbit:
+            return ArrayOrbit(names=self.names, data=values.reshape(self.shape))
+        if self.kind is Orbit:
+            return ArrayOrbit(names=self.names, data=values.reshape(self.shape)).to_orbit()
+        if self.kind is Tune:
+            return Tune(x=float(values[0]), y=float(values[1]))
+        if self.shape == ():
+            return float(values[0])
+        return values.reshape(self.shape)
+
+
+class RollingFilter(FilterInterface):
+    """common part: payload conversion and ring buffer
+
+    Derived classes implement :meth:`_update`, which receives the new
+    sample as flat vector after it was stored in the ring buffer.
+    """
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError(f"{self.__class__.__name__}: window must be at least 1, got {window}")
+        self.window = window
+        self.reset()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(window={self.window})"
+
+    def reset(self):
+        self._codec = None
+        self.buffer = None
+        #: next row of the buffer to write to
+        self.position = 0
+        #: valid rows in the buffer
+        self.count = 0
+
+    def _allocate(self, size: int):
+        self.buffer = np.zeros((self.window, size), dtype=float)
+
+    def process(self, input):
+        if self._codec is None or not self._codec.matches(input):
+            if self._codec is not None:
+                logger.info(f"{self}: reading changed shape, restarting filter")
+            self.reset()
+            self._codec = _Codec(input)
+            self._allocate(self._codec.size)
+        sample = self._codec.encode(input)
+        if self.count == self.window:
+            self._drop(self.buffer[self.position])
+        self.buffer[self.position] = sample
+        self.position = (self.position + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        return self._codec.decode(self._update(sample))
+
+    @property
+    def samples(self) -> np.ndarray:
+        """valid rows of the buffer, not in time order"""
+        return self.buffer[: self.count]
+
+    def _drop(self, oldest: np.ndarray):
+        """oldest sample is about to be overwritten"""
+        pass
+
+    def _update(self, sample: np.ndarray) -> np.ndarray:
+        raise NotImplementedError("use derived class instead")
+
+
+class MovingAverageFilter(RollingFilter):
+    """mean of the last `window` samples, kept as running sum
+
+    The sum is recomputed from the buffer once per window to avoid
+    accumulating rounding errors.
+    """
+
+    def reset(self):
+        super().reset()
+        self._sum = None
+        self._since_resum = 0
+
+    def _allocate(self, size: int):
+        super()._allocate(size)
+        self._sum = np.zeros(size, dtype=float)
+
+    def _drop(self, oldest):
+        self._sum -= oldest
+
+    def _update(self, sample):
+        self._since_resum += 1
+        if self._since_resum >= self.window:
+            np.sum(self.samples, axis=0, out=self._sum)
+            self._since_resum = 0
+        else:
+            self._sum += sample
+        return self._sum / self.count
+
+
+class MovingMedianFilter(RollingFilter):
+    """median of the last `window` samples
+
+    Unlike :class:`MovingAverageFilter` each sample costs O(window)
+    per element: the median can not be updated from the previous one.
+    Windows are typically a few samples. The samples are partitioned
+    in a preallocated scratch buffer, only the result is allocated.
+    """
+
+    def _allocate(self, size: int):
+        super()._allocate(size)
+        self._scratch = np.empty_like(self.buffer)
+        self._median = np.empty(size, dtype=float)
+
+    def _update(self, sample):
+        scratch = self._scratch[: self.count]
+        np.copyto(scratch, self.samples)
+        np.median(scratch, axis=0, out=self._median, overwrite_input=True)
+        # scratch is reused: the result must not refer to it
+        return self._median.copy()
+
+
+class SigmaClippedMeanFilter(RollingFilter):
+    """mean of the last samples, ignoring outliers
+
+    Samples further than `n_sigma` standard deviations off the mean
+    are dropped, `iterations` times. Each sample costs O(window *
+    iterations) per element, computed in preallocated scratch buffers;
+    only the result is allocated.
+    """
+
+    def __init__(self, window: int, *, n_sigma: float = 3.0, iterations: int = 1):
+        self.n_sigma = n_sigma
+        self.iterations = iterations
+        super().__init__(window)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(window={self.window}, n_sigma={self.n_sigma},"
+            f" iterations={self.iterations})"
+        )
+
+    def _allocate(self, size: int):
+        super()._allocate(size)
+        self._deviation = np.empty_like(self.buffer)
+        self._keep = np.empty(self.buffer.shape, dtype=bool)
+        self._mean = np.empty(size, dtype=float)
+        self._limit = np.empty(size, dtype=float)
+        self._n = np.empty(size, dtype=float)
+
+    def _update(self, sample):
+        samples = self.samples
+        count = self.count
+        deviation, keep = self._deviation[:count], self._keep[:count]
+        mean, limit, n = self._mean, self._limit, self._n
+        np.mean(samples, axis=0, out=mean)
+        keep.fill(True)
+        n.fill(count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for _ in range(self.iterations):
+                # std of the samples kept, around their mean
+                np.subtract(samples, mean, out=deviation)
+                np.abs(deviation, out=deviation)
+                np.square(deviation, out=deviation)
+                deviation *= keep
+                np.sum(deviation, axis=0, out=limit)
+                limit /= n
+                np.sqrt(limit, out=limit)
+                limit *= self.n_sigma
+
+                np.subtract(samples, mean, out=deviation)
+                np.abs(deviation, out=deviation)
+                np.less_equal(deviation, limit, out=keep)
+                np.sum(keep, axis=0, out=n)
+                # dropped samples, nan among them, count as 0
+                deviation.fill(0.0)
+                np.copyto(deviation, samples, where=keep)
+                np.sum(deviation, axis=0, out=mean)
+                mean /= n
+        return mean.copy()
+
+
+class ExponentialFilter(FilterInterface):
+    """exponential smoothing: s = alpha * sample + (1 - alpha) * s
+
+    Only the smoothed value is kept, no window.
+    """
+
+    def __init__(self, alpha: float):
+        if not 0 < alpha <= 1:
+            raise ValueError(f"{self.__class__.__name__}: alpha must be in (0, 1], got {alpha}")
+        self.alpha = alpha
+        self.reset()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(alpha={self.alpha})"
+
+    def reset(self):
+        self._codec = None
+        self._state = None
+
+    def process(self, input):
+        if self._codec is None or not self._codec.matches(input):
+            self._codec = _Codec(input)
+            self._state = self._codec.encode(input).copy()
+        else:
+            self._state *= 1 - self.alpha
+            self._state += self.alpha * self._codec.encode(input)
+        return self._codec.decode(self._state.copy())
+
+
+class FilteredBackendRProxy(BackendR):
+    """apply a filter per (dev_id, prop_id) to each reading
+
+    Args:
+        filter_factory: called once per read command, returns the
+                        filter for it or None for unfiltered reads
+
+    A reading only enters the filter when it is read: readings to
+    average are obtained by reading repeatedly.
+    """
+
+    def __init__(
+        self,
+        *,
+        backend: BackendR,
+        filter_factory: Callable[[ReadCommand], Optional[FilterInterface]],
+    ):
+        self.backend = backend
+        self.filter_factory = filter_factory
+        self.filters: Dict[ReadCommand, Optional[FilterInterface]] = dict()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(backend={self.backend})"
+
+    def get_natural_view_name(self):
+        return self.backend.get_natural_view_name()
+
+    def filter_for(self, rcmd: ReadCommand) -> Optional[FilterInterface]:
+        try:
+            return self.filters[rcmd]
+        except KeyError:
+            filt = self.filters[rcmd] = self.filter_factory(rcmd)
+            return filt
+
+    def _process(self, rcmd: ReadCommand, value):
+        filt = self.filter_for(rcmd)
+        if filt is None:
+            return value
+        return filt.process(value)
+
+    def reset(self, dev_id: Optional[Hashable] = None):
+        """restart the filters of a device, or of all devices"""
+        if dev_id is None:
+            self.filters.clear()
+            return
+        for rcmd in [rcmd for rcmd in self.filters if rcmd.id == dev_id]:
+            del self.filters[rcmd]
+
+    async def trigger(self, dev_id: str, prop_id: str):
+        return await self.backend.trigger(dev_id=dev_id, prop_id=prop_id)
+
+    async def trigger_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        return await self.backend.trigger_many(cmds)
+
+    async def read(self, dev_id: str, prop_id: str) -> object:
+        value = await self.backend.read(dev_id=dev_id, prop_id=prop_id)
+        return self._process(ReadCommand(id=dev_id, property=prop_id), value)
+
+    async def read_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        values = await self.backend.read_many(cmds)
+        return [self._process(cmd, value) for cmd, value in zip(cmds, values)]
+
+
+class FilteredBackendRWProxy(FilteredBackendRProxy, BackendRW):
+    """filtered reads, a set restarts all filters
+
+    Readings taken before a set are not averaged with the ones after
+    it: a set of a magnet changes e.g. the orbit
+    """
+
+    def __init__(
+        self,
+        *,
+        backend: BackendRW,
+        filter_factory: Callable[[ReadCommand], Optional[FilterInterface]],
+    ):
+        super().__init__(backend=backend, filter_factory=filter_factory)
+        self.backend = backend
+
+    async def set(self, dev_id: str, prop_id: str, value: object):
+        self.reset()
+        return await self.backend.set(dev_id=dev_id, prop_id=prop_id, value=value)
+
+    async def set_many(self, cmds: Sequence[Command]) -> Sequence[object]:
+        self.reset()
+        return await self.backend.set_many(cmds)
+
+
+__all__ = [
+    "ExponentialFilter",
+    "FilteredBackendRProxy",
+    "FilteredBackendRWProxy",
+    "MovingAverageFilter",
+    "MovingMedianFilter",
+    "RollingFilter",
+    "SigmaClippedMeanFilter",
+]
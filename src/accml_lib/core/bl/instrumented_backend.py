@@ -0,0 +1,293 @@
+"""Latency and throughput of the calls made to a backend
+
+Wrap any backend (e.g. :class:`DeltaBackendRWProxy` or the simulator
+backend) to see how much of a measurement is spent waiting for it.
+Recording a call costs two `perf_counter_ns` calls and a few integer
+updates, so the proxies can stay in place in production.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+from ..interfaces.backend.backend import BackendR, BackendRW
+from ..model.output.orbit import ArrayOrbit
+from ..model.utils.command import Command, ReadCommand
+
+logger = logging.getLogger("accml")
+
+#: bucket i holds latencies in [2**(i-1), 2**i) ns, the last one all above
+n_latency_buckets = 48
+
+
+class LatencyHistogram:
+    """fixed log2 buckets, from 1 ns to about 1.6 days"""
+
+    __slots__ = ("buckets", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets = [0] * n_latency_buckets
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, ns: int):
+        self.buckets[min(ns.bit_length(), n_latency_buckets - 1)] += 1
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if self.max is None or ns > self.max:
+            self.max = ns
+
+    def quantile(self, q: float) -> Optional[int]:
+        """upper bound of the bucket the quantile q falls into [ns]"""
+        if not self.count:
+            return None
+        threshold = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= threshold:
+                return min(2 ** idx, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, object]:
+        return dict(
+            count=self.count,
+            mean_ns=self.total / self.count if self.count else None,
+            min_ns=self.min,
+            max_ns=self.max,
+            p50_ns=self.quantile(0.5),
+            p90_ns=self.quantile(0.9),
+            p99_ns=self.quantile(0.99),
+            # upper bound of the bucket -> number of calls
+            buckets={str(2 ** idx): n for idx, n in enumerate(self.buckets) if n},
+        )
+
+
+class OperationStatistics:
+    """calls of one operation on one device property"""
+
+    __slots__ = ("calls", "errors", "values", "bytes", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.values = 0
+        self.bytes = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self) -> Dict[str, object]:
+        return dict(
+            calls=self.calls,
+            errors=self.errors,
+            values=self.values,
+            bytes=self.bytes,
+            latency=self.latency.snapshot(),
+        )
+
+
+def payload_size(value) -> Tuple[int, int]:
+    """number of values and bytes moved, estimated cheaply
+
+    Other objects, e.g. :class:`Tune`, count as one value of unknown
+    size (0 bytes)
+    """
+    if isinstance(value, ArrayOrbit):
+        value = value.data
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        # numpy arrays
+        return int(getattr(value, "size", 1)), int(nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return 1, len(value)
+    if isinstance(value, (int, float)):
+        return 1, 8
+    if value is None:
+        return 0, 0
+    return 1, 0
+
+
+class InstrumentedBackendRProxy(BackendR):
+    """record calls, latency, errors and values per (dev_id, prop_id, operation)
+
+    Calls of the batched methods are recorded for each command, with
+    the latency of the whole batch and the operation name e.g.
+    "read_many".
+    """
+
+    def __init__(self, *, backend: BackendR, clock=time.perf_counter_ns):
+        self.backend = backend
+        self.clock = clock
+        self.statistics: Dict[Tuple[str, str, str], OperationStatistics] = dict()
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self._dump_task = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(backend={self.backend})"
+
+    def _entry(self, dev_id, prop_id, operation: str) -> OperationStatistics:
+        key = (dev_id, prop_id, operation)
+        entry = self.statistics.get(key, None)
+        if entry is None:
+            entry = self.statistics[key] = OperationStatistics()
+        return entry
+
+    def _record(self, dev_id, prop_id, operation: str, start: int, value=None, failed=False):
+        entry = self._entry(dev_id, prop_id, operation)
+        entry.latency.record(self.clock() - start)
+        entry.calls += 1
+        if failed:
+            entry.errors += 1
+            return
+        n_values, n_bytes = payload_size(value)
+        entry.values += n_values
+        entry.bytes += n_bytes
+
+    def _record_many(self, cmds, operation: str, start: int, values=None, failed=False):
+        ns = self.clock() - start
+        if values is None:
+            values = [None] * len(cmds)
+        for cmd, value in zip(cmds, values):
+            entry = self._entry(cmd.id, cmd.property, operation)
+            entry.latency.record(ns)
+            entry.calls += 1
+            if failed:
+                entry.errors += 1
+                continue
+            n_values, n_bytes = payload_size(value)
+            entry.values += n_values
+            entry.bytes += n_bytes
+
+    def get_natural_view_name(self):
+        return self.backend.get_natural_view_name()
+
+    async def trigger(self, dev_id: str, prop_id: str):
+        start = self.clock()
+        try:
+            r = await self.backend.trigger(dev_id=dev_id, prop_id=prop_id)
+        except Exception:
+            self._record(dev_id, prop_id, "trigger", start, failed=True)
+            raise
+        self._record(dev_id, prop_id, "trigger", start)
+        return r
+
+    async def read(self, dev_id: str, prop_id: str) -> object:
+        start = self.clock()
+        try:
+            r = await self.backend.read(dev_id=dev_id, prop_id=prop_id)
+        except Exception:
+            self._record(dev_id, prop_id, "read", start, failed=True)
+            raise
+        self._record(dev_id, prop_id, "read", start, r)
+        return r
+
+    async def trigger_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        start = self.clock()
+        try:
+            r = await self.backend.trigger_many(cmds)
+        except Exception:
+            self._record_many(cmds, "trigger_many", start, failed=True)
+            raise
+        self._record_many(cmds, "trigger_many", start)
+        return r
+
+    async def read_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        start = self.clock()
+        try:
+            r = await self.backend.read_many(cmds)
+        except Exception:
+            self._record_many(cmds, "read_many", start, failed=True)
+            raise
+        self._record_many(cmds, "read_many", start, r)
+        return r
+
+    def reset(self):
+        self.statistics = dict()
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+
+    def snapshot(self) -> Dict[str, object]:
+        """statistics recorded so far as plain, json serialisable dict"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return dict(
+            backend=repr(self.backend),
+            started=self.started.isoformat(),
+            taken=now.isoformat(),
+            operations=[
+                dict(dev_id=str(dev_id), prop_id=str(prop_id), operation=operation, **entry.snapshot())
+                # copy: can be called while calls are recorded
+                for (dev_id, prop_id, operation), entry in list(self.statistics.items())
+            ],
+        )
+
+    def dump(self, path: Union[str, Path]):
+        """write the snapshot as json to path, replacing it atomically"""
+        path = Path(path)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(self.snapshot(), fp, indent=1)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    async def _dump_periodically(self, path: Path, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.dump(path)
+            except OSError as exc:
+                logger.error(f"{self.__class__.__name__}: could not dump statistics to {path}: {exc}")
+
+    def start_periodic_dump(self, path: Union[str, Path], interval: float = 60.0) -> asyncio.Task:
+        """dump the snapshot every `interval` seconds until stopped"""
+        self.stop_periodic_dump()
+        self._dump_task = asyncio.ensure_future(self._dump_periodically(Path(path), interval))
+        return self._dump_task
+
+    def stop_periodic_dump(self):
+        if self._dump_task is not None:
+            self._dump_task.cancel()
+            self._dump_task = None
+
+
+class InstrumentedBackendRWProxy(InstrumentedBackendRProxy, BackendRW):
+    def __init__(self, *, backend: BackendRW, clock=time.perf_counter_ns):
+        super().__init__(backend=backend, clock=clock)
+        self.backend = backend
+
+    async def set(self, dev_id: str, prop_id: str, value: object):
+        start = self.clock()
+        try:
+            r = await self.backend.set(dev_id=dev_id, prop_id=prop_id, value=value)
+        except Exception:
+            self._record(dev_id, prop_id, "set", start, failed=True)
+            raise
+        self._record(dev_id, prop_id, "set", start, value)
+        return r
+
+    async def set_many(self, cmds: Sequence[Command]) -> Sequence[object]:
+        start = self.clock()
+        try:
+            r = await self.backend.set_many(cmds)
+        except Exception:
+            self._record_many(cmds, "set_many", start, failed=True)
+            raise
+        self._record_many(cmds, "set_many", start, [cmd.value for cmd in cmds])
+        return r
+
+
+__all__ = [
+    "InstrumentedBackendRProxy",
+    "InstrumentedBackendRWProxy",
+    "LatencyHistogram",
+    "OperationStatistics",
+]
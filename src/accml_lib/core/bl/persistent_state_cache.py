@@ -0,0 +1,259 @@
+"""State cache surviving a restart of the process
+
+If a correction process dies in the middle of a scan, the machine is
+left offset by deltas relative to reference values that only lived
+in memory. :class:`JournalingStateCache` appends each change to a
+journal file and replays it when created again.
+
+Journal format: a sequence of records, each one a 4 byte little endian
+length followed by that many bytes of pickle. A truncated last record
+(e.g. power cut while writing) is dropped on reload.
+"""
+import logging
+import os
+import pickle
+import queue
+import struct
+import threading
+from pathlib import Path
+from typing import Hashable, Iterable, Optional, Tuple, Union
+
+from .delta_backend import StateCache
+
+logger = logging.getLogger("accml")
+
+_header = struct.Struct("<I")
+
+
+def read_journal(path: Union[str, Path]) -> Tuple[list, int]:
+    """records of the journal and the length of its valid part"""
+    records = []
+    valid = 0
+    with open(path, "rb") as fp:
+        data = fp.read()
+    while valid + _header.size <= len(data):
+        (length,) = _header.unpack_from(data, valid)
+        end = valid + _header.size + length
+        if end > len(data):
+            break
+        try:
+            records.append(pickle.loads(data[valid + _header.size:end]))
+        except Exception as exc:
+            logger.warning(f"journal {path}: record at offset {valid} unreadable, dropping the rest: {exc}")
+            break
+        valid = end
+    if valid < len(data):
+        logger.warning(f"journal {path}: dropping {len(data) - valid} bytes of incomplete record")
+    return records, valid
+
+
+def _fsync_directory(path: Path):
+    """make a rename in the directory durable"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _record(op) -> bytes:
+    payload = pickle.dumps(op, protocol=pickle.HIGHEST_PROTOCOL)
+    return _header.pack(len(payload)) + payload
+
+
+class JournalingStateCache(StateCache):
+    """state cache whose changes are appended to a journal file
+
+    Changes are only put on a queue in :meth:`set` and friends. A
+    background thread pickles them, writes them in batches and calls
+    fsync once per batch, so the delta backend is not slowed down.
+
+    Snapshots are kept in memory only; restoring one is journaled.
+
+    Args:
+        path:           the journal file, replayed if it exists
+        fsync_interval: time [s] the writer waits for further changes
+                        before writing and syncing a batch
+
+    Warning:
+        values are pickled by the writer thread: they must not be
+        changed in place after they were set
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        path: Union[str, Path],
+        max_snapshots: int = 16,
+        fsync_interval: float = 0.05,
+    ):
+        super().__init__(name=name, max_snapshots=max_snapshots)
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self._error: Optional[BaseException] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._replay()
+        self._fp = open(self.path, "ab")
+        self._writer = threading.Thread(
+            target=self._write_loop, name=f"{self.__class__.__name__}({name})", daemon=True
+        )
+        self._writer.start()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(name={self.name}, path={self.path})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _replay(self):
+        if not self.path.exists():
+            return
+        records, valid = read_journal(self.path)
+        for op in records:
+            self._apply(op)
+        if valid < self.path.stat().st_size:
+            os.truncate(self.path, valid)
+        logger.info(f"{self}: replayed {len(records)} records, {len(self.cache)} references")
+
+    def _apply(self, op):
+        kind = op[0]
+        if kind == "set":
+            _, id, value = op
+            super().set(id, value)
+        elif kind == "set_many":
+            super().set_many(op[1])
+        elif kind == "clear":
+            super().clear()
+        elif kind == "replace":
+            super().clear()
+            super().set_many(op[1].items())
+        else:
+            raise ValueError(f"{self}: unknown journal record {kind!r}")
+
+    # --- changes: applied in memory, journaled by the writer thread
+    def _check_writable(self):
+        """raise before anything is changed that could not be journaled"""
+        if self._writer is None:
+            raise RuntimeError(f"{self} is closed")
+        if self._error is not None:
+            raise RuntimeError(f"{self}: writing journal failed") from self._error
+
+    def _journal(self, op):
+        self._check_writable()
+        self._queue.put(op)
+
+    def set(self, id, value):
+        self._check_writable()
+        super().set(id, value)
+        self._journal(("set", id, value))
+
+    def set_many(self, items: Iterable[Tuple[object, object]]):
+        self._check_writable()
+        items = list(items)
+        super().set_many(items)
+        self._journal(("set_many", items))
+
+    def clear(self):
+        self._check_writable()
+        super().clear()
+        self._journal(("clear",))
+
+    def restore(self, name: Hashable):
+        self._check_writable()
+        super().restore(name)
+        self._journal(("replace", dict(self.cache)))
+
+    # --- control
+    def _wait_for_writer(self, op, event: threading.Event):
+        self._journal(op)
+        event.wait()
+        if self._error is not None:
+            raise RuntimeError(f"{self}: writing journal failed") from self._error
+
+    def flush(self):
+        """return when all changes made so far are on disk"""
+        event = threading.Event()
+        self._wait_for_writer(("__flush__", event), event)
+
+    def compact(self):
+        """replace the journal by one record holding the current state"""
+        event = threading.Event()
+        self._wait_for_writer(("__compact__", dict(self.cache), event), event)
+
+    def close(self):
+        if self._writer is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+            self._fp.close()
+
+    # --- writer thread
+    def _write_loop(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            # collect what arrives shortly after: one fsync for all
+            while True:
+                try:
+                    batch.append(self._queue.get(timeout=self.fsync_interval))
+                except queue.Empty:
+                    break
+                if batch[-1] is None or batch[-1][0] in ("__flush__", "__compact__"):
+                    break
+
+            events = []
+            pending = []
+            for op in batch:
+                if op is None:
+                    stop = True
+                elif op[0] == "__flush__":
+                    events.append(op[1])
+                elif op[0] == "__compact__":
+                    self._write(pending)
+                    pending = []
+                    self._compact(op[1])
+                    events.append(op[2])
+                else:
+                    pending.append(op)
+            self._write(pending)
+            for event in events:
+                event.set()
+
+    def _write(self, ops):
+        if not ops:
+            return
+        try:
+            self._fp.write(b"".join(_record(op) for op in ops))
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+        except Exception as exc:
+            logger.error(f"{self}: could not write journal: {exc}")
+            self._error = exc
+
+    def _compact(self, state: dict):
+        tmp = self.path.with_name(self.path.name + ".compact")
+        try:
+            with open(tmp, "wb") as fp:
+                fp.write(_record(("replace", state)))
+                fp.flush()
+                os.fsync(fp.fileno())
+            self._fp.close()
+            os.replace(tmp, self.path)
+            _fsync_directory(self.path.parent)
+        except Exception as exc:
+            logger.error(f"{self}: could not compact journal: {exc}")
+            self._error = exc
+        finally:
+            if self._fp.closed:
+                self._fp = open(self.path, "ab")
+
+
+__all__ = ["JournalingStateCache", "read_journal"]
@@ -0,0 +1,274 @@
+"""Limit the load a middle layer puts on the control system
+
+A transaction of some hundred commands would otherwise be forwarded
+as some hundred simultaneous sets or reads. :class:`ThrottledBackend`
+bounds the number of operations in flight, globally and per device
+name prefix (e.g. one limit per IOC or Tango device server), and can
+limit the rate operations are started at.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+from ..interfaces.backend.backend import BackendRW
+from ..model.utils.command import Command, ReadCommand
+
+logger = logging.getLogger("accml")
+
+
+@dataclass
+class ThrottleStatistics:
+    #: operations waiting for a slot now
+    queued: int = 0
+    #: largest number of operations waiting at the same time
+    max_queued: int = 0
+    #: operations forwarded to the backend now
+    in_flight: int = 0
+    #: operations started
+    operations: int = 0
+    #: time spent waiting for a slot, summed over all operations [s]
+    total_wait: float = 0.0
+    #: longest time an operation waited for a slot [s]
+    max_wait: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        if not self.operations:
+            return 0.0
+        return self.total_wait / self.operations
+
+
+class TokenBucket:
+    """start at most `rate` operations per second, bursts up to `burst`"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if rate <= 0:
+            raise ValueError(f"{self.__class__.__name__}: rate must be positive, got {rate}")
+        if burst < 1:
+            raise ValueError(f"{self.__class__.__name__}: burst must be at least 1, got {burst}")
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.last = clock()
+        self._lock = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(rate={self.rate}, burst={self.burst})"
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    async def acquire(self, n: int = 1):
+        """take n tokens, waiting for each one as required"""
+        # created here: needs to belong to the running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # waiters are served in order
+        async with self._lock:
+            for _ in range(n):
+                while True:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ThrottledBackend(BackendRW):
+    """forwards operations to the backend, but only so many at a time
+
+    Args:
+        backend:       the backend to protect
+        max_in_flight: operations forwarded at the same time, None for
+                       no global limit
+        prefix_limits: operations in flight per device name prefix. If
+                       more than one prefix matches a device, the
+                       longest one applies.
+        rate:          operations started per second, None for no limit
+        burst:         operations that can be started at once when
+                       rate limiting
+
+    The batched operations (:meth:`read_many` etc.) are forwarded to
+    the batched operations of the backend, in chunks as large as the
+    limits allow. A chunk acquires the slots and tokens for all of its
+    commands before it is forwarded; chunks are forwarded one after
+    the other, in the order of the commands. Without limits a batch
+    is forwarded as a whole, e.g. as one transaction of the simulator.
+    """
+
+    def __init__(
+        self,
+        *,
+        backend: BackendRW,
+        max_in_flight: Optional[int] = None,
+        prefix_limits: Optional[Mapping[str, int]] = None,
+        rate: Optional[float] = None,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.max_in_flight = max_in_flight
+        self.prefix_limits = dict(prefix_limits or {})
+        for prefix, limit in self.prefix_limits.items():
+            if limit < 1:
+                raise ValueError(
+                    f"{self.__class__.__name__}: limit for prefix {prefix!r} must be at least 1, got {limit}"
+                )
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError(
+                f"{self.__class__.__name__}: max_in_flight must be at least 1, got {max_in_flight}"
+            )
+        # longest prefix first
+        self._prefixes = sorted(self.prefix_limits, key=len, reverse=True)
+        self.bucket = None if rate is None else TokenBucket(rate, burst, clock=clock)
+        self.clock = clock
+        self.statistics = ThrottleStatistics()
+        self._global = None
+        self._per_prefix: Dict[str, asyncio.Semaphore] = dict()
+        # slots are acquired by one operation or chunk at a time: no
+        # two can each hold a part of the slots the other one needs
+        self._acquiring = None
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(backend={self.backend}, max_in_flight={self.max_in_flight},"
+            f" prefix_limits={self.prefix_limits}, bucket={self.bucket})"
+        )
+
+    def prefix_of(self, dev_id: str) -> Optional[str]:
+        """the prefix limiting the device, None if none matches"""
+        for prefix in self._prefixes:
+            if str(dev_id).startswith(prefix):
+                return prefix
+        return None
+
+    def _semaphore_of_prefix(self, prefix: str) -> asyncio.Semaphore:
+        # created on first use: need to belong to the running loop
+        sem = self._per_prefix.get(prefix, None)
+        if sem is None:
+            sem = self._per_prefix[prefix] = asyncio.Semaphore(self.prefix_limits[prefix])
+        return sem
+
+    def _semaphores(self, dev_ids: Sequence[str]) -> List[asyncio.Semaphore]:
+        """one entry per slot required, prefixes before global"""
+        r = []
+        for dev_id in dev_ids:
+            prefix = self.prefix_of(dev_id)
+            if prefix is not None:
+                r.append(self._semaphore_of_prefix(prefix))
+        if self.max_in_flight is not None:
+            if self._global is None:
+                self._global = asyncio.Semaphore(self.max_in_flight)
+            r.extend([self._global] * len(dev_ids))
+        return r
+
+    def chunks(self, dev_ids: Sequence[str]) -> List[slice]:
+        """consecutive parts of a batch, each within the limits"""
+        r = []
+        start = 0
+        per_prefix: Dict[str, int] = dict()
+        for idx, dev_id in enumerate(dev_ids):
+            prefix = self.prefix_of(dev_id)
+            full = self.max_in_flight is not None and idx - start >= self.max_in_flight
+            if prefix is not None and per_prefix.get(prefix, 0) >= self.prefix_limits[prefix]:
+                full = True
+            if full:
+                r.append(slice(start, idx))
+                start = idx
+                per_prefix = dict()
+            if prefix is not None:
+                per_prefix[prefix] = per_prefix.get(prefix, 0) + 1
+        if start < len(dev_ids):
+            r.append(slice(start, len(dev_ids)))
+        return r
+
+    @asynccontextmanager
+    async def _slots(self, dev_ids: Sequence[str]):
+        """slots and tokens for operations on all dev_ids
+
+        dev_ids have to be within the limits, see :meth:`chunks`
+        """
+        n = len(dev_ids)
+        stats = self.statistics
+        start = self.clock()
+        stats.queued += n
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        if self._acquiring is None:
+            self._acquiring = asyncio.Lock()
+        acquired = []
+        try:
+            async with self._acquiring:
+                for sem in self._semaphores(dev_ids):
+                    await sem.acquire()
+                    acquired.append(sem)
+            if self.bucket is not None:
+                await self.bucket.acquire(n)
+        except BaseException:
+            for sem in reversed(acquired):
+                sem.release()
+            raise
+        finally:
+            stats.queued -= n
+
+        wait = self.clock() - start
+        stats.operations += n
+        stats.total_wait += wait * n
+        stats.max_wait = max(stats.max_wait, wait)
+        stats.in_flight += n
+        try:
+            yield
+        finally:
+            stats.in_flight -= n
+            for sem in reversed(acquired):
+                sem.release()
+
+    def _slot(self, dev_id: str):
+        return self._slots([dev_id])
+
+    def get_natural_view_name(self):
+        return self.backend.get_natural_view_name()
+
+    async def trigger(self, dev_id: str, prop_id: str):
+        async with self._slot(dev_id):
+            return await self.backend.trigger(dev_id=dev_id, prop_id=prop_id)
+
+    async def read(self, dev_id: str, prop_id: str) -> object:
+        async with self._slot(dev_id):
+            return await self.backend.read(dev_id=dev_id, prop_id=prop_id)
+
+    async def set(self, dev_id: str, prop_id: str, value: object):
+        async with self._slot(dev_id):
+            return await self.backend.set(dev_id=dev_id, prop_id=prop_id, value=value)
+
+    async def _in_chunks(self, method, cmds: Sequence) -> Sequence[object]:
+        cmds = list(cmds)
+        dev_ids = [cmd.id for cmd in cmds]
+        r = []
+        for chunk in self.chunks(dev_ids):
+            async with self._slots(dev_ids[chunk]):
+                r.extend(await method(cmds[chunk]))
+        return r
+
+    async def trigger_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        return await self._in_chunks(self.backend.trigger_many, cmds)
+
+    async def read_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        return await self._in_chunks(self.backend.read_many, cmds)
+
+    async def set_many(self, cmds: Sequence[Command]) -> Sequence[object]:
+        return await self._in_chunks(self.backend.set_many, cmds)
+
+
+__all__ = ["ThrottledBackend", "ThrottleStatistics", "TokenBucket"]
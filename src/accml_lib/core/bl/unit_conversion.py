@@ -1,4 +1,7 @@
 import logging
+from typing import Tuple, Union
+
+import numpy as np
 
 from ..interfaces.utils.state_conversion import StateConversion
 
@@ -68,4 +71,43 @@ class LinearUnitConversion(StateConversion):
         return (state - self.intercept) / self.slope
 
 
-__all__ = ["EnergyDependentLinearUnitConversion", "LinearUnitConversion"]
+def linear_coefficients(
+    conversion: StateConversion,
+) -> Union[Tuple[float, float, float], None]:
+    """(intercept, slope, brho) of a linear conversion
+
+    Returns None for conversions which can not be expressed as
+    :math:`(intercept + slope * state) * brho`, so that callers can
+    fall back to the conversion's own forward / inverse
+    """
+    if isinstance(conversion, EnergyDependentLinearUnitConversion):
+        return conversion.intercept, conversion.slope, conversion.brho
+    if isinstance(conversion, LinearUnitConversion):
+        return conversion.intercept, conversion.slope, 1.0
+    return None
+
+
+def linear_forward(
+    state: np.ndarray, intercept: np.ndarray, slope: np.ndarray, brho: np.ndarray
+) -> np.ndarray:
+    """forward of many linear conversions in one go
+
+    All arguments are expected to be broadcastable to each other
+    """
+    return (intercept + slope * state) * brho
+
+
+def linear_inverse(
+    state: np.ndarray, intercept: np.ndarray, slope: np.ndarray, brho: np.ndarray
+) -> np.ndarray:
+    """inverse of many linear conversions in one go"""
+    return (state - intercept * brho) / (slope * brho)
+
+
+__all__ = [
+    "EnergyDependentLinearUnitConversion",
+    "LinearUnitConversion",
+    "linear_coefficients",
+    "linear_forward",
+    "linear_inverse",
+]
@@ -1,30 +1,148 @@
+from collections import defaultdict
+from typing import Dict, Hashable, Sequence, Tuple
+
 from ..model.config.magnet import MagneticObject
 from ..model.config.power_converter import PowerConverter
+from .repository.base import Repository
 from .repository.file_repository import FileRepository
+from .utils import default_cache_dir
+
+_default = object()
 
 
 class ConfigService:
     """
-    TODO: the init is FileRepository specific, expand it to db in the next step
+    The init is FileRepository specific, use :meth:`from_repositories`
+    or :meth:`from_sqlite` for other repositories
+
+    Parsed and validated files are cached in `cache_dir`, if given.
+    By default the cache is off unless enabled by the environment (see
+    :func:`default_cache_dir`)
+
+    On load the magnets are indexed by elem_id, type, family and power
+    converter. The query methods return immutable tuples out of these
+    indices, so repeated queries do not scan the magnets again.
+
+    Repositories opened by the service itself (see :meth:`from_sqlite`)
+    are closed once loaded and by :meth:`close`.
     """
 
-    def __init__(self, magnet_path: str, pc_path: str):
-        self.magnet_repo = FileRepository(MagneticObject, magnet_path)
-        self.pc_repo = FileRepository(PowerConverter, pc_path)
+    def __init__(self, magnet_path: str, pc_path: str, cache_dir=_default):
+        if cache_dir is _default:
+            cache_dir = default_cache_dir()
+        self._init_repositories(
+            FileRepository(MagneticObject, magnet_path, cache_dir=cache_dir),
+            FileRepository(PowerConverter, pc_path, cache_dir=cache_dir),
+        )
+
+    @classmethod
+    def from_repositories(cls, magnet_repo: Repository[MagneticObject], pc_repo: Repository[PowerConverter]):
+        """e.g. for repositories stored in a database"""
+        self = cls.__new__(cls)
+        self._init_repositories(magnet_repo, pc_repo)
+        return self
+
+    @classmethod
+    def from_sqlite(cls, db_path: str):
+        """configuration imported by :mod:`accml_lib.core.config.sqlite_import`"""
+        from .sqlite_import import magnet_repository, power_converter_repository
+
+        self = cls.from_repositories(magnet_repository(db_path), power_converter_repository(db_path))
+        self._owned_repositories = (self.magnet_repo, self.pc_repo)
+        return self
+
+    def _init_repositories(self, magnet_repo: Repository[MagneticObject], pc_repo: Repository[PowerConverter]):
+        self.magnet_repo = magnet_repo
+        self.pc_repo = pc_repo
+        self._owned_repositories = ()
         self._magnets = None
         self._power_converters = None
+        self._by_elem_id: Dict[Hashable, MagneticObject] = dict()
+        self._by_type: Dict[str, Tuple[MagneticObject, ...]] = dict()
+        self._by_family: Dict[str, Tuple[MagneticObject, ...]] = dict()
+        self._by_power_converter: Dict[Hashable, Tuple[MagneticObject, ...]] = dict()
 
     def load(self):
-        self._magnets = self.magnet_repo.load()
-        self._power_converters = {pc.id: pc for pc in self.pc_repo.load()}
+        """
+        Raises:
+            ValueError: if an element id is configured twice
+        """
+        # consume the repositories item by item: raw and validated
+        # data are never held at the same time
+        try:
+            self._magnets = list(self.magnet_repo.iter_load())
+            self._power_converters = {pc.id: pc for pc in self.pc_repo.iter_load()}
+        finally:
+            # everything needed is in memory now
+            self.close()
+        self._build_indices()
 
-    def get_magnets(self):
-        return self._magnets
+    def close(self):
+        """close the repositories the service opened itself"""
+        for repo in self._owned_repositories:
+            repo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
-    def get_quadrupoles(self) -> list[MagneticObject]:
+    def _build_indices(self):
+        by_type = defaultdict(list)
+        by_family = defaultdict(list)
+        by_power_converter = defaultdict(list)
+        by_elem_id = dict()
+        for magnet in self._magnets:
+            if magnet.elem_id in by_elem_id:
+                raise ValueError(f"{self.__class__.__name__}: element id {magnet.elem_id!r} configured twice")
+            by_elem_id[magnet.elem_id] = magnet
+            by_type[magnet.type].append(magnet)
+            for family in magnet.family_member:
+                by_family[family].append(magnet)
+            by_power_converter[magnet.power_converter_id].append(magnet)
+
+        self._by_elem_id = by_elem_id
+        self._by_type = {key: tuple(val) for key, val in by_type.items()}
+        self._by_family = {key: tuple(val) for key, val in by_family.items()}
+        self._by_power_converter = {key: tuple(val) for key, val in by_power_converter.items()}
+
+    def _check_loaded(self):
         if self._magnets is None:
             raise RuntimeError("Configuration not loaded.")
-        return [quad for quad in self._magnets if quad.type == "quadrupole"]
+
+    def get_magnets(self):
+        return self._magnets
+
+    def get_magnet(self, elem_id: Hashable) -> MagneticObject:
+        self._check_loaded()
+        return self._by_elem_id[elem_id]
+
+    def get_magnets_of_type(self, type_: str) -> Sequence[MagneticObject]:
+        """e.g. all quadrupoles, empty if type is unknown"""
+        self._check_loaded()
+        return self._by_type.get(type_, ())
+
+    def get_family_members(self, family: str) -> Sequence[MagneticObject]:
+        """all magnets listing `family` in their family_member"""
+        self._check_loaded()
+        return self._by_family.get(family, ())
+
+    def get_magnets_on_power_converter(self, power_converter_id: Hashable) -> Sequence[MagneticObject]:
+        """all magnets powered by this power converter"""
+        self._check_loaded()
+        return self._by_power_converter.get(power_converter_id, ())
+
+    def get_types(self) -> Sequence[str]:
+        self._check_loaded()
+        return tuple(self._by_type)
+
+    def get_families(self) -> Sequence[str]:
+        self._check_loaded()
+        return tuple(self._by_family)
+
+    def get_quadrupoles(self) -> Sequence[MagneticObject]:
+        return self.get_magnets_of_type("quadrupole")
 
     def get_power_converter(self, id):
         return self._power_converters[id]
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Sequence
+from typing import Generic, Iterator, TypeVar, Sequence
 
 T = TypeVar("T")
 
@@ -9,3 +9,11 @@ class Repository(ABC, Generic[T]):
     @abstractmethod
     def load(self) -> Sequence[T]:
         pass
+
+    def iter_load(self) -> Iterator[T]:
+        """yield the models one by one
+
+        Derived classes should override it if they can avoid
+        materialising all raw data first
+        """
+        yield from self.load()
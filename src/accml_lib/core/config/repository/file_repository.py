@@ -1,6 +1,13 @@
+import functools
+import hashlib
+import importlib.metadata
 import json
+import logging
+import os
+import pickle
+import tempfile
 from pathlib import Path
-from typing import List, Type, TypeVar
+from typing import Iterator, List, Type, TypeVar, Union
 
 import yaml
 
@@ -8,14 +15,188 @@ from .base import Repository
 
 T = TypeVar("T")
 
+logger = logging.getLogger("accml")
+
+
+def iter_yaml_items(stream) -> Iterator[object]:
+    """yield the items of a yaml stream one at a time
+
+    The top level sequence of each document is not composed as a
+    whole: each of its items is composed, constructed and yielded on
+    its own, so only one raw item is held in memory. A document whose
+    root is not a sequence is yielded as a single item. This allows
+    both a single document holding a list and a multi document stream
+    (one item per document).
+    """
+    loader = yaml.SafeLoader(stream)
+    try:
+        loader.get_event()  # stream start
+        while not loader.check_event(yaml.StreamEndEvent):
+            loader.get_event()  # document start
+            if loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    yield loader.construct_document(loader.compose_node(None, None))
+                loader.get_event()  # sequence end
+            else:
+                yield loader.construct_document(loader.compose_node(None, None))
+            loader.get_event()  # document end
+            loader.anchors = {}
+    finally:
+        loader.dispose()
+
+
+def iter_json_lines(stream) -> Iterator[object]:
+    """one json object per (non empty) line"""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+@functools.lru_cache(maxsize=None)
+def package_version() -> str:
+    try:
+        return importlib.metadata.version("accml_lib")
+    except importlib.metadata.PackageNotFoundError:
+        # e.g. used from a source checkout
+        return "unknown"
+
+
+def model_signature(model_cls: type) -> str:
+    """hash of the fields of the model and their types"""
+    fields = getattr(model_cls, "model_fields", None)
+    if fields is not None:
+        # pydantic
+        items = [(name, repr(field.annotation)) for name, field in fields.items()]
+    else:
+        items = [
+            (name, repr(annotation))
+            for klass in reversed(model_cls.__mro__)
+            for name, annotation in getattr(klass, "__annotations__", {}).items()
+        ]
+    return hashlib.sha256(repr(items).encode()).hexdigest()[:12]
+
 
 class FileRepository(Repository[T]):
-    def __init__(self, model_cls: Type[T], path: str):
+    """Models stored in a yaml, json or json lines (.jsonl) file
+
+    :meth:`iter_load` parses yaml and json lines files incrementally
+    and validates one item after the other, so the raw data is never
+    held in memory as a whole. Empty items (e.g. empty yaml documents)
+    are skipped.
+
+    If a cache directory is given, the validated models are pickled
+    there, keyed by the hash of the file content, the accml_lib version
+    and the fields of the model. As long as none of these changes,
+    loading then skips parsing and validation. Snapshots made for
+    another key are removed when a new one is stored.
+    """
+
+    yaml_suffixes = (".yaml", ".yml")
+    json_lines_suffixes = (".jsonl", ".ndjson")
+
+    def __init__(self, model_cls: Type[T], path: str, *, cache_dir: Union[str, Path, None] = None):
         self.model_cls = model_cls
         self.path = path
+        self.cache_dir = cache_dir
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.model_cls.__name__}, path={self.path}, cache_dir={self.cache_dir})"
 
     def load(self) -> List[T]:
+        return list(self.iter_load())
+
+    def iter_load(self) -> Iterator[T]:
+        cache_path = self._cache_path()
+        if cache_path is not None:
+            r = self._load_from_cache(cache_path)
+            if r is not None:
+                yield from r
+                return
+
+        if cache_path is None:
+            yield from self._iter_parse()
+            return
+
+        # snapshot needs all validated models, but never the raw data
+        models = []
+        for model in self._iter_parse():
+            models.append(model)
+            yield model
+        self._store_in_cache(cache_path, models)
+
+    def _iter_parse(self) -> Iterator[T]:
         ext = Path(self.path).suffix
-        with open(self.path, "r") as f:
-            raw = yaml.safe_load(f) if ext in [".yaml", ".yml"] else json.load(f)
-        return [self.model_cls(**item) for item in raw]
+        with open(self.path, "rb") as f:
+            if ext in self.yaml_suffixes:
+                items = iter_yaml_items(f)
+            elif ext in self.json_lines_suffixes:
+                items = iter_json_lines(f)
+            else:
+                items = iter(json.load(f))
+            for item in items:
+                if item is None:
+                    continue
+                yield self.model_cls(**item)
+
+    def _cache_path(self) -> Union[Path, None]:
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha256()
+        # pickles of models differing from the current ones could
+        # load without error, but hold wrong data
+        digest.update(f"{package_version()}\0{model_signature(self.model_cls)}\0".encode())
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        return Path(self.cache_dir) / f"{self._cache_prefix()}{digest.hexdigest()}.pickle"
+
+    def _cache_prefix(self) -> str:
+        # files of the same name in different directories must not
+        # evict each other's snapshots
+        location = hashlib.sha256(str(Path(self.path).resolve()).encode()).hexdigest()[:12]
+        return f"{Path(self.path).stem}-{location}-{self.model_cls.__module__}.{self.model_cls.__qualname__}-"
+
+    def _load_from_cache(self, cache_path: Path) -> Union[List[T], None]:
+        try:
+            with open(cache_path, "rb") as f:
+                r = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            # e.g. model class changed since the snapshot was taken
+            logger.warning("%s: ignoring unusable cache %s: %s", self.__class__.__name__, cache_path, exc)
+            return None
+        logger.debug("%s: loaded %s from cache %s", self.__class__.__name__, self.path, cache_path)
+        return r
+
+    def _store_in_cache(self, cache_path: Path, models: List[T]):
+        tmp_name = None
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first: concurrent processes
+            # must never see a half written snapshot
+            fd, tmp_name = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(models, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, cache_path)
+            tmp_name = None
+        except Exception as exc:
+            # e.g. models that can not be pickled: caching is optional
+            logger.warning("%s: could not write cache %s: %s", self.__class__.__name__, cache_path, exc)
+            return
+        finally:
+            if tmp_name is not None:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+
+        # snapshots of earlier versions of this file are not needed any more
+        for stale in cache_path.parent.glob(f"{self._cache_prefix()}*.pickle"):
+            if stale != cache_path:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
@@ -0,0 +1,187 @@
+"""Models stored in a sqlite database
+
+One table per model class. Each row holds the model serialised as
+json together with a few columns copied out of the model, which are
+indexed. These allow fetching single models (:meth:`SqliteRepository.get`)
+or a selection (:meth:`SqliteRepository.query`) without loading and
+validating the whole configuration.
+"""
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Iterator, List, Sequence, Type, TypeVar, Union
+
+from .base import Repository
+
+T = TypeVar("T")
+
+logger = logging.getLogger("accml")
+
+
+def _column_value(value: object):
+    """sqlite stores str, int and float as they are, anything else as its str"""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+def _model_to_json(model) -> str:
+    # pydantic 2 / pydantic 1
+    to_json = getattr(model, "model_dump_json", None) or model.json
+    return to_json()
+
+
+def _check_identifier(name: str) -> str:
+    # table and column names end up in the sql statements
+    if not name.isidentifier():
+        raise ValueError(f"{name!r} is not usable as sql identifier")
+    return name
+
+
+class SqliteRepository(Repository[T]):
+    """Repository backed by a sqlite table
+
+    Args:
+        model_cls: the (pydantic) model stored in the table
+        path:      the sqlite database file
+        table:     name of the table
+        key:       model field used as unique key, e.g. elem_id
+        indexed:   further model fields copied to indexed columns,
+                   these can be used by :meth:`query`
+    """
+
+    def __init__(
+        self,
+        model_cls: Type[T],
+        path: Union[str, Path],
+        *,
+        table: str,
+        key: str,
+        indexed: Sequence[str] = (),
+    ):
+        self.model_cls = model_cls
+        self.path = path
+        self.table = _check_identifier(table)
+        self.key = _check_identifier(key)
+        self.indexed = tuple(_check_identifier(col) for col in indexed)
+        self._connection = None
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.model_cls.__name__}, path={self.path},"
+            f" table={self.table}, key={self.key}, indexed={self.indexed})"
+        )
+
+    @property
+    def columns(self) -> Sequence[str]:
+        return (self.key,) + self.indexed
+
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(str(self.path))
+            self.create_table()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def create_table(self):
+        con = self.connection()
+        cols = ", ".join(self.indexed + ("data TEXT NOT NULL",))
+        with con:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ({self.key} UNIQUE NOT NULL, {cols})"
+            )
+            for col in self.indexed:
+                con.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.table}_{col} ON {self.table} ({col})"
+                )
+
+    def store(self, models: Iterable[T], *, replace_all: bool = False) -> int:
+        """insert or update the models
+
+        Args:
+            replace_all: remove all models stored before
+
+        Returns:
+            number of models stored
+        """
+        con = self.connection()
+        placeholders = ", ".join(["?"] * (len(self.columns) + 1))
+        sql = f"INSERT OR REPLACE INTO {self.table} ({', '.join(self.columns)}, data) VALUES ({placeholders})"
+        rows = (
+            tuple(_column_value(getattr(model, col)) for col in self.columns)
+            + (_model_to_json(model),)
+            for model in models
+        )
+        with con:
+            if replace_all:
+                con.execute(f"DELETE FROM {self.table}")
+            cursor = con.executemany(sql, rows)
+        return cursor.rowcount
+
+    def _models(self, cursor) -> Iterator[T]:
+        for (data,) in cursor:
+            yield self.model_cls(**json.loads(data))
+
+    def load(self) -> List[T]:
+        return list(self.iter_load())
+
+    def iter_load(self) -> Iterator[T]:
+        cursor = self.connection().execute(f"SELECT data FROM {self.table} ORDER BY rowid")
+        yield from self._models(cursor)
+
+    def get(self, id_) -> T:
+        """the model stored under key `id_`
+
+        Raises:
+            KeyError: if no such model is stored
+        """
+        cursor = self.connection().execute(
+            f"SELECT data FROM {self.table} WHERE {self.key} = ?", (_column_value(id_),)
+        )
+        r = list(self._models(cursor))
+        if not r:
+            logger.error(f"{self.__class__.__name__}: {self.key}={id_} not found in table {self.table}")
+            raise KeyError(id_)
+        (model,) = r
+        return model
+
+    def query(self, **criteria) -> List[T]:
+        """models matching all criteria, e.g. `query(type="quadrupole")`
+
+        A sequence as value matches any of its entries. Only the key and
+        the indexed columns can be used.
+        """
+        unknown = set(criteria) - set(self.columns)
+        if unknown:
+            raise ValueError(
+                f"{self.__class__.__name__}: can only query {self.columns}, not {sorted(unknown)}"
+            )
+        conditions = []
+        args = []
+        for col, value in criteria.items():
+            if isinstance(value, (list, tuple, set, frozenset)):
+                values = [_column_value(v) for v in value]
+                conditions.append(f"{col} IN ({', '.join(['?'] * len(values))})")
+                args.extend(values)
+            else:
+                conditions.append(f"{col} = ?")
+                args.append(_column_value(value))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.connection().execute(
+            f"SELECT data FROM {self.table}{where} ORDER BY rowid", args
+        )
+        return list(self._models(cursor))
+
+
+__all__ = ["SqliteRepository"]
@@ -0,0 +1,64 @@
+"""Import the yaml (or json) configuration into a sqlite database
+
+Usage::
+
+    python -m accml_lib.core.config.sqlite_import magnets.yaml power_converters.yaml config.sqlite
+
+The tables are replaced on each import, so the database mirrors the
+files afterwards.
+"""
+import argparse
+import logging
+from pathlib import Path
+from typing import Sequence, Tuple, Union
+
+from ..model.config.magnet import MagneticObject
+from ..model.config.power_converter import PowerConverter
+from .repository.file_repository import FileRepository
+from .repository.sqlite_repository import SqliteRepository
+
+logger = logging.getLogger("accml")
+
+
+def magnet_repository(db_path: Union[str, Path]) -> SqliteRepository[MagneticObject]:
+    return SqliteRepository(
+        MagneticObject,
+        db_path,
+        table="magnets",
+        key="elem_id",
+        indexed=("dev_id", "type", "power_converter_id"),
+    )
+
+
+def power_converter_repository(db_path: Union[str, Path]) -> SqliteRepository[PowerConverter]:
+    return SqliteRepository(PowerConverter, db_path, table="power_converters", key="id")
+
+
+def import_config(
+    magnet_path: Union[str, Path], pc_path: Union[str, Path], db_path: Union[str, Path]
+) -> Tuple[int, int]:
+    """Returns: number of magnets and power converters imported"""
+    r = []
+    for repo, src in (
+        (magnet_repository(db_path), FileRepository(MagneticObject, magnet_path)),
+        (power_converter_repository(db_path), FileRepository(PowerConverter, pc_path)),
+    ):
+        with repo:
+            n = repo.store(src.iter_load(), replace_all=True)
+        logger.info("imported %d entries from %s into %s", n, src.path, repo)
+        r.append(n)
+    return tuple(r)
+
+
+def main(argv: Sequence[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("magnets", help="magnets yaml / json file")
+    parser.add_argument("power_converters", help="power converters yaml / json file")
+    parser.add_argument("database", help="sqlite database to create or update")
+    args = parser.parse_args(argv)
+    n_magnets, n_pcs = import_config(args.magnets, args.power_converters, args.database)
+    print(f"imported {n_magnets} magnets and {n_pcs} power converters into {args.database}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import logging
+import os
 from pathlib import Path
+from typing import Union
 
 logger = logging.getLogger("accml")
 
@@ -12,3 +14,15 @@ def full_data_path(path: Path):
     # Todo: get a better logging message
     logger.info("Loading data path %s from %s", path, full_path)
     return full_path
+
+
+def default_cache_dir() -> Union[Path, None]:
+    """Directory for cached configuration snapshots, if caching is wanted
+
+    Caching is opt in: taken from environment variable
+    `ACCML_LIB_CACHE_DIR`, None if it is not set or empty. Snapshots
+    are unpickled: only point it to a directory that no one else can
+    write to.
+    """
+    path = os.environ.get("ACCML_LIB_CACHE_DIR", None)
+    return Path(path) if path else None
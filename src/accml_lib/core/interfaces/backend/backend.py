@@ -5,7 +5,11 @@ It needs rather to address the whole accelerator
 Why: there is not always a direct mapping from one
      entity in the "design" view to the "device" view
 """
+import asyncio
 from abc import ABCMeta, abstractmethod
+from typing import Sequence
+
+from ...model.utils.command import Command, ReadCommand
 
 
 class BackendR(metaclass=ABCMeta):
@@ -23,8 +27,41 @@ class BackendR(metaclass=ABCMeta):
     async def read(self, dev_id: str, prop_id: str) -> object:
         raise NotImplementedError("use base class instead")
 
+    async def trigger_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        """trigger all, results in order of the commands
+
+        Default implementation triggers concurrently. Derived classes
+        should override it if they can handle all in one pass
+        """
+        return await asyncio.gather(
+            *[self.trigger(dev_id=cmd.id, prop_id=cmd.property) for cmd in cmds]
+        )
+
+    async def read_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        """read all, values in order of the commands
+
+        Default implementation reads concurrently. Derived classes
+        should override it if they can handle all in one pass
+        """
+        return await asyncio.gather(
+            *[self.read(dev_id=cmd.id, prop_id=cmd.property) for cmd in cmds]
+        )
+
 
 class BackendRW(BackendR, metaclass=ABCMeta):
     @abstractmethod
     async def set(self, dev_id: str, prop_id: str, value: object):
         raise NotImplementedError("use base class instead")
+
+    async def set_many(self, cmds: Sequence[Command]) -> Sequence[object]:
+        """set all, e.g. the commands of a transaction
+
+        Default implementation sets concurrently. Derived classes
+        should override it if they can handle all in one pass
+        """
+        return await asyncio.gather(
+            *[
+                self.set(dev_id=cmd.id, prop_id=cmd.property, value=cmd.value)
+                for cmd in cmds
+            ]
+        )
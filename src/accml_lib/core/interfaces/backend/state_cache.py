@@ -0,0 +1,72 @@
+"""Reference values of the delta backends
+
+A state cache maps a read command to the value read when the first
+delta operation on this property was made. Snapshots of it allow
+returning to an earlier reference (e.g. after a scan restart) without
+reading the machine again.
+"""
+from abc import ABCMeta, abstractmethod
+from typing import Hashable, Iterable, KeysView, Mapping, Optional, Sequence, Tuple
+
+
+class StateCacheInterface(metaclass=ABCMeta):
+    @abstractmethod
+    def clear(self):
+        """forget all reference values, snapshots are kept"""
+        raise NotImplementedError("use derived class instead")
+
+    @abstractmethod
+    def keys(self) -> KeysView:
+        raise NotImplementedError("use derived class instead")
+
+    @abstractmethod
+    def get(self, id, default=None):
+        raise NotImplementedError("use derived class instead")
+
+    @abstractmethod
+    def set(self, id, value):
+        raise NotImplementedError("use derived class instead")
+
+    def get_many(self, ids: Sequence, default=None) -> Sequence[object]:
+        return [self.get(id, default) for id in ids]
+
+    def set_many(self, items: Iterable[Tuple[object, object]]):
+        """set all (id, value) pairs"""
+        for id, value in items:
+            self.set(id, value)
+
+    @abstractmethod
+    def snapshot(self, name: Optional[Hashable] = None) -> Hashable:
+        """keep the current reference values
+
+        Args:
+            name: the snapshot is stored under, if None a version
+                  number is used
+
+        Returns:
+            the name the snapshot is stored under
+        """
+        raise NotImplementedError("use derived class instead")
+
+    @abstractmethod
+    def restore(self, name: Hashable):
+        """make the values of the snapshot the current reference values
+
+        Raises:
+            KeyError: if no such snapshot is kept
+        """
+        raise NotImplementedError("use derived class instead")
+
+    @abstractmethod
+    def snapshot_values(self, name: Hashable) -> Mapping:
+        """read only view of the values of a snapshot, e.g. for comparison"""
+        raise NotImplementedError("use derived class instead")
+
+    @abstractmethod
+    def snapshots(self) -> Sequence[Hashable]:
+        """names of the snapshots kept, least recently used first"""
+        raise NotImplementedError("use derived class instead")
+
+    @abstractmethod
+    def drop_snapshot(self, name: Hashable):
+        raise NotImplementedError("use derived class instead")
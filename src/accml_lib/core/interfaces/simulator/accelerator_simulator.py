@@ -6,8 +6,10 @@ Todo:
 
 """
 from abc import ABCMeta, abstractmethod
+from typing import Sequence
 
 from .element import ElementInterface
+from ...model.utils.command import Command
 
 
 class AcceleratorSimulatorInterface(metaclass=ABCMeta):
@@ -23,3 +25,15 @@ class AcceleratorSimulatorInterface(metaclass=ABCMeta):
         Review if derived classes use async implementations
         """
         pass
+
+    async def update_many(self, commands: Sequence[Command]) -> Sequence[object]:
+        """update the elements for all commands, in order
+
+        Default implementation updates one element after the other.
+        Derived classes should override it if they can update many
+        elements in one pass
+        """
+        return [
+            await self.get(cmd.id).update(property_id=cmd.property, value=cmd.value)
+            for cmd in commands
+        ]
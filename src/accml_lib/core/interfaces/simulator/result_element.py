@@ -1,6 +1,23 @@
+import asyncio
+import warnings
 from abc import ABCMeta, abstractmethod
 
 
+def run_blocking(coro):
+    """run a coroutine to completion for a caller that is not async
+
+    Raises:
+        RuntimeError: if called from a running event loop, which it
+                      would block. Await the coroutine there instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    coro.close()
+    raise RuntimeError("can not block within a running event loop: await the coroutine instead")
+
+
 class ResultElement(metaclass=ABCMeta):
     """
     Todo:
@@ -10,5 +27,17 @@ class ResultElement(metaclass=ABCMeta):
     """
 
     @abstractmethod
-    def get(self, prop_id: str) -> object:
+    async def get(self, prop_id: str) -> object:
         raise NotImplementedError("use derived class instead")
+
+    def get_sync(self, prop_id: str) -> object:
+        """blocking :meth:`get`, as it was before it became a coroutine
+
+        Deprecated: await :meth:`get` instead
+        """
+        warnings.warn(
+            f"{self.__class__.__name__}.get_sync is deprecated, await get() instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return run_blocking(self.get(prop_id))
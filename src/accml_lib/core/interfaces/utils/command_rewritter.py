@@ -1,9 +1,9 @@
 """convert the values from one state space
 """
 from abc import ABCMeta, abstractmethod
-from typing import Sequence
+from typing import Sequence, Union
 
-from ....core.model.utils.command import Command, ReadCommand
+from ....core.model.utils.command import Command, ReadCommand, TransactionCommand
 
 
 class CommandRewriterBase(metaclass=ABCMeta):
@@ -18,6 +18,26 @@ class CommandRewriterBase(metaclass=ABCMeta):
     def inverse(self, command: Command) -> Sequence[Command]:
         raise NotImplementedError("use derived class instead")
 
+    def forward_many(
+        self, commands: Union[Sequence[Command], TransactionCommand]
+    ) -> Sequence[Command]:
+        """forward a batch of commands, result in input order
+
+        Derived classes are expected to override it if they can do
+        better than translating one command after the other
+        """
+        if isinstance(commands, TransactionCommand):
+            commands = commands.transaction
+        return [self.forward(cmd) for cmd in commands]
+
+    def inverse_many(
+        self, commands: Union[Sequence[Command], TransactionCommand]
+    ) -> Sequence[Command]:
+        """inverse a batch of commands, result flattened in input order"""
+        if isinstance(commands, TransactionCommand):
+            commands = commands.transaction
+        return [ncmd for cmd in commands for ncmd in self.inverse(cmd)]
+
     @abstractmethod
     def forward_read_command(self, command: ReadCommand) -> Sequence[ReadCommand]:
         """Typically an answer of liaison manager"""
@@ -0,0 +1,352 @@
+"""Direct encoder / decoder for result and command models
+
+Produces the same plain dicts as the `jsons` serialisers registered by
+:mod:`accml_lib.core.model.jsons_support`, but without going through
+`jsons` for the models known here. Payloads of unknown type are still
+delegated to `jsons`, so the output round trips with the jsons based
+format.
+
+Orbits are encoded by their fields only: the per bpm lookup table
+and the derived channel properties of :class:`ArrayOrbit`, which
+`jsons` adds, are left out. Values not available (nan) become null
+with orjson; they are decoded as nan again.
+
+:func:`dumps` / :func:`loads` convert to bytes, using `orjson` or
+`msgpack` if installed and the standard library json module else.
+"""
+import dataclasses
+import datetime
+import functools
+import json
+import math
+from typing import Any, Dict, Tuple, Type, TypeVar, Union
+
+import numpy as np
+
+from .output.orbit import ArrayOrbit, BPMButtons, BPMPosition, BPMReading, Orbit
+from .output.result import ReadTogether, Result, ResultOfExecutionStep, SingleReading
+from .utils.command import BehaviourOnError, Command, ReadCommand
+
+T = TypeVar("T")
+
+
+@functools.lru_cache(maxsize=None)
+def _plain_dataclass_fields(cls: type) -> Union[Tuple[str, ...], None]:
+    """field names if jsons would serialise instances by their fields only
+
+    jsons also serialises properties: classes having some are left to it
+    """
+    if not dataclasses.is_dataclass(cls):
+        return None
+    for name in dir(cls):
+        if isinstance(getattr(cls, name, None), (property, functools.cached_property)):
+            return None
+    return tuple(f.name for f in dataclasses.fields(cls))
+
+
+def _flat_dataclass_dict(value) -> Union[Dict[str, Any], None]:
+    """dict of a dataclass instance holding only scalars, None otherwise"""
+    fields = _plain_dataclass_fields(type(value))
+    if fields is None or len(fields) != len(getattr(value, "__dict__", ())):
+        return None
+    d = {name: getattr(value, name) for name in fields}
+    if not all(type(v) in (int, float, str, bool) for v in d.values()):
+        return None
+    return d
+
+
+def _float(v) -> float:
+    return math.nan if v is None else float(v)
+
+
+def encode_bpm_reading(reading: BPMReading, **kwargs) -> Dict[str, Any]:
+    pos, btns = reading.pos, reading.btns
+    return dict(
+        name=_encode_id(reading.name, **kwargs),
+        pos=dict(x=pos.x, y=pos.y),
+        btns=dict(a=btns.a, b=btns.b, c=btns.c, d=btns.d),
+    )
+
+
+def decode_bpm_reading(d: Dict[str, Any]) -> BPMReading:
+    pos, btns = d["pos"], d["btns"]
+    return BPMReading(
+        name=d["name"],
+        pos=BPMPosition(x=_float(pos["x"]), y=_float(pos["y"])),
+        btns=BPMButtons(a=_float(btns["a"]), b=_float(btns["b"]), c=_float(btns["c"]), d=_float(btns["d"])),
+    )
+
+
+def encode_orbit(orbit: Orbit, **kwargs) -> Dict[str, Any]:
+    return dict(orbit=[encode_bpm_reading(r, **kwargs) for r in orbit.orbit])
+
+
+def decode_orbit(d: Dict[str, Any]) -> Orbit:
+    return Orbit(orbit=[decode_bpm_reading(r) for r in d["orbit"]])
+
+
+def encode_array_orbit(orbit: ArrayOrbit, **kwargs) -> Dict[str, Any]:
+    return dict(names=[_encode_id(name, **kwargs) for name in orbit.names], data=orbit.data.tolist())
+
+
+def decode_array_orbit(d: Dict[str, Any]) -> ArrayOrbit:
+    # np.nan for None
+    return ArrayOrbit(names=d["names"], data=np.array(d["data"], dtype=float))
+
+
+def encode_value(value, **kwargs) -> Dict[str, Any]:
+    """as :func:`accml_lib.core.model.conv.serialize_value`"""
+    if isinstance(value, int):
+        return dict(type="int", value=value)
+    elif isinstance(value, float):
+        return dict(type="float", value=float(value))
+
+    encoder = _payload_encoders.get(type(value), None)
+    if encoder is not None:
+        return dict(type="dict", value=encoder(value, **kwargs))
+
+    d = _flat_dataclass_dict(value)
+    if d is not None:
+        # e.g. tune
+        return dict(type="dict", value=d)
+
+    import jsons
+
+    d = jsons.dump(value, **kwargs)
+    assert isinstance(d, dict), f"don't know how to serialize {value}"
+    return dict(type="dict", value=d)
+
+
+def decode_value(d: Dict[str, Any]):
+    """as :func:`accml_lib.core.model.conv.deserialse_value`"""
+    type_ = d["type"]
+    if type_ == "int":
+        return int(d["value"])
+    elif type_ == "float":
+        return float(d["value"])
+    elif type_ == "dict":
+        return d["value"]
+    raise KeyError(f"unknown value type {type_}")
+
+
+def _encode_id(id_, **kwargs):
+    if isinstance(id_, str):
+        return id_
+    import jsons
+
+    return jsons.dump(id_, **kwargs)
+
+
+def encode_datetime(dt: datetime.datetime, **kwargs) -> str:
+    """rfc 3339 string as produced by jsons"""
+    if dt.tzinfo is None:
+        # jsons guesses the local time zone
+        import jsons
+
+        return jsons.dump(dt, **kwargs)
+    r = dt.strftime("%Y-%m-%dT%H:%M:%S")
+    if dt.microsecond:
+        r += f".{dt.microsecond:06d}"
+    if dt.tzinfo.tzname(None) in ("UTC", "UTC+00:00"):
+        return r + "Z"
+    seconds = int(dt.utcoffset().total_seconds())
+    sign = "+" if seconds >= 0 else "-"
+    seconds = abs(seconds)
+    return f"{r}{sign}{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+
+def decode_datetime(s: str) -> datetime.datetime:
+    # fromisoformat only accepts "Z" from python 3.11 on
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    return datetime.datetime.fromisoformat(s)
+
+
+def encode_read_command(cmd: ReadCommand, **kwargs) -> Dict[str, Any]:
+    return dict(id=_encode_id(cmd.id, **kwargs), property=cmd.property)
+
+
+def decode_read_command(d: Dict[str, Any]) -> ReadCommand:
+    return ReadCommand(id=d["id"], property=d["property"])
+
+
+def encode_command(cmd: Command, **kwargs) -> Dict[str, Any]:
+    return dict(
+        id=_encode_id(cmd.id, **kwargs),
+        property=cmd.property,
+        value=encode_value(cmd.value, **kwargs),
+        behaviour_on_error=cmd.behaviour_on_error,
+    )
+
+
+def decode_command(d: Dict[str, Any]) -> Command:
+    return Command(
+        id=d["id"],
+        property=d["property"],
+        value=decode_value(d["value"]),
+        behaviour_on_error=BehaviourOnError(d["behaviour_on_error"]),
+    )
+
+
+def encode_single_reading(sr: SingleReading, **kwargs) -> Dict[str, Any]:
+    return dict(
+        name=sr.name,
+        cmd=encode_read_command(sr.cmd, **kwargs),
+        payload=encode_value(sr.payload, **kwargs),
+    )
+
+
+def decode_single_reading(d: Dict[str, Any]) -> SingleReading:
+    return SingleReading(
+        name=d["name"], cmd=decode_read_command(d["cmd"]), payload=decode_value(d["payload"])
+    )
+
+
+def encode_read_together(rt: ReadTogether, **kwargs) -> Dict[str, Any]:
+    return dict(
+        data=[encode_single_reading(sr, **kwargs) for sr in rt.data],
+        start=encode_datetime(rt.start, **kwargs),
+        end=encode_datetime(rt.end, **kwargs),
+    )
+
+
+def decode_read_together(d: Dict[str, Any]) -> ReadTogether:
+    return ReadTogether(
+        data=[decode_single_reading(sr) for sr in d["data"]],
+        start=decode_datetime(d["start"]),
+        end=decode_datetime(d["end"]),
+    )
+
+
+def encode_result_step(step: ResultOfExecutionStep, **kwargs) -> Dict[str, Any]:
+    return dict(
+        cmds=[encode_command(cmd, **kwargs) for cmd in step.cmds],
+        data=[encode_read_together(rt, **kwargs) for rt in step.data],
+    )
+
+
+def decode_result_step(d: Dict[str, Any]) -> ResultOfExecutionStep:
+    return ResultOfExecutionStep(
+        cmds=[decode_command(cmd) for cmd in d["cmds"]],
+        data=[decode_read_together(rt) for rt in d["data"]],
+    )
+
+
+def encode_result(result: Result, **kwargs) -> Dict[str, Any]:
+    return dict(
+        data=[encode_result_step(step, **kwargs) for step in result.data],
+        orig_data=[encode_result_step(step, **kwargs) for step in result.orig_data],
+    )
+
+
+def decode_result(d: Dict[str, Any]) -> Result:
+    return Result(
+        data=[decode_result_step(step) for step in d["data"]],
+        orig_data=[decode_result_step(step) for step in d["orig_data"]],
+    )
+
+
+#: payloads not left to jsons
+_payload_encoders = {
+    ArrayOrbit: encode_array_orbit,
+    BPMReading: encode_bpm_reading,
+    Orbit: encode_orbit,
+}
+
+_encoders = {
+    **_payload_encoders,
+    Result: encode_result,
+    ResultOfExecutionStep: encode_result_step,
+    ReadTogether: encode_read_together,
+    SingleReading: encode_single_reading,
+    Command: encode_command,
+    ReadCommand: encode_read_command,
+}
+
+_decoders = {
+    ArrayOrbit: decode_array_orbit,
+    BPMReading: decode_bpm_reading,
+    Orbit: decode_orbit,
+    Result: decode_result,
+    ResultOfExecutionStep: decode_result_step,
+    ReadTogether: decode_read_together,
+    SingleReading: decode_single_reading,
+    Command: decode_command,
+    ReadCommand: decode_read_command,
+}
+
+
+def encode(obj, **kwargs) -> Dict[str, Any]:
+    """plain dict of one of the result or command models
+
+    kwargs are passed to jsons for payloads not known here
+    """
+    try:
+        encoder = _encoders[type(obj)]
+    except KeyError:
+        raise TypeError(f"no encoder for {type(obj)}")
+    return encoder(obj, **kwargs)
+
+
+def decode(d: Dict[str, Any], cls: Type[T]) -> T:
+    """model of type cls from its plain dict
+
+    Payloads are decoded as plain dicts: use e.g. ``decode(payload,
+    ArrayOrbit)`` to get the model back
+    """
+    try:
+        decoder = _decoders[cls]
+    except KeyError:
+        raise TypeError(f"no decoder for {cls}")
+    return decoder(d)
+
+
+def _without_nan(obj):
+    """non finite floats replaced by None, as orjson writes them"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _without_nan(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_without_nan(v) for v in obj]
+    return obj
+
+
+def dumps(obj, *, format: str = "json", **kwargs) -> bytes:
+    """encode to bytes
+
+    Args:
+        format: "json" (orjson if installed) or "msgpack"
+
+    json output is valid json with or without orjson: nan and inf
+    are written as null
+    """
+    d = encode(obj, **kwargs)
+    if format == "json":
+        try:
+            import orjson
+        except ImportError:
+            return json.dumps(_without_nan(d), allow_nan=False, separators=(",", ":")).encode()
+        return orjson.dumps(d)
+    elif format == "msgpack":
+        import msgpack
+
+        return msgpack.packb(d, use_bin_type=True)
+    raise ValueError(f"unknown format {format}")
+
+
+def loads(data: Union[bytes, str], cls: Type[T], *, format: str = "json") -> T:
+    if format == "json":
+        try:
+            import orjson
+        except ImportError:
+            return decode(json.loads(data), cls)
+        return decode(orjson.loads(data), cls)
+    elif format == "msgpack":
+        import msgpack
+
+        return decode(msgpack.unpackb(data, raw=False), cls)
+    raise ValueError(f"unknown format {format}")
+
+
+__all__ = ["decode", "dumps", "encode", "loads"]
@@ -8,8 +8,24 @@ Todo:
     model
 """
 import functools
+import warnings
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Hashable, Sequence, Dict
+from numbers import Real
+from typing import Hashable, Sequence, Dict, Union
+
+import numpy as np
+
+from .tune import CorrectionStat
+
+
+@contextmanager
+def _nan_tolerant():
+    """channels without any data (e.g. buttons not read) are all nan:
+    their statistics are nan, without warning about it"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        yield
 
 
 @dataclass
@@ -56,8 +72,27 @@ class BPMReading:
     btns: BPMButtons
 
 
+@dataclass
+class OrbitStat:
+    """statistics of an orbit, per plane"""
+
+    x: CorrectionStat
+    y: CorrectionStat
+
+
 @dataclass
 class Orbit:
+    """
+    Arithmetic and statistics are delegated to :class:`ArrayOrbit`.
+    Results of arithmetic are an :class:`Orbit` again.
+
+    Warning:
+        each operation loops over the bpms twice: to convert the
+        operands to :class:`ArrayOrbit` and the result back. Only
+        :class:`ArrayOrbit` payloads avoid these per bpm loops; use
+        these if performance matters, e.g. for full ring readings.
+    """
+
     orbit: Sequence[BPMReading]
 
     def identifiers(self) -> Sequence[Hashable]:
@@ -74,3 +109,236 @@ class Orbit:
     @functools.cached_property
     def _lut(self) -> Dict[Hashable, BPMReading]:
         return {elem.name: elem for elem in self.orbit}
+
+    def to_array_orbit(self) -> "ArrayOrbit":
+        return ArrayOrbit.from_orbit(self)
+
+    def __add__(self, other):
+        r = self.to_array_orbit().__add__(other)
+        return r if r is NotImplemented else r.to_orbit()
+
+    def __sub__(self, other):
+        r = self.to_array_orbit().__sub__(other)
+        return r if r is NotImplemented else r.to_orbit()
+
+    def __mul__(self, other):
+        r = self.to_array_orbit().__mul__(other)
+        return r if r is NotImplemented else r.to_orbit()
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return (-self.to_array_orbit()).to_orbit()
+
+    def stat(self) -> OrbitStat:
+        return self.to_array_orbit().stat()
+
+
+@dataclass(eq=False)
+class ArrayOrbit:
+    """Orbit stored as one contiguous array
+
+    Alternative to :class:`Orbit` for full ring readings: no python
+    object per bpm. `data` has one row per channel (see `channels`)
+    and one column per bpm. The channel properties (`x`, `y`,
+    `a` ... `d`) as well as `positions` and `buttons` are views into
+    `data`, i.e. no data are copied.
+
+    Per bpm access is provided by :meth:`get_element` for
+    compatibility with :class:`Orbit`.
+
+    Adding or subtracting an other orbit aligns it by bpm name: the
+    result has the bpms of the left operand, bpms missing in the right
+    one are marked as nan. Statistics ignore nan's.
+
+    Two orbits are equal if they have the same bpm names and the same
+    data, nan's at the same places comparing equal.
+    """
+
+    names: Sequence[Hashable]
+    data: np.ndarray
+
+    channels = ("x", "y", "a", "b", "c", "d")
+
+    def __post_init__(self):
+        self.names = tuple(self.names)
+        self.data = np.ascontiguousarray(self.data, dtype=float)
+        expected = (len(self.channels), len(self.names))
+        if self.data.shape != expected:
+            raise ValueError(
+                f"{self.__class__.__name__}: expected data of shape {expected},"
+                f" but got {self.data.shape}"
+            )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        names: Sequence[Hashable],
+        *,
+        x: Sequence[float],
+        y: Sequence[float],
+        a: Union[Sequence[float], None] = None,
+        b: Union[Sequence[float], None] = None,
+        c: Union[Sequence[float], None] = None,
+        d: Union[Sequence[float], None] = None,
+    ) -> "ArrayOrbit":
+        """channels not available are marked as nan"""
+        data = np.full((len(cls.channels), len(names)), np.nan, dtype=float)
+        for row, channel in enumerate([x, y, a, b, c, d]):
+            if channel is not None:
+                data[row] = channel
+        return cls(names=names, data=data)
+
+    @classmethod
+    def from_orbit(cls, orbit: Orbit) -> "ArrayOrbit":
+        readings = orbit.orbit
+        data = np.empty((len(cls.channels), len(readings)), dtype=float)
+        for col, r in enumerate(readings):
+            data[:, col] = (r.pos.x, r.pos.y, r.btns.a, r.btns.b, r.btns.c, r.btns.d)
+        return cls(names=[r.name for r in readings], data=data)
+
+    def to_orbit(self) -> Orbit:
+        return Orbit(
+            orbit=[
+                BPMReading(
+                    name=name,
+                    pos=BPMPosition(x=x, y=y),
+                    btns=BPMButtons(a=a, b=b, c=c, d=d),
+                )
+                for name, (x, y, a, b, c, d) in zip(self.names, self.data.T.tolist())
+            ]
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def __eq__(self, other):
+        if not isinstance(other, ArrayOrbit):
+            return NotImplemented
+        return self.names == other.names and np.array_equal(self.data, other.data, equal_nan=True)
+
+    __hash__ = None
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.data[0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.data[1]
+
+    @property
+    def a(self) -> np.ndarray:
+        return self.data[2]
+
+    @property
+    def b(self) -> np.ndarray:
+        return self.data[3]
+
+    @property
+    def c(self) -> np.ndarray:
+        return self.data[4]
+
+    @property
+    def d(self) -> np.ndarray:
+        return self.data[5]
+
+    @property
+    def positions(self) -> np.ndarray:
+        """x and y: shape (2, n)"""
+        return self.data[:2]
+
+    @property
+    def buttons(self) -> np.ndarray:
+        """a, b, c, d: shape (4, n)"""
+        return self.data[2:]
+
+    def identifiers(self) -> Sequence[Hashable]:
+        return self.names
+
+    def index(self, id_: Hashable) -> int:
+        return self._lut[id_]
+
+    def get_element(self, id_: Hashable) -> BPMReading:
+        x, y, a, b, c, d = self.data[:, self._lut[id_]].tolist()
+        return BPMReading(
+            name=id_, pos=BPMPosition(x=x, y=y), btns=BPMButtons(a=a, b=b, c=c, d=d)
+        )
+
+    @functools.cached_property
+    def _lut(self) -> Dict[Hashable, int]:
+        return {name: idx for idx, name in enumerate(self.names)}
+
+    def _aligned(self, other: Union["ArrayOrbit", Orbit]) -> np.ndarray:
+        """data of other, columns ordered as the bpms of self"""
+        if isinstance(other, Orbit):
+            other = other.to_array_orbit()
+        if other.names == self.names:
+            return other.data
+        r = np.full_like(self.data, np.nan)
+        lut = other._lut
+        idx = np.array([lut.get(name, -1) for name in self.names], dtype=np.intp)
+        found = idx >= 0
+        r[:, found] = other.data[:, idx[found]]
+        return r
+
+    def _new(self, data: np.ndarray) -> "ArrayOrbit":
+        return ArrayOrbit(names=self.names, data=data)
+
+    def __add__(self, other):
+        if not isinstance(other, (ArrayOrbit, Orbit)):
+            return NotImplemented
+        return self._new(self.data + self._aligned(other))
+
+    def __sub__(self, other):
+        if not isinstance(other, (ArrayOrbit, Orbit)):
+            return NotImplemented
+        return self._new(self.data - self._aligned(other))
+
+    def __mul__(self, other):
+        if not isinstance(other, Real):
+            return NotImplemented
+        return self._new(self.data * other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if not isinstance(other, Real):
+            return NotImplemented
+        return self._new(self.data / other)
+
+    def __neg__(self):
+        return self._new(-self.data)
+
+    def mean(self) -> np.ndarray:
+        """per channel"""
+        with _nan_tolerant():
+            return np.nanmean(self.data, axis=1)
+
+    def std(self) -> np.ndarray:
+        with _nan_tolerant():
+            return np.nanstd(self.data, axis=1)
+
+    def min(self) -> np.ndarray:
+        with _nan_tolerant():
+            return np.nanmin(self.data, axis=1)
+
+    def max(self) -> np.ndarray:
+        with _nan_tolerant():
+            return np.nanmax(self.data, axis=1)
+
+    def stat(self) -> OrbitStat:
+        """mean, std, min and max of the positions"""
+        pos = self.positions
+        with _nan_tolerant():
+            mean, std, min_, max_ = (
+                np.nanmean(pos, axis=1),
+                np.nanstd(pos, axis=1),
+                np.nanmin(pos, axis=1),
+                np.nanmax(pos, axis=1),
+            )
+        x, y = [
+            CorrectionStat(mean=float(mean[i]), std=float(std[i]), min=float(min_[i]), max=float(max_[i]))
+            for i in range(2)
+        ]
+        return OrbitStat(x=x, y=y)
@@ -54,3 +54,22 @@ class Tune:
 
     def __str__(self):
         return f"{self.__class__.__name__}(x={self.x:.4f}, y={self.y:.4f})"
+
+
+@dataclass
+class Chromaticity:
+    """linear chromaticity: tune change per relative momentum deviation"""
+
+    #: horizontal
+    x: float
+    #: vertical
+    y: float
+
+    def __sub__(self, other):
+        return Chromaticity(self.x - other.x, self.y - other.y)
+
+    def __neg__(self):
+        return Chromaticity(-self.x, -self.y)
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(x={self.x:.3f}, y={self.y:.3f})"
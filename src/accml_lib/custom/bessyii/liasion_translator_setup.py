@@ -3,6 +3,7 @@ import logging
 from collections import defaultdict
 from pathlib import Path
 
+from accml_lib.core.bl.conversion_table import ConversionTable
 from accml_lib.core.bl.liaison_manager import LiaisonManager
 from accml_lib.core.bl.translator_service import TranslatorService
 from accml_lib.core.bl.unit_conversion import LinearUnitConversion, EnergyDependentLinearUnitConversion
@@ -41,6 +42,17 @@ def load_managers() -> (YellowPagesBase, LiaisonManagerBase, TranslatorServiceBa
     return build_managers("custom/config_data/bessyii")
 
 
+@functools.lru_cache(maxsize=1)
+def load_conversion_table() -> ConversionTable:
+    """linear conversions of :func:`load_managers` compiled once
+
+    Use e.g. `load_conversion_table().plan(yp.tune_correction_quadrupole_names(), "main_strength")`
+    to resolve a fixed command set once and then convert it repeatedly
+    """
+    _, lm, tm = load_managers()
+    return ConversionTable.from_managers(lm, tm)
+
+
 def build_managers(config_dir: Path) -> (YellowPagesBase, LiaisonManagerBase, TranslatorServiceBase):
     """A first poor mans implementation of liaison manager and Translation service for accml_lib
 
@@ -60,75 +72,63 @@ def build_managers(config_dir: Path) -> (YellowPagesBase, LiaisonManagerBase, Tr
     if len(list(magnet_names)) != len(magnets):
         raise AssertionError("Magnet names seem not to be unique, but is assumption of all further processing")
 
+    # membership is decided here once, out of the config service's
+    # indices, not by searching the (list based) families further down
+    quadrupoles = config_service.get_quadrupoles()
+
     # TODO: identify a generic way based on data from different labs to build YP
     # at the moment just a hardcoded list of families
     yp = YellowPages(
         dict(
-            quadrupoles=[elem.dev_id for elem in magnets if elem.type == "quadrupole"],
-            tune_correction_quadrupoles=[elem.dev_id for elem in magnets if
-                                         elem.type == "quadrupole" and "tune_correction" in elem.family_member],
+            quadrupoles=[elem.dev_id for elem in quadrupoles],
+            tune_correction_quadrupoles=[elem.dev_id for elem in config_service.get_family_members("tune_correction")
+                                         if elem.type == "quadrupole"],
             master_clock="master_clock",  # TODO: should power converter sources be a separate part here
-            quadrupole_pcs=tuple(set([elem.power_converter_id for elem in magnets if elem.type == "quadrupole"]))
+            # dict keeps the order of first appearance: reproducible default device
+            quadrupole_pcs=tuple(dict.fromkeys(elem.power_converter_id for elem in quadrupoles))
         )
     )
     # TODO: check if property must be different for the different magnets ...
 
-    forward_lut = {LatticeElementPropertyID(element_name=magnet.dev_id, property="main_strength"): DevicePropertyID(
-        device_name=magnet.power_converter_id, property="set_current") for magnet in magnets if
-        magnet.dev_id in yp.quadrupole_names()}
-    forward_lut.update({
-        LatticeElementPropertyID(element_name=magnet.dev_id, property="delta_main_strength"): DevicePropertyID(
-            device_name=magnet.power_converter_id, property="delta_set_current") for magnet in magnets if
-        magnet.dev_id in yp.quadrupole_names()})
+    forward_lut = dict()
+    inverse_lut_dd = defaultdict(list)
+    # currently only setting up the quadrupoles
+    for m in quadrupoles:
+        for lat_prop, dev_prop in (("main_strength", "set_current"), ("delta_main_strength", "delta_set_current")):
+            lep = LatticeElementPropertyID(element_name=m.dev_id, property=lat_prop)
+            dp = DevicePropertyID(device_name=m.power_converter_id, property=dev_prop)
+            forward_lut[lep] = dp
+            inverse_lut_dd[dp].append(lep)
 
     forward_lut.update(
         {LatticeElementPropertyID(element_name="tune", property="transversal") :  DevicePropertyID(
             device_name="tune", property="delta_set_current")}
     )
 
-    # inverse_lut = {
-    #     DevicePropertyID(device_name=m.power_converter_id, property="set_current"): [
-    #         LatticeElementPropertyID(element_name=m.dev_id, property="main_strength")] for m in magnets}
-
-    inverse_lut_dd = defaultdict(list)
-
-    for m in magnets:
-        # currently only setting up the quadrupoles
-        if m.dev_id not in yp.quadrupole_names():
-            continue
-
-        dp_main = DevicePropertyID(device_name=m.power_converter_id, property="set_current")
-        lep_main = LatticeElementPropertyID(element_name=m.dev_id, property="main_strength")
-        inverse_lut_dd[dp_main].append(lep_main)
-
-        dp_main = DevicePropertyID(device_name=m.power_converter_id, property="delta_set_current")
-        lep_main = LatticeElementPropertyID(element_name=m.dev_id, property="delta_main_strength")
-        inverse_lut_dd[dp_main].append(lep_main)
-
     inverse_lut = dict(inverse_lut_dd)
     inverse_lut[DevicePropertyID(device_name="tune", property="transversal")] = [LatticeElementPropertyID(element_name="tune", property="transversal")]
     lm = LiaisonManager(forward_lut=forward_lut, inverse_lut=inverse_lut)
     del forward_lut, inverse_lut
 
-    translator_lut = {
-        ConversionID(lattice_property_id=LatticeElementPropertyID(element_name=m.dev_id, property="main_strength"),
-                     device_property_id=DevicePropertyID(device_name=m.power_converter_id,
-                                                         property="set_current")): EnergyDependentLinearUnitConversion(
-            # TODO: find out if it is the correct converion
-            #  magnetic strength is most proably None
-            slope=1./m.conversion.slope, intercept=m.conversion.intercept, brho=ring_parameters.brho, ) for m in magnets}
-
-    # as its only a liner interpolation, its simple to do the delta interpolation
-    # for complex curves this interpolation will fail ...
-    # there the measurement execution engine has to peek into the machine state
-    # and apply it
-    translator_lut.update({ConversionID(
-        lattice_property_id=LatticeElementPropertyID(element_name=m.dev_id, property="delta_main_strength"),
-        device_property_id=DevicePropertyID(device_name=m.power_converter_id,
-                                            property="delta_set_current")): EnergyDependentLinearUnitConversion(
+    translator_lut = dict()
+    for m in magnets:
         # TODO: find out if it is the correct conversion
         #  magnetic strength is most proably None
-        slope=1.0/m.conversion.slope, intercept=0.0, brho=ring_parameters.brho) for m in magnets})
+        translator_lut[ConversionID(
+            lattice_property_id=LatticeElementPropertyID(element_name=m.dev_id, property="main_strength"),
+            device_property_id=DevicePropertyID(device_name=m.power_converter_id, property="set_current"),
+        )] = EnergyDependentLinearUnitConversion(
+            slope=1./m.conversion.slope, intercept=m.conversion.intercept, brho=ring_parameters.brho)
+
+        # as its only a liner interpolation, its simple to do the delta interpolation
+        # for complex curves this interpolation will fail ...
+        # there the measurement execution engine has to peek into the machine state
+        # and apply it
+        translator_lut[ConversionID(
+            lattice_property_id=LatticeElementPropertyID(element_name=m.dev_id, property="delta_main_strength"),
+            device_property_id=DevicePropertyID(device_name=m.power_converter_id, property="delta_set_current"),
+        )] = EnergyDependentLinearUnitConversion(
+            slope=1.0/m.conversion.slope, intercept=0.0, brho=ring_parameters.brho)
 
     floquet_to_frequency = 500e3 / 400.0
     # Todo: analyse if this setup is appropriate
@@ -148,10 +148,22 @@ def build_managers(config_dir: Path) -> (YellowPagesBase, LiaisonManagerBase, Tr
     return yp, lm, tm
 
 
+def benchmark_build_managers(config_dir: Path, repeat: int = 5) -> dict:
+    """time loading magnets.yaml / power_converters.yaml and building the managers
+
+    Returns:
+        cold (first) build time and best of the following `repeat`
+        builds in seconds
+    """
+    import timeit
+
+    timer = timeit.Timer(lambda: build_managers(config_dir))
+    cold = timer.timeit(number=1)
+    warm = min(timer.repeat(repeat=repeat, number=1)) if repeat > 0 else cold
+    return dict(cold=cold, warm=warm)
+
+
 if __name__ == "__main__":
-    yp, lm, tm = build_managers("custom/accml_lib/config_data")
-    # lat_prop_id = LatticeElementPropertyID(element_name="QF1C01A", property="set_current")
-    # r, = lm.forward(lat_prop_id)
-    # dev_prop_id = DevicePropertyID(device_name="PC_QF1C01A", property="set_current")
-    # r, = lm.inverse(dev_prop_id)
-    # to = tm.get(ConversionID(lattice_property_id=r, device_property_id=dev_prop_id))  # pprint.pprint(to)
+    # startup benchmark: python -m accml_lib.custom.bessyii.liasion_translator_setup
+    timings = benchmark_build_managers("custom/config_data/bessyii")
+    print(f"build_managers: cold {timings['cold'] * 1e3:.1f} ms, warm {timings['warm'] * 1e3:.1f} ms")
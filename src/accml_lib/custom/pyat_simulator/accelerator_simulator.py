@@ -1,8 +1,16 @@
-import enum
+import logging
+from typing import Dict, Optional, Sequence
 
-from .element_proxies import ElementProxy, KickAngleCorrectorProxy
+import at
+import numpy as np
+
+from .element_proxies import ElementProxy, KickAngleCorrectorProxy, check_value
+from .model.optics import OpticsResult, Twiss
 from ...core.interfaces.simulator.accelerator_simulator import AcceleratorSimulatorInterface
-from ...core.model.output.tune import Tune
+from ...core.model.utils.command import Command
+from ...core.model.output.tune import Chromaticity, Tune
+
+logger = logging.getLogger("accml")
 
 
 class PyATAcceleratorSimulator(AcceleratorSimulatorInterface):
@@ -22,26 +30,157 @@ class PyATAcceleratorSimulator(AcceleratorSimulatorInterface):
         Leave addon element proxy e.g. for handling combined function magnets
     """
 
-    def __init__(self, *, at_lattice):
+    #: main strength of these element classes is this PolynomB entry
+    main_strength_polynom_index = dict(Quadrupole=1, Sextupole=2)
+
+    def __init__(self, *, at_lattice, optics_locations: Optional[Sequence[str]] = None):
         """
         Initialize the proxy factory.
 
         Args:
             at_lattice: The actual AT lattice used to retrieve elements.
+            optics_locations: names of the elements optics functions
+                are calculated at, by default all monitors
         """
+        self.optics_locations = optics_locations
+        self._optics_refpts = None
+        self._name_index = None
+        self._proxies = dict()
         self.acc = at_lattice
 
+    @property
+    def acc(self):
+        return self._acc
+
+    @acc.setter
+    def acc(self, at_lattice):
+        """replacing the lattice invalidates index and proxies"""
+        self._acc = at_lattice
+        self.invalidate()
+
+    def invalidate(self):
+        """forget the name index and the proxies
+
+        Required if elements were added to, removed from or replaced
+        in the lattice in place
+        """
+        self._name_index = None
+        self._proxies = dict()
+        self._optics_refpts = None
+
+    @property
+    def optics_refpts(self) -> np.ndarray:
+        """lattice indices of the optics locations, computed once"""
+        if self._optics_refpts is None:
+            if self.optics_locations is None:
+                refpts = self._acc.get_uint32_index(at.Monitor)
+            else:
+                refpts = [self.index_of(name) for name in self.optics_locations]
+            self._optics_refpts = np.asarray(refpts, dtype=np.uint32)
+        return self._optics_refpts
+
+    @property
+    def name_index(self) -> Dict[str, Sequence[int]]:
+        """element name -> indices of the elements of this name
+
+        Built on first use: looking up a name by `self.acc[name]`
+        matches the pattern against the whole lattice each time.
+        """
+        if self._name_index is None:
+            index = dict()
+            for idx, element in enumerate(self._acc):
+                index.setdefault(element.FamName, []).append(idx)
+            self._name_index = {name: tuple(indices) for name, indices in index.items()}
+            logger.debug("%s: indexed %d element names", self.__class__.__name__, len(index))
+        return self._name_index
+
+    def index_of(self, element_id: str) -> int:
+        """index of the single element named element_id
+
+        Raises:
+            KeyError: if no or more than one element has this name
+        """
+        indices = self.name_index.get(element_id, ())
+        if len(indices) != 1:
+            raise KeyError(f"{len(indices)} elements found with name {element_id}, expected one")
+        (idx,) = indices
+        return idx
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(at_lattice={self.acc})"
 
-    def get_tune(self) -> Tune:
-        """
-        Todo:
-            review who else needs these data
+    def get_optics(self) -> OpticsResult:
+        """tune and optics functions in one calculation
+
+        Arrays of the result are read only: the result is shared by
+        all consumers
         """
-        _, ring_pars, _ = self.acc.get_optics()
+        refpts = self.optics_refpts
+        _, ring_pars, elem_data = self.acc.get_optics(refpts=refpts)
         tune = ring_pars["tune"]
-        return Tune(x=tune[0], y=tune[1])
+
+        def read_only(a: np.ndarray) -> np.ndarray:
+            a = a.view()
+            a.setflags(write=False)
+            return a
+
+        return OpticsResult(
+            tune=Tune(x=float(tune[0]), y=float(tune[1])),
+            twiss=Twiss(
+                names=tuple(self._acc[int(idx)].FamName for idx in refpts),
+                refpts=read_only(refpts),
+                s=read_only(elem_data["s_pos"]),
+                beta=read_only(elem_data["beta"]),
+                alpha=read_only(elem_data["alpha"]),
+                mu=read_only(elem_data["mu"]),
+                dispersion=read_only(elem_data["dispersion"]),
+                closed_orbit=read_only(elem_data["closed_orbit"]),
+            ),
+        )
+
+    def get_chromaticity(self) -> Chromaticity:
+        """separate from :meth:`get_optics`: costs as much again"""
+        chromaticity = self.acc.get_chrom()
+        return Chromaticity(x=float(chromaticity[0]), y=float(chromaticity[1]))
+
+    async def update_many(self, commands: Sequence[Command]) -> Sequence[object]:
+        """update all elements, main strengths in one pass per element type
+
+        Main strengths of quadrupoles and sextupoles are collected and
+        written with one `set_value_refpts` call per PolynomB index.
+        Any other command is handled by the element proxy. Values are
+        checked as by the element proxy, all before any is written.
+
+        Raises:
+            ValueError: if a value is not finite
+        """
+        for cmd in commands:
+            check_value(cmd.value)
+
+        groups = dict()
+        others = []
+        for cmd in commands:
+            polynom_index = None
+            # None is passed on to the element as by the proxy
+            if cmd.property == "main_strength" and cmd.value is not None:
+                indices = self.name_index.get(cmd.id, ())
+                if len(indices) == 1:
+                    (idx,) = indices
+                    polynom_index = self.main_strength_polynom_index.get(
+                        self._acc[idx].__class__.__name__, None
+                    )
+            if polynom_index is None:
+                others.append(cmd)
+                continue
+            refpts, values = groups.setdefault(polynom_index, ([], []))
+            refpts.append(idx)
+            values.append(cmd.value)
+
+        for polynom_index, (refpts, values) in groups.items():
+            self._acc.set_value_refpts(refpts, "PolynomB", values, index=polynom_index)
+        for cmd in others:
+            await self.get(cmd.id).update(property_id=cmd.property, value=cmd.value)
+        return [None] * len(commands)
 
     def get(self, element_id):
         """
@@ -56,7 +195,19 @@ class PyATAcceleratorSimulator(AcceleratorSimulatorInterface):
         Raises:
             ValueError: If the element is not found in the lattice.
         """
+        try:
+            return self._proxies[element_id]
+        except KeyError:
+            pass
+        proxy = self._proxies[element_id] = self._create_proxy(element_id)
+        return proxy
+
+    def _create_proxy(self, element_id):
+        indices = self.name_index.get(element_id, ())
+        if len(indices) == 1:
+            return ElementProxy(self.acc[list(indices)], element_id=element_id)
 
+        # e.g. patterns or add on elements: look them up in the lattice
         sub_lattice = self.acc[element_id]
         # single element expected in sub lattice
         try:
@@ -69,7 +220,11 @@ class PyATAcceleratorSimulator(AcceleratorSimulatorInterface):
             return ElementProxy(sub_lattice, element_id=element_id)
 
         host_element_id = self.get_element_id_of_host(element_id)
-        sub_lattice = self.acc[host_element_id]
+        host_indices = self.name_index.get(host_element_id, ())
+        if len(host_indices) == 1:
+            sub_lattice = self.acc[list(host_indices)]
+        else:
+            sub_lattice = self.acc[host_element_id]
         # single element expected in sublattice
         (_,) = sub_lattice
         if not sub_lattice:
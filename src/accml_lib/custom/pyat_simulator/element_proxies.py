@@ -43,6 +43,17 @@ def estimate_shift(element, eps=1e-8):
     return shift
 
 
+def check_value(value):
+    """values set to elements: None or finite
+
+    Raises:
+        ValueError: if the value is not finite
+        TypeError:  if the value is not a number
+    """
+    if value is not None and not np.all(np.isfinite(value)):
+        raise ValueError(f"Value must be finite, got {value}")
+
+
 def manipulate_kick(
     kick_angles: Tuple[float, float], kick_x=None, kick_y=None
 ) -> Tuple[float, float]:
@@ -150,9 +161,7 @@ class ElementProxy(ElementInterface):
             " starting with delta should not end up here"
         )
 
-        if value is not None:
-            assert np.isfinite(value), "Value must be finite"
-
+        check_value(value)
         return await self._update(property_id, value)
 
     async def _update(self, property_id: str, value: object):
@@ -0,0 +1,134 @@
+"""Linear response of tune and closed orbit to a set of actuators
+
+For small steps of a few knobs (e.g. quadrupole strengths, corrector
+kicks) tune and orbit are predicted from Jacobians computed by finite
+differences, instead of a full optics calculation after each set.
+
+The prediction is only used as long as the steps accumulated since the
+Jacobians were computed stay within the trust region: each step is
+divided by the `trust_radius` of its actuator, the norm of these has
+to stay below `trust_region`.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .model.optics import OpticsResult
+from ...core.interfaces.simulator.accelerator_simulator import AcceleratorSimulatorInterface
+from ...core.model.output.tune import Tune
+
+logger = logging.getLogger("accml")
+
+
+@dataclass(frozen=True)
+class Actuator:
+    id: str
+    property: str
+    #: step of the finite difference
+    step: float
+    #: change the linear model is trusted for
+    trust_radius: float
+
+
+@dataclass(frozen=True, eq=False)
+class LinearPrediction:
+    tune: Tune
+    #: names of the optics locations
+    names: Sequence[Hashable]
+    #: x, y: shape (n, 2) [m]
+    closed_orbit: np.ndarray
+
+
+def _observables(optics: OpticsResult) -> np.ndarray:
+    """tune x, y, then closed orbit x and y at the optics locations"""
+    closed_orbit = optics.twiss.closed_orbit
+    return np.concatenate([[optics.tune.x, optics.tune.y], closed_orbit[:, 0], closed_orbit[:, 2]])
+
+
+class LinearResponse:
+    """Jacobians of tune and orbit with respect to the actuators
+
+    Computed by :meth:`SimulatorBackend.refresh_linear_response`,
+    which perturbs the lattice by the step of each actuator. Any
+    change of a property that is not an actuator makes them invalid.
+    """
+
+    def __init__(self, actuators: Sequence[Actuator], *, trust_region: float = 1.0):
+        self.actuators = tuple(actuators)
+        self.trust_region = trust_region
+        self.steps = np.array([a.step for a in self.actuators], dtype=float)
+        self.trust_radii = np.array([a.trust_radius for a in self.actuators], dtype=float)
+        self._keys = frozenset((a.id, a.property) for a in self.actuators)
+        self.names: Optional[Tuple[Hashable, ...]] = None
+        self.reference_values: Optional[np.ndarray] = None
+        self.reference: Optional[np.ndarray] = None
+        self.jacobian: Optional[np.ndarray] = None
+        #: number of predictions and of refreshes made
+        self.predictions = 0
+        self.refreshes = 0
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(actuators={len(self.actuators)},"
+            f" trust_region={self.trust_region}, valid={self.valid})"
+        )
+
+    @property
+    def valid(self) -> bool:
+        return self.jacobian is not None
+
+    def invalidate(self):
+        self.jacobian = None
+
+    def is_actuator(self, dev_id: str, prop_id: str) -> bool:
+        return (dev_id, prop_id) in self._keys
+
+    def notice_change(self, dev_id: str, prop_id: str):
+        """a change of anything but an actuator makes the model invalid"""
+        if self.valid and not self.is_actuator(dev_id, prop_id):
+            logger.debug("%s: %s.%s is not an actuator, invalidating", self, dev_id, prop_id)
+            self.invalidate()
+
+    def read_values(self, acc: AcceleratorSimulatorInterface) -> np.ndarray:
+        return np.array([acc.get(a.id).peek(a.property) for a in self.actuators], dtype=float)
+
+    def set_reference(
+        self, values: np.ndarray, reference: OpticsResult, perturbed: Sequence[OpticsResult]
+    ):
+        """
+        Args:
+            values:    of the actuators at the reference
+            reference: optics at the reference
+            perturbed: optics with each actuator moved by its step
+        """
+        assert len(perturbed) == len(self.actuators)
+        self.names = tuple(reference.twiss.names)
+        self.reference_values = np.asarray(values, dtype=float)
+        self.reference = _observables(reference)
+        self.jacobian = np.empty((len(self.reference), len(self.actuators)), dtype=float)
+        for col, (optics, step) in enumerate(zip(perturbed, self.steps)):
+            self.jacobian[:, col] = (_observables(optics) - self.reference) / step
+        self.refreshes += 1
+
+    def step_norm(self, values: np.ndarray) -> float:
+        """accumulated step, relative to the trust radii"""
+        return float(np.linalg.norm((values - self.reference_values) / self.trust_radii))
+
+    def within_trust_region(self, values: np.ndarray) -> bool:
+        return self.valid and self.step_norm(values) <= self.trust_region
+
+    def predict(self, values: np.ndarray) -> LinearPrediction:
+        assert self.valid, f"{self}: refresh required before predicting"
+        observables = self.reference + self.jacobian @ (values - self.reference_values)
+        n = len(self.names)
+        self.predictions += 1
+        return LinearPrediction(
+            tune=Tune(x=float(observables[0]), y=float(observables[1])),
+            names=self.names,
+            closed_orbit=np.stack([observables[2:2 + n], observables[2 + n:]], axis=1),
+        )
+
+
+__all__ = ["Actuator", "LinearPrediction", "LinearResponse"]
@@ -0,0 +1,44 @@
+"""Result of one optics calculation of the simulator"""
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+from ....core.model.output.tune import Tune
+
+
+@dataclass(frozen=True, eq=False)
+class Twiss:
+    """optics functions at the requested locations
+
+    Arrays have one row per location, in the order of `names`. They
+    are read only.
+    """
+
+    names: Sequence[str]
+    #: index of the locations in the lattice
+    refpts: np.ndarray
+    #: longitudinal position [m]
+    s: np.ndarray
+    #: beta x, y [m]
+    beta: np.ndarray
+    #: alpha x, y
+    alpha: np.ndarray
+    #: phase advance x, y [rad]
+    mu: np.ndarray
+    #: eta x, eta' x, eta y, eta' y [m, rad]
+    dispersion: np.ndarray
+    #: x, px, y, py, dp, ct [m, rad]
+    closed_orbit: np.ndarray
+
+
+@dataclass(frozen=True, eq=False)
+class OpticsResult:
+    """computed once per state of the lattice
+
+    Chromaticity is not part of it: it costs another optics calculation
+    and is only calculated when requested
+    """
+
+    tune: Tune
+    twiss: Twiss
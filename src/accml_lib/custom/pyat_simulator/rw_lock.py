@@ -0,0 +1,171 @@
+"""Reader / writer lock for asyncio
+
+Many readers can hold the lock at the same time, a writer holds it
+alone. Used by the simulator backend: reads of the lattice run in
+parallel, sets and calculations get exclusive access.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Deque
+
+
+@dataclass
+class LockStatistics:
+    read_acquisitions: int = 0
+    write_acquisitions: int = 0
+    #: time spent waiting for the lock, summed up [s]
+    read_wait_total: float = 0.0
+    write_wait_total: float = 0.0
+    #: longest time waited for the lock [s]
+    read_wait_max: float = 0.0
+    write_wait_max: float = 0.0
+
+    @property
+    def read_wait_mean(self) -> float:
+        if not self.read_acquisitions:
+            return 0.0
+        return self.read_wait_total / self.read_acquisitions
+
+    @property
+    def write_wait_mean(self) -> float:
+        if not self.write_acquisitions:
+            return 0.0
+        return self.write_wait_total / self.write_acquisitions
+
+
+class ReaderWriterLock:
+    """asyncio reader / writer lock
+
+    Fairness: a waiting writer blocks new readers, so a stream of reads
+    can not starve it. When a writer releases the lock, all readers
+    waiting by then are let in before the next writer, so a stream of
+    writes can not starve the readers either.
+
+    Use :meth:`reader` and :meth:`writer` as async context managers.
+    """
+
+    def __init__(self, *, clock=time.perf_counter):
+        self.clock = clock
+        self.statistics = LockStatistics()
+        self._readers = 0
+        self._writer = False
+        self._read_waiters: Deque[asyncio.Future] = deque()
+        self._write_waiters: Deque[asyncio.Future] = deque()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(readers={self._readers}, writer={self._writer},"
+            f" waiting_readers={len(self._read_waiters)}, waiting_writers={len(self._write_waiters)})"
+        )
+
+    @property
+    def readers(self) -> int:
+        """number of readers holding the lock"""
+        return self._readers
+
+    @property
+    def locked_for_writing(self) -> bool:
+        return self._writer
+
+    def _grant_readers(self) -> bool:
+        granted = False
+        while self._read_waiters:
+            fut = self._read_waiters.popleft()
+            if not fut.done():
+                self._readers += 1
+                fut.set_result(None)
+                granted = True
+        return granted
+
+    def _grant_writer(self) -> bool:
+        while self._write_waiters:
+            fut = self._write_waiters.popleft()
+            if not fut.done():
+                self._writer = True
+                fut.set_result(None)
+                return True
+        return False
+
+    def _wake(self, prefer_readers: bool = False):
+        if self._writer:
+            return
+        if prefer_readers or not self._write_waiters:
+            if self._grant_readers():
+                return
+        if self._readers == 0:
+            self._grant_writer()
+
+    async def _wait(self, waiters: Deque[asyncio.Future], release):
+        fut = asyncio.get_event_loop().create_future()
+        waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # granted while cancelled
+                release()
+            else:
+                try:
+                    waiters.remove(fut)
+                except ValueError:
+                    pass
+                # e.g. last waiting writer gone: readers can proceed
+                self._wake()
+            raise
+
+    async def acquire_read(self):
+        start = self.clock()
+        if not self._writer and not self._write_waiters:
+            self._readers += 1
+        else:
+            await self._wait(self._read_waiters, self.release_read)
+        wait = self.clock() - start
+        stats = self.statistics
+        stats.read_acquisitions += 1
+        stats.read_wait_total += wait
+        stats.read_wait_max = max(stats.read_wait_max, wait)
+
+    def release_read(self):
+        assert self._readers > 0, "release_read without acquire_read"
+        self._readers -= 1
+        if self._readers == 0:
+            self._wake()
+
+    async def acquire_write(self):
+        start = self.clock()
+        if not self._writer and self._readers == 0 and not self._write_waiters:
+            self._writer = True
+        else:
+            await self._wait(self._write_waiters, self.release_write)
+        wait = self.clock() - start
+        stats = self.statistics
+        stats.write_acquisitions += 1
+        stats.write_wait_total += wait
+        stats.write_wait_max = max(stats.write_wait_max, wait)
+
+    def release_write(self):
+        assert self._writer, "release_write without acquire_write"
+        self._writer = False
+        self._wake(prefer_readers=True)
+
+    @asynccontextmanager
+    async def reader(self):
+        await self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @asynccontextmanager
+    async def writer(self):
+        await self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
+
+
+__all__ = ["LockStatistics", "ReaderWriterLock"]
@@ -1,35 +1,76 @@
+import asyncio
 import logging
-import threading
+import warnings
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Optional, Sequence, Union
 
 from transitions import Machine
 
 from accml_lib.core.interfaces.backend.backend import BackendRW
 from accml_lib.core.interfaces.simulator.accelerator_simulator import AcceleratorSimulatorInterface
-from accml_lib.core.interfaces.simulator.result_element import ResultElement
-from accml_lib.core.model.output.tune import Tune
+from accml_lib.core.interfaces.simulator.result_element import ResultElement, run_blocking
+from accml_lib.core.model.output.orbit import ArrayOrbit
+from accml_lib.core.model.output.tune import Chromaticity, Tune
+from accml_lib.core.model.utils.command import Command, ReadCommand, TransactionCommand
 
 from .model.calculation_states import CalculationStates as States
+from .linear_response import LinearPrediction, LinearResponse
+from .model.optics import OpticsResult
+from .rw_lock import ReaderWriterLock
 
 logger = logging.getLogger()
 
-# class OrbitElement
-# needs to be implemented
-#    pass
-
-# class TwissElement(ResultElement):
-#     def __init__(self, backend):
-#        self.backend = backend
-#
-#    def get(self, prop_id: str) -> Tune:
+#: closed orbit of pyAT is in m, bpm data in nm
+orbit_scale = 1e9
 
 
 class TuneElement(ResultElement):
     def __init__(self, backend):
         self.backend = backend
 
-    def get(self, prop_id: str) -> Tune:
+    async def get(self, prop_id: str) -> Tune:
         assert prop_id == "transversal", "Only prepared to handle transveral tune"
-        return self.backend.get_tune()
+        return await self.backend.get_tune()
+
+
+class ChromaticityElement(ResultElement):
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get(self, prop_id: str) -> Chromaticity:
+        assert prop_id == "transversal", "Only prepared to handle transveral chromaticity"
+        return await self.backend.get_chromaticity()
+
+
+class OrbitElement(ResultElement):
+    """closed orbit at the optics locations of the simulator
+
+    These are the bpms by default. Positions in nm, as delivered by
+    the bpms; buttons are not available and marked as nan.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get(self, prop_id: str) -> ArrayOrbit:
+        assert prop_id == "transversal", "Only prepared to handle transveral orbit"
+        return await self.backend.get_orbit()
+
+
+class TwissElement(ResultElement):
+    """optics functions at the optics locations of the simulator
+
+    properties: the fields of :class:`Twiss`, e.g. beta or dispersion
+    """
+
+    properties = ("names", "s", "beta", "alpha", "mu", "dispersion", "closed_orbit")
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get(self, prop_id: str) -> object:
+        assert prop_id in self.properties, f"Only prepared to handle {self.properties}, not {prop_id}"
+        return getattr((await self.backend.get_optics()).twiss, prop_id)
 
 
 class SimulationStateModel:
@@ -52,29 +93,52 @@ class SimulatorBackend(BackendRW):
     set (completely).This is not (and can not) directly observed
     here. Here the calculation is only conducted when its results
     are requested. Calculation, setting, and  reading back
-    calculation results are protected by a lock, so no more sets
-    are made while calculation is running nor calculation results
-    are delivered ahead of time.
-
-    Todo:
-        where to break async / sync or threaded approach?
-
+    calculation results are protected by a reader / writer lock, so
+    no more sets are made while calculation is running nor
+    calculation results are delivered ahead of time. Reads share the
+    lock, so concurrent reads run in parallel.
+
+    Calculations run in an executor, so the event loop stays
+    responsive, e.g. for other clients, while optics are computed.
+    By default a single worker thread is used: pyAT calculations on
+    the same lattice must not run in parallel. A process executor
+    would need the lattice to be shipped for each calculation.
+
+    If a :class:`LinearResponse` is given, tune and orbit are
+    predicted from its Jacobians as long as only its actuators were
+    changed, and only by steps within its trust region. Otherwise the
+    optics are calculated and the Jacobians refreshed at the new
+    state. Other optics functions are always calculated.
     """
 
-    def __init__(self, *, acc: AcceleratorSimulatorInterface, name: str, logger=logger):
+    def __init__(
+        self,
+        *,
+        acc: AcceleratorSimulatorInterface,
+        name: str,
+        logger=logger,
+        executor: Optional[Executor] = None,
+        linear_response: Optional[LinearResponse] = None,
+    ):
         self.acc = acc
+        self.linear_response = linear_response
         self.logger = logger
         self.name = name
 
-        self.tune = None
+        #: shared by all result elements, computed once per state
+        self.optics: Optional[OpticsResult] = None
+        #: only computed when requested, at most once per state
+        self.chromaticity: Optional[Chromaticity] = None
 
         # While calculation is running
         # * don't allow setting data
         # * don't provide calculation results:  Twiss, tune, orbit
-        #
-        # Todo: should reads also be protected (by a Read / Write Lock)
-        #       should the lock be an asyncio lock?
-        self.calculation_lock = threading.Lock()
+        # sets and calculations take it for writing, reads for reading
+        self.state_lock = ReaderWriterLock()
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-calculation")
+        self.executor = executor
         self.model = SimulationStateModel()
         self.state = Machine(
             model=self.model,
@@ -93,12 +157,27 @@ class SimulatorBackend(BackendRW):
         )
 
         self.result_elements = dict(
-            # twiss=TwissElement(backend=self),
-            tune=TuneElement(backend=self)
+            tune=TuneElement(backend=self),
+            chromaticity=ChromaticityElement(backend=self),
+            orbit=OrbitElement(backend=self),
+            twiss=TwissElement(backend=self),
         )
 
+    def close(self):
+        """shut down the executor, if created here"""
+        if self._own_executor:
+            self.executor.shutdown(wait=True)
+
+    async def _run_in_executor(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, func, *args)
+
     def _clear_stored_results(self):
-        self.tune = None
+        self.optics = None
+        self.chromaticity = None
+
+    @property
+    def tune(self) -> Optional[Tune]:
+        return None if self.optics is None else self.optics.tune
 
     def get_natural_view_name(self):
         return "design"
@@ -109,61 +188,199 @@ class SimulatorBackend(BackendRW):
         )
 
     async def read(self, dev_id: str, prop_id: str) -> object:
-        """
+        return await self._read(dev_id, prop_id)
 
-        Todo:
-            acquire lock for read too? So that no inconsistent
-            state will be read?
-        """
+    async def read_many(self, cmds: Sequence[ReadCommand]) -> Sequence[object]:
+        """all in one pass: calculation results are computed at most once"""
+        return [await self._read(cmd.id, cmd.property) for cmd in cmds]
+
+    async def _read(self, dev_id: str, prop_id: str) -> object:
         result_element = self.result_elements.get(dev_id, None)
         if result_element:
-            return result_element.get(prop_id)
+            # takes the lock as required for calculating
+            return await result_element.get(prop_id)
 
-        elem = self.acc.get(dev_id)
-        return elem.peek(prop_id)
+        async with self.state_lock.reader():
+            elem = self.acc.get(dev_id)
+            return elem.peek(prop_id)
 
     async def set(self, dev_id: str, prop_id: str, value: object):
         # set state to changed
-        with self.calculation_lock:
+        async with self.state_lock.writer():
             self.model.changed()
+            if self.linear_response is not None:
+                self.linear_response.notice_change(dev_id, prop_id)
             elem = self.acc.get(dev_id)
             r = await elem.update(property_id=prop_id, value=value)
         return r
 
+    async def set_many(self, cmds: Sequence[Command]) -> Sequence[object]:
+        return await self.set_transaction(cmds)
+
+    async def set_transaction(
+        self, commands: Union[Sequence[Command], TransactionCommand]
+    ) -> Sequence[object]:
+        """apply all commands as one change of the machine state
+
+        One lock acquisition and one `changed` transition for the
+        whole transaction: the state is only relevant after all
+        commands were applied. The simulator can update many elements
+        in one pass (see `update_many`).
+        """
+        if isinstance(commands, TransactionCommand):
+            commands = commands.transaction
+        async with self.state_lock.writer():
+            self.model.changed()
+            if self.linear_response is not None:
+                for cmd in commands:
+                    self.linear_response.notice_change(cmd.id, cmd.property)
+            return await self.acc.update_many(commands)
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(name={self.name}, acc={self.acc})"
 
-    def get_tune(self):
-        self._calculate_tune_if_required()
-        assert self.tune is not None, "expected some tune stored, but only found None"
-        return self.tune
+    async def get_tune(self) -> Tune:
+        if self.linear_response is not None:
+            prediction = await self._linear_prediction()
+            if prediction is not None:
+                return prediction.tune
+        return (await self.get_optics()).tune
+
+    def get_tune_sync(self) -> Tune:
+        """blocking :meth:`get_tune`, as it was before it became a coroutine
+
+        Deprecated: await :meth:`get_tune` instead
+        """
+        warnings.warn(
+            f"{self.__class__.__name__}.get_tune_sync is deprecated, await get_tune() instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return run_blocking(self.get_tune())
+
+    async def get_orbit(self) -> ArrayOrbit:
+        if self.linear_response is not None:
+            prediction = await self._linear_prediction()
+            if prediction is not None:
+                names, closed_orbit = prediction.names, prediction.closed_orbit
+                return ArrayOrbit.from_arrays(
+                    names, x=closed_orbit[:, 0] * orbit_scale, y=closed_orbit[:, 1] * orbit_scale
+                )
+        twiss = (await self.get_optics()).twiss
+        closed_orbit = twiss.closed_orbit
+        return ArrayOrbit.from_arrays(
+            twiss.names, x=closed_orbit[:, 0] * orbit_scale, y=closed_orbit[:, 2] * orbit_scale
+        )
+
+    async def _linear_prediction(self) -> Optional[LinearPrediction]:
+        """prediction of the linear response, None if the optics are to be used
 
-    def _calculate_tune_if_required(self):
-        with self.calculation_lock:
+        These are used if calculated for the current state already,
+        or if the state is outside of the trust region: then they are
+        calculated and the linear response refreshed.
+        """
+        response = self.linear_response
+        async with self.state_lock.reader():
+            if self.model.is_finished():
+                return None
+            values = response.read_values(self.acc)
+            if response.within_trust_region(values):
+                return response.predict(values)
+        async with self.state_lock.writer():
+            if self.model.is_finished():
+                return None
+            values = response.read_values(self.acc)
+            if response.within_trust_region(values):
+                return response.predict(values)
+            if response.valid:
+                logger.info(
+                    "%s: step %.3g outside of trust region, refreshing linear response",
+                    self, response.step_norm(values),
+                )
+            await self._refresh_linear_response()
+            return None
+
+    async def refresh_linear_response(self):
+        """calculate optics and the Jacobians at the current state"""
+        assert self.linear_response is not None, f"{self}: no linear response configured"
+        async with self.state_lock.writer():
+            await self._refresh_linear_response()
+
+    async def _refresh_linear_response(self):
+        if self.model.is_pending():
+            await self._calculate_optics()
+        assert (
+            self.model.is_finished()
+        ), f"expected to be in finished state, but I am in {self.model.state}"
+        response = self.linear_response
+        values = response.read_values(self.acc)
+        perturbed = []
+        # lattice changed temporarily, the writer lock keeps it hidden
+        for actuator, value in zip(response.actuators, values):
+            elem = self.acc.get(actuator.id)
+            await elem.update(property_id=actuator.property, value=value + actuator.step)
+            try:
+                perturbed.append(await self._run_in_executor(self.acc.get_optics))
+            finally:
+                await elem.update(property_id=actuator.property, value=value)
+        response.set_reference(values, self.optics, perturbed)
+
+    async def get_optics(self) -> OpticsResult:
+        """optics of the current state, calculated at most once per state"""
+        optics = await self._calculate_optics_if_required()
+        assert optics is not None, "expected some optics stored, but only found None"
+        return optics
+
+    async def _calculate_optics_if_required(self) -> OpticsResult:
+        # calculated already: share the lock with other readers
+        async with self.state_lock.reader():
+            if self.model.is_finished():
+                return self.optics
+        async with self.state_lock.writer():
+            if self.model.is_pending():
+                await self._calculate_optics()
+            assert (
+                self.model.is_finished()
+            ), f"expected to be in finished state, but I am in {self.model.state}"
+            return self.optics
+
+    async def get_chromaticity(self) -> Chromaticity:
+        """chromaticity of the current state, calculated when first requested
+
+        Costs another optics calculation, so it is not computed along
+        with the other optics functions
+        """
+        async with self.state_lock.reader():
+            if self.model.is_finished() and self.chromaticity is not None:
+                return self.chromaticity
+        async with self.state_lock.writer():
             if self.model.is_pending():
-                self._calculate_tune()
+                await self._calculate_optics()
             assert (
                 self.model.is_finished()
             ), f"expected to be in finished state, but I am in {self.model.state}"
+            if self.chromaticity is None:
+                self.chromaticity = await self._run_in_executor(self.acc.get_chromaticity)
+            return self.chromaticity
 
-    def _calculate_tune(self):
+    async def _calculate_optics(self):
         """
-        This method is only  a helper method for _calculate_tune_if_required,
+        This method is only  a helper method for _calculate_optics_if_required,
         It is not to be called when already running
         """
-        logger.debug("Calculating tune")
+        logger.debug("Calculating optics")
         assert (
             self.model.is_pending()
         ), f"expected to be in pending state, but I am in {self.model.state}"
         self.model.calculate()
         try:
-            tune = self.acc.get_tune()
+            optics = await self._run_in_executor(self.acc.get_optics)
             self.model.finished()
         except Exception as exc:
             self.model.error()
             raise exc
-        self.tune = tune
-        logger.info("Calculated tune to x=%.4f y=%.4f", self.tune.x, self.tune.y)
+        self.optics = optics
+        logger.info("Calculated tune to x=%.4f y=%.4f", optics.tune.x, optics.tune.y)
 
 
 _all__ = ["SimulationBackend"]
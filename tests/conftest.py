@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_accml_lib_cache_dir(monkeypatch):
+    """tests enable the configuration cache explicitly, if they need it"""
+    monkeypatch.delenv("ACCML_LIB_CACHE_DIR", raising=False)
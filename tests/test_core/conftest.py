@@ -0,0 +1,79 @@
+"""fakes shared by the tests of the backend proxies"""
+import asyncio
+
+import pytest
+
+from accml_lib.core.interfaces.backend.backend import BackendRW
+
+
+class FakeBackend(BackendRW):
+    """in memory backend recording what is asked of it
+
+    Reads of device "broken" raise a ValueError, all reads a
+    RuntimeError if `fail` is set. Operations in flight are counted
+    in total and per device prefix (the part of dev_id before ":").
+    """
+
+    def __init__(self, *, delay: float = 0.005, set_delay: float = 0.0):
+        self.delay = delay
+        self.set_delay = set_delay
+        self.values = {}
+        self.reads = []
+        self.fail = False
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.per_prefix = {}
+        self.max_per_prefix = {}
+
+    def get_natural_view_name(self):
+        return "fake"
+
+    async def _operation(self, dev_id, delay):
+        prefix = str(dev_id).split(":")[0]
+        self.in_flight += 1
+        self.per_prefix[prefix] = self.per_prefix.get(prefix, 0) + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.max_per_prefix[prefix] = max(self.max_per_prefix.get(prefix, 0), self.per_prefix[prefix])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+            self.per_prefix[prefix] -= 1
+
+    async def trigger(self, dev_id, prop_id):
+        await self._operation(dev_id, self.delay)
+
+    async def read(self, dev_id, prop_id):
+        self.reads.append((dev_id, prop_id))
+        await self._operation(dev_id, self.delay)
+        if dev_id == "broken":
+            raise ValueError("no such device")
+        if self.fail:
+            raise RuntimeError("read failed")
+        return self.values.get((dev_id, prop_id), 0)
+
+    async def set(self, dev_id, prop_id, value):
+        await self._operation(dev_id, self.set_delay)
+        self.values[(dev_id, prop_id)] = value
+
+
+class Clock:
+    """returns `now`, advanced by `step` on each call"""
+
+    def __init__(self, step=0):
+        self.now = 0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+@pytest.fixture
+def fake_backend() -> FakeBackend:
+    return FakeBackend()
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from accml_lib.core.bl.coalescing_backend import (
+    CoalescingBackendRProxy,
+    CoalescingBackendRWProxy,
+)
+from accml_lib.core.model.utils.command import BehaviourOnError, Command, ReadCommand
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_backend_read(fake_backend):
+    backend = fake_backend
+    backend.values[("Q1", "current")] = 3.0
+    proxy = CoalescingBackendRProxy(backend=backend)
+
+    r = await asyncio.gather(*[proxy.read("Q1", "current") for _ in range(5)])
+    assert r == [3.0] * 5
+    assert backend.reads == [("Q1", "current")]
+    assert proxy.statistics.coalesced == 4
+
+    # without freshness window: next read goes to the backend again
+    await proxy.read("Q1", "current")
+    assert len(backend.reads) == 2
+
+
+@pytest.mark.asyncio
+async def test_read_many_coalesces_duplicates(fake_backend):
+    backend = fake_backend
+    proxy = CoalescingBackendRProxy(backend=backend)
+    cmds = [ReadCommand(id="Q1", property="current")] * 3 + [ReadCommand(id="Q2", property="current")]
+    r = await proxy.read_many(cmds)
+    assert len(r) == 4
+    assert sorted(backend.reads) == [("Q1", "current"), ("Q2", "current")]
+
+
+@pytest.mark.asyncio
+async def test_freshness_window(fake_backend, clock):
+    fake_backend.delay = 0
+    backend = fake_backend
+    proxy = CoalescingBackendRProxy(backend=backend, freshness_ms=100, clock=clock)
+
+    await proxy.read("Q1", "current")
+    clock.now = 0.05
+    await proxy.read("Q1", "current")
+    assert len(backend.reads) == 1
+    assert proxy.statistics.fresh_hits == 1
+
+    clock.now = 0.2
+    await proxy.read("Q1", "current")
+    assert len(backend.reads) == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_but_not_cached(fake_backend):
+    backend = fake_backend
+    backend.fail = True
+    proxy = CoalescingBackendRProxy(backend=backend, freshness_ms=1000)
+
+    r = await asyncio.gather(
+        proxy.read("Q1", "current"), proxy.read("Q1", "current"), return_exceptions=True
+    )
+    assert all(isinstance(e, RuntimeError) for e in r)
+    assert len(backend.reads) == 1
+
+    backend.fail = False
+    assert await proxy.read("Q1", "current") == 0
+    assert len(backend.reads) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_consumer_does_not_cancel_shared_read(fake_backend):
+    backend = fake_backend
+    backend.values[("Q1", "current")] = 1.5
+    proxy = CoalescingBackendRProxy(backend=backend)
+
+    first = asyncio.ensure_future(proxy.read("Q1", "current"))
+    second = asyncio.ensure_future(proxy.read("Q1", "current"))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 1.5
+    assert len(backend.reads) == 1
+
+
+@pytest.mark.asyncio
+async def test_set_invalidates(fake_backend, clock):
+    backend = fake_backend
+    proxy = CoalescingBackendRWProxy(backend=backend, freshness_ms=1000, clock=clock)
+
+    assert await proxy.read("Q1", "current") == 0
+    await proxy.set("Q1", "current", 2.0)
+    assert await proxy.read("Q1", "current") == 2.0
+
+    # a read in flight when the set arrives is not handed to later readers
+    in_flight = asyncio.ensure_future(proxy.read("Q1", "current"))
+    await asyncio.sleep(0)
+    await proxy.set_many([Command(id="Q1", property="current", value=4.0, behaviour_on_error=BehaviourOnError.stop)])
+    assert await proxy.read("Q1", "current") == 4.0
+    await in_flight
+    assert await proxy.read("Q1", "current") == 4.0
+
+
+@pytest.mark.asyncio
+async def test_read_during_set_is_not_kept_fresh(fake_backend):
+    fake_backend.set_delay = 0.05
+    backend = fake_backend
+    proxy = CoalescingBackendRWProxy(backend=backend, freshness_ms=1000)
+
+    setting = asyncio.ensure_future(proxy.set("q", "cur", 5))
+    await asyncio.sleep(0)
+    # started after the set, done before it: old value
+    assert await proxy.read("q", "cur") == 0
+    await setting
+    assert await proxy.read("q", "cur") == 5
+
+
+@pytest.mark.asyncio
+async def test_set_invalidates_derived_observables(fake_backend, clock):
+    proxy = CoalescingBackendRWProxy(backend=fake_backend, freshness_ms=1000, clock=clock)
+
+    await proxy.read("tune", "transversal")
+    await proxy.set("QF1", "main_strength", 1.2)
+    await proxy.read("tune", "transversal")
+    assert fake_backend.reads == [("tune", "transversal")] * 2
+
+    # a read in flight when the set arrives is not handed out after it
+    clock.now = 10.0
+    in_flight = asyncio.ensure_future(proxy.read("tune", "transversal"))
+    await asyncio.sleep(0)
+    await proxy.set_many([Command(id="QF1", property="main_strength", value=1.3, behaviour_on_error=BehaviourOnError.stop)])
+    await proxy.read("tune", "transversal")
+    await in_flight
+    assert len(fake_backend.reads) == 4
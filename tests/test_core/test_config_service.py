@@ -0,0 +1,165 @@
+import pickle
+import shutil
+from pathlib import Path
+
+import pytest
+
+from accml_lib.core.config.config_service import ConfigService
+from accml_lib.core.config.repository import file_repository
+from accml_lib.core.config.repository.base import Repository
+from accml_lib.core.config.repository.file_repository import FileRepository
+from accml_lib.core.model.config.magnet import MagneticObject
+
+config_dir = Path(__file__).resolve().parents[2] / "src" / "accml_lib" / "custom" / "config_data" / "bessyii"
+
+
+@pytest.fixture
+def magnet_path(tmp_path):
+    path = tmp_path / "magnets.yaml"
+    shutil.copy(config_dir / "magnets.yaml", path)
+    return path
+
+
+def test_cache_hit_skips_parsing(magnet_path, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    ref = FileRepository(MagneticObject, magnet_path, cache_dir=cache_dir).load()
+    assert len(list(cache_dir.glob("*.pickle"))) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("yaml should not be parsed on a cache hit")
+
+    monkeypatch.setattr(file_repository, "iter_yaml_items", fail)
+    assert FileRepository(MagneticObject, magnet_path, cache_dir=cache_dir).load() == ref
+
+
+def test_changed_file_invalidates_cache(magnet_path, tmp_path):
+    cache_dir = tmp_path / "cache"
+    repo = FileRepository(MagneticObject, magnet_path, cache_dir=cache_dir)
+    n_magnets = len(repo.load())
+
+    with open(magnet_path, "rt") as f:
+        first = f.read().split("\n\n")[0]
+    with open(magnet_path, "at") as f:
+        f.write("\n" + first.replace("Q1M2D1R", "QNEW") + "\n")
+
+    assert len(repo.load()) == n_magnets + 1
+    # stale snapshot is removed
+    assert len(list(cache_dir.glob("*.pickle"))) == 1
+
+
+def test_cache_key_covers_version_and_model(magnet_path, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    repo = FileRepository(MagneticObject, magnet_path, cache_dir=cache_dir)
+    repo.load()
+    (first,) = cache_dir.glob("*.pickle")
+
+    monkeypatch.setattr(file_repository, "package_version", lambda: "0.0.0-other")
+    assert repo._cache_path() != first
+    repo.load()
+    # snapshot of the other version is removed
+    (second,) = cache_dir.glob("*.pickle")
+    assert second != first
+
+    class Extended(MagneticObject):
+        comment: str = ""
+
+    assert file_repository.model_signature(Extended) != file_repository.model_signature(MagneticObject)
+
+
+def test_cache_is_opt_in(magnet_path, tmp_path, monkeypatch):
+    from accml_lib.core.config.utils import default_cache_dir
+
+    assert default_cache_dir() is None
+    cs = ConfigService(magnet_path=magnet_path, pc_path=config_dir / "power_converters.yaml")
+    cs.load()
+    assert not list(tmp_path.glob("**/*.pickle"))
+
+    monkeypatch.setenv("ACCML_LIB_CACHE_DIR", "")
+    assert default_cache_dir() is None
+    monkeypatch.setenv("ACCML_LIB_CACHE_DIR", str(tmp_path / "cache"))
+    assert default_cache_dir() == tmp_path / "cache"
+
+
+def test_failed_snapshot_leaves_no_temporary_file(magnet_path, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+
+    def fail(*args, **kwargs):
+        raise pickle.PicklingError("can not pickle")
+
+    monkeypatch.setattr(file_repository.pickle, "dump", fail)
+    models = FileRepository(MagneticObject, magnet_path, cache_dir=cache_dir).load()
+    assert len(models) > 0
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_config_service_without_cache(magnet_path, tmp_path):
+    cs = ConfigService(
+        magnet_path=magnet_path, pc_path=config_dir / "power_converters.yaml", cache_dir=None
+    )
+    cs.load()
+    assert len(cs.get_quadrupoles()) > 0
+    assert not list(tmp_path.glob("**/*.pickle"))
+
+
+def test_config_service_indices(magnet_path):
+    cs = ConfigService(
+        magnet_path=magnet_path, pc_path=config_dir / "power_converters.yaml", cache_dir=None
+    )
+    with pytest.raises(RuntimeError):
+        cs.get_quadrupoles()
+    cs.load()
+
+    magnets = cs.get_magnets()
+    quads = cs.get_quadrupoles()
+    assert isinstance(quads, tuple)
+    assert list(quads) == [m for m in magnets if m.type == "quadrupole"]
+    assert cs.get_quadrupoles() is quads
+
+    for pc_id in ("Q1PTR", "Q1PDR"):
+        on_pc = cs.get_magnets_on_power_converter(pc_id)
+        assert list(on_pc) == [m for m in magnets if m.power_converter_id == pc_id]
+        assert len(on_pc) > 0
+
+    tc = cs.get_family_members("tune_correction")
+    assert list(tc) == [m for m in magnets if "tune_correction" in m.family_member]
+
+    assert cs.get_magnet("Q1M2D1R").power_converter_id == "Q1PDR"
+    assert cs.get_magnets_of_type("no_such_type") == ()
+    assert set(cs.get_types()) == {m.type for m in magnets}
+
+
+
+class ListRepository(Repository):
+    def __init__(self, models):
+        self.models = models
+
+    def load(self):
+        return self.models
+
+
+def test_duplicate_elem_id_is_refused(magnet_path):
+    magnets = FileRepository(MagneticObject, magnet_path).load()
+    cs = ConfigService.from_repositories(ListRepository(magnets + magnets[:1]), ListRepository([]))
+    with pytest.raises(ValueError, match=repr(magnets[0].elem_id)):
+        cs.load()
+
+def test_streaming_yaml_matches_safe_load(magnet_path, tmp_path):
+    import json
+    import yaml
+
+    repo = FileRepository(MagneticObject, magnet_path)
+    with open(magnet_path, "rt") as f:
+        ref = [MagneticObject(**item) for item in yaml.safe_load(f)]
+    assert list(repo.iter_load()) == ref
+
+    # one item per document
+    multi_doc = tmp_path / "magnets_multi.yaml"
+    with open(multi_doc, "wt") as f:
+        yaml.safe_dump_all([m.model_dump() for m in ref[:3]], f)
+    assert FileRepository(MagneticObject, multi_doc).load() == ref[:3]
+
+    json_lines = tmp_path / "magnets.jsonl"
+    with open(json_lines, "wt") as f:
+        for m in ref[:3]:
+            f.write(json.dumps(m.model_dump()) + "\n")
+    assert FileRepository(MagneticObject, json_lines).load() == ref[:3]
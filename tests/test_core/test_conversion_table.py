@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import accml_lib.custom.bessyii.liasion_translator_setup as lts
+from accml_lib.core.bl.command_rewritter import CommandRewriter
+from accml_lib.core.bl.conversion_table import ConversionTable
+from accml_lib.core.model.utils.command import BehaviourOnError, Command
+from accml_lib.core.model.utils.identifiers import LatticeElementPropertyID
+
+config_dir = Path(__file__).resolve().parents[2] / "src" / "accml_lib" / "custom" / "config_data" / "bessyii"
+
+
+@pytest.fixture(scope="module")
+def managers():
+    return lts.build_managers(config_dir)
+
+
+@pytest.fixture(scope="module")
+def table(managers):
+    _, lm, tm = managers
+    return ConversionTable.from_managers(lm, tm)
+
+
+def test_table_skips_non_linear_conversions(table):
+    # tune uses a dedicated conversion object
+    assert LatticeElementPropertyID(element_name="tune", property="transversal") not in table.lattice_index
+    assert len(table) > 0
+
+
+def test_plan_matches_command_rewriter(managers, table):
+    yp, lm, tm = managers
+    names = yp.tune_correction_quadrupole_names()
+    plan = table.plan(names, "main_strength")
+    assert len(plan) == len(names)
+
+    values = np.linspace(-1, 1, len(names))
+    cmds = plan.forward_commands(values)
+
+    rewriter = CommandRewriter(liaison_manager=lm, translation_service=tm)
+    for name, value, cmd in zip(names, values, cmds):
+        ref = rewriter.forward(
+            Command(id=name, property="main_strength", value=value, behaviour_on_error=BehaviourOnError.stop)
+        )
+        assert cmd.id == ref.id
+        assert cmd.property == ref.property
+        assert cmd.value == pytest.approx(ref.value, rel=1e-12)
+
+    assert plan.inverse(plan.forward(values)) == pytest.approx(values, rel=1e-12, abs=1e-15)
+
+
+def test_unknown_property_raises(table):
+    with pytest.raises(KeyError):
+        table.plan(["not_a_magnet"], "main_strength")
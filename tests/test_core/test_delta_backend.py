@@ -196,3 +196,157 @@ async def test_filter_blocks_cache_and_raises_on_calculation(monkeypatch):
     with pytest.raises(AssertionError):
         # this should raise because filter returns None and code asserts ref is not None
         await proxy.set(dev_id="dev1", prop_id="de.ta_v", value=3)
+
+
+@pytest.mark.asyncio
+async def test_read_delta_orbit():
+    from accml_lib.core.model.output.orbit import ArrayOrbit
+
+    fake = FakeBackend()
+    ref = ArrayOrbit.from_arrays(["bpm1", "bpm2"], x=[1.0, 2.0], y=[3.0, 4.0])
+    fake.read_map[("orbit", "pos")] = ref
+    proxy = backend_mod.DeltaBackendRProxy(backend=fake, cache=StateCache(name="test_cache"))
+
+    await proxy.read(dev_id="orbit", prop_id="delta_pos")
+    fake.read_map[("orbit", "pos")] = ref * 3
+    diff = await proxy.read(dev_id="orbit", prop_id="delta_pos")
+    assert diff.x == pytest.approx([2.0, 4.0])
+    assert diff.y == pytest.approx([6.0, 8.0])
+
+
+class CountingBackend(FakeBackend):
+    """counts the batched requests"""
+
+    def __init__(self):
+        super().__init__()
+        self.n_read_many = 0
+        self.n_set_many = 0
+
+    async def read_many(self, cmds):
+        self.n_read_many += 1
+        return await super().read_many(cmds)
+
+    async def set_many(self, cmds):
+        self.n_set_many += 1
+        return await super().set_many(cmds)
+
+
+@pytest.mark.asyncio
+async def test_default_read_many_and_set_many():
+    from accml_lib.core.model.utils.command import BehaviourOnError, Command
+
+    fake = FakeBackend()
+    fake.read_map[("d1", "p")] = 1
+    fake.read_map[("d2", "p")] = 2
+    assert await fake.read_many([ReadCommand(id="d2", property="p"), ReadCommand(id="d1", property="p")]) == [2, 1]
+    await fake.set_many([Command(id="d1", property="p", value=3, behaviour_on_error=BehaviourOnError.stop)])
+    assert fake.last_set == ("d1", "p", 3)
+
+
+@pytest.mark.asyncio
+async def test_delta_read_many_and_set_many_one_request():
+    from accml_lib.core.model.utils.command import BehaviourOnError, Command
+
+    fake = CountingBackend()
+    for cnt in range(4):
+        fake.read_map[(f"pc{cnt}", "current")] = 10 * cnt
+    proxy = backend_mod.DeltaBackendRWProxy(backend=fake, cache=StateCache(name="test_cache"))
+
+    cmds = [
+        Command(id=f"pc{cnt}", property="delta_current", value=0.5, behaviour_on_error=BehaviourOnError.stop)
+        for cnt in range(4)
+    ] + [Command(id="pc9", property="current", value=1, behaviour_on_error=BehaviourOnError.stop)]
+    await proxy.set_many(cmds)
+    assert fake.n_read_many == 1
+    assert fake.n_set_many == 1
+    assert ("set", "pc3", "current", 30.5) in fake.calls
+    assert ("set", "pc9", "current", 1) in fake.calls
+
+    fake.read_map[("pc2", "current")] = 20.5
+    r = await proxy.read_many(
+        [ReadCommand(id="pc2", property="delta_current"), ReadCommand(id="pc1", property="current")]
+    )
+    assert r == [0.5, 10]
+    assert fake.n_read_many == 2
+
+
+def test_state_cache_snapshots_copy_on_write():
+    cache = StateCache(name="test_cache", max_snapshots=2)
+    q1, q2 = ReadCommand(id="Q1", property="x"), ReadCommand(id="Q2", property="x")
+    cache.set_many([(q1, 1.0), (q2, 2.0)])
+    assert cache.get_many([q1, q2, "missing"]) == [1.0, 2.0, None]
+
+    ref = cache.snapshot("reference")
+    # no copy made when taking the snapshot
+    assert cache.snapshot_values(ref) == cache.cache
+
+    cache.set(q1, 5.0)
+    assert cache.get(q1) == 5.0
+    assert cache.snapshot_values("reference")[q1] == 1.0
+
+    version = cache.snapshot()
+    cache.clear()
+    assert cache.get(q1) is None
+    cache.restore("reference")
+    assert cache.get(q1) == 1.0
+    # a change after restore does not alter the snapshot
+    cache.set(q2, 7.0)
+    assert cache.snapshot_values("reference")[q2] == 2.0
+
+    # least recently used dropped: the version snapshot
+    cache.snapshot("third")
+    assert cache.snapshots() == ["reference", "third"]
+    with pytest.raises(KeyError):
+        cache.restore(version)
+    cache.drop_snapshot("third")
+    assert cache.snapshots() == ["reference"]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_references():
+    fake = CountingBackend()
+    for cnt in range(3):
+        fake.read_map[(f"pc{cnt}", "current")] = 10 * cnt
+    cache = StateCache(name="test_cache")
+    proxy = backend_mod.DeltaBackendRProxy(backend=fake, cache=cache)
+
+    cache.set(ReadCommand(id="pc0", property="current"), 0)
+    n = await proxy.prefetch_references(
+        [ReadCommand(id=f"pc{cnt}", property="delta_current") for cnt in range(3)]
+        + [ReadCommand(id="pc1", property="current")]
+    )
+    # zero reference is a reference: not read again
+    assert n == 2
+    assert fake.n_read_many == 1
+    assert cache.get(ReadCommand(id="pc2", property="current")) == 20
+    assert await proxy.prefetch_references([ReadCommand(id="pc2", property="delta_current")]) == 0
+    assert fake.n_read_many == 1
+
+
+@pytest.mark.asyncio
+async def test_auto_prefetch_batches_concurrent_sets():
+    from accml_lib.core.model.utils.command import BehaviourOnError, Command, TransactionCommand
+
+    fake = CountingBackend()
+    for cnt in range(4):
+        fake.read_map[(f"pc{cnt}", "current")] = 10 * cnt
+    proxy = backend_mod.DeltaBackendRWProxy(
+        backend=fake, cache=StateCache(name="test_cache"), auto_prefetch=True
+    )
+    transaction = TransactionCommand(
+        transaction=[
+            Command(id=f"pc{cnt}", property="delta_current", value=0.5, behaviour_on_error=BehaviourOnError.stop)
+            for cnt in range(4)
+        ]
+    )
+    # as an execution engine would do
+    await asyncio.gather(
+        *[proxy.set(dev_id=cmd.id, prop_id=cmd.property, value=cmd.value) for cmd in transaction.transaction]
+    )
+    assert fake.n_read_many == 1
+    assert ("set", "pc3", "current", 30.5) in fake.calls
+
+    # references known now, transaction accepted as well
+    await proxy.set_many(transaction)
+    assert fake.n_read_many == 1
+    assert fake.n_set_many == 1
@@ -0,0 +1,131 @@
+import datetime
+import json
+import sys
+
+import jsons
+import numpy as np
+import pytest
+
+from accml_lib.core.model import fast_serialization, jsons_support
+from accml_lib.core.model.output.result import ReadTogether, Result, ResultOfExecutionStep, SingleReading
+from accml_lib.core.model.output.tune import Tune
+from accml_lib.core.model.utils.command import BehaviourOnError, Command, ReadCommand
+
+jsons_fork = jsons.fork()
+jsons_support.register_serializers(jsons_fork)
+jsons_support.register_deserializers(jsons_fork)
+
+
+def read_together(end: datetime.datetime) -> ReadTogether:
+    return ReadTogether(
+        start=end - datetime.timedelta(seconds=2, microseconds=17),
+        end=end,
+        data=[
+            SingleReading(cmd=ReadCommand(id="tune", property="transversal"), name="tune", payload=Tune(x=0.84, y=0.73)),
+            SingleReading(cmd=ReadCommand(id="Q1PDR", property="rdbk"), name="Q1PDR", payload=2.5),
+            SingleReading(cmd=ReadCommand(id="mc", property="count"), name="mc", payload=7),
+        ],
+    )
+
+
+@pytest.fixture(params=[datetime.timezone.utc, datetime.timezone(datetime.timedelta(hours=-3, minutes=-30))])
+def result(request):
+    end = datetime.datetime(2025, 3, 1, 12, 30, 5, 123456, tzinfo=request.param)
+    step = ResultOfExecutionStep(
+        cmds=[Command(id="Q1M1D1R", property="delta_main_strength", value=1e-3, behaviour_on_error=BehaviourOnError.stop)],
+        data=[read_together(end), read_together(end + datetime.timedelta(seconds=5))],
+    )
+    return Result(data=[step], orig_data=[step])
+
+
+def test_encode_matches_jsons(result):
+    assert fast_serialization.encode(result) == jsons.dump(result, fork_inst=jsons_fork)
+
+
+def test_jsons_output_decodes(result):
+    d = jsons.dump(result, fork_inst=jsons_fork)
+    r = fast_serialization.decode(d, Result)
+    (rt,) = r.data[0].data[:1]
+    assert rt.start == result.data[0].data[0].start
+    assert rt.get("tune").payload == dict(x=0.84, y=0.73)
+    assert r.data[0].cmds == result.data[0].cmds
+
+
+@pytest.mark.parametrize("format", ["json", "msgpack"])
+def test_bytes_round_trip(result, format):
+    if format == "msgpack":
+        pytest.importorskip("msgpack")
+    data = fast_serialization.dumps(result, format=format)
+    r = fast_serialization.loads(data, Result, format=format)
+    assert fast_serialization.encode(r) == fast_serialization.encode(result)
+    assert r.data[0].cmds[0].behaviour_on_error is BehaviourOnError.stop
+
+
+def orbit_result(payload) -> Result:
+    end = datetime.datetime(2025, 3, 1, 12, 30, 5, tzinfo=datetime.timezone.utc)
+    rt = ReadTogether(
+        start=end,
+        end=end,
+        data=[SingleReading(cmd=ReadCommand(id="orbit", property="transversal"), name="orbit", payload=payload)],
+    )
+    return Result(data=[ResultOfExecutionStep(cmds=[], data=[rt])], orig_data=[])
+
+
+@pytest.fixture
+def array_orbit():
+    from accml_lib.core.model.output.orbit import ArrayOrbit
+
+    return ArrayOrbit.from_arrays(["BPM1", "BPM2", "BPM3"], x=[1.0, -2.0, 3.5], y=[0.5, 0.0, -1.0], a=[1.0, 2.0, 3.0])
+
+
+@pytest.mark.parametrize("kind", ["array_orbit", "orbit"])
+def test_orbit_round_trip_without_jsons(array_orbit, kind, monkeypatch):
+    from accml_lib.core.model.output.orbit import ArrayOrbit, Orbit
+
+    cls = ArrayOrbit if kind == "array_orbit" else Orbit
+    orbit = array_orbit if cls is ArrayOrbit else array_orbit.to_orbit()
+    # lookup table built: must not end up in the output
+    orbit.get_element("BPM2")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("jsons must not be used for orbits")
+
+    monkeypatch.setattr(jsons, "dump", fail)
+    data = fast_serialization.dumps(orbit_result(orbit))
+    assert b"_lut" not in data
+
+    r = fast_serialization.loads(data, Result)
+    payload = r.data[0].data[0].get("orbit").payload
+    assert "_lut" not in payload
+    decoded = fast_serialization.decode(payload, cls)
+    assert isinstance(decoded, cls)
+    if cls is Orbit:
+        decoded = decoded.to_array_orbit()
+    assert decoded.names == array_orbit.names
+    np.testing.assert_array_equal(decoded.data, array_orbit.data)
+
+
+def test_bpm_reading_round_trip():
+    from accml_lib.core.model.output.orbit import BPMButtons, BPMPosition, BPMReading
+
+    reading = BPMReading(name="BPM1", pos=BPMPosition(x=1.0, y=0.5), btns=BPMButtons(a=1.0, b=2.0, c=3.0, d=4.0))
+    d = fast_serialization.encode(reading)
+    assert d == dict(name="BPM1", pos=dict(x=1.0, y=0.5), btns=dict(a=1.0, b=2.0, c=3.0, d=4.0))
+    assert fast_serialization.decode(d, BPMReading) == reading
+
+
+def test_json_without_orjson_writes_null_for_nan(array_orbit, monkeypatch):
+    pytest.importorskip("orjson")
+    result = orbit_result(array_orbit)
+    with_orjson = fast_serialization.dumps(result)
+
+    # import fails: standard library json is used
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    without_orjson = fast_serialization.dumps(result)
+    assert b"NaN" not in without_orjson
+    # valid json, the same for both
+    assert json.loads(without_orjson) == json.loads(with_orjson)
+
+    r = fast_serialization.loads(without_orjson, Result)
+    decoded = fast_serialization.decode(r.data[0].data[0].get("orbit").payload, type(array_orbit))
+    np.testing.assert_array_equal(decoded.data, array_orbit.data)
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from accml_lib.core.bl.delta_backend import DeltaBackendRProxy, StateCache
+from accml_lib.core.bl.filters import (
+    ExponentialFilter,
+    FilteredBackendRWProxy,
+    MovingAverageFilter,
+    MovingMedianFilter,
+    SigmaClippedMeanFilter,
+)
+from accml_lib.core.interfaces.backend.backend import BackendRW
+from accml_lib.core.model.output.orbit import ArrayOrbit
+from accml_lib.core.model.output.tune import Tune
+from accml_lib.core.model.utils.command import ReadCommand
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def test_moving_average_scalar_and_array():
+    filt = MovingAverageFilter(window=3)
+    r = [filt.process(v) for v in [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]]
+    assert r == pytest.approx([1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 6.0])
+    assert isinstance(r[0], float)
+
+    filt = MovingAverageFilter(window=2)
+    filt.process(np.array([[0.0, 2.0]]))
+    r = filt.process(np.array([[2.0, 4.0]]))
+    np.testing.assert_allclose(r, [[1.0, 3.0]])
+    # other shape: restarted
+    np.testing.assert_allclose(filt.process(np.array([5.0])), [5.0])
+
+
+def test_moving_average_matches_mean_over_many_samples():
+    rng = np.random.default_rng(1)
+    samples = rng.normal(size=(50, 4))
+    filt = MovingAverageFilter(window=5)
+    for sample in samples:
+        r = filt.process(sample)
+    np.testing.assert_allclose(r, samples[-5:].mean(axis=0))
+
+
+def test_median_and_sigma_clipped_reject_outlier():
+    values = [1.0, 1.1, 0.9, 100.0, 1.0, 1.05, 0.95, 1.0, 1.0, 1.0]
+    median = MovingMedianFilter(window=5)
+    clipped = SigmaClippedMeanFilter(window=10, n_sigma=2)
+    for v in values:
+        m = median.process(v)
+        c = clipped.process(v)
+    assert m == pytest.approx(1.0)
+    assert c == pytest.approx(np.mean([v for v in values if v < 10]))
+
+
+def test_exponential_on_tune():
+    filt = ExponentialFilter(alpha=0.5)
+    assert filt.process(Tune(x=0.1, y=0.2)) == Tune(x=0.1, y=0.2)
+    r = filt.process(Tune(x=0.3, y=0.2))
+    assert r.x == pytest.approx(0.2) and r.y == pytest.approx(0.2)
+    with pytest.raises(ValueError):
+        ExponentialFilter(alpha=0)
+
+
+def test_array_orbit_elementwise():
+    filt = MovingAverageFilter(window=2)
+    names = ["bpm1", "bpm2"]
+    filt.process(ArrayOrbit.from_arrays(names, x=[0.0, 2.0], y=[1.0, 1.0]))
+    r = filt.process(ArrayOrbit.from_arrays(names, x=[2.0, 2.0], y=[3.0, 1.0]))
+    assert isinstance(r, ArrayOrbit)
+    assert r.names == tuple(names)
+    np.testing.assert_allclose(r.x, [1.0, 2.0])
+    np.testing.assert_allclose(r.y, [2.0, 1.0])
+    assert np.isnan(r.a).all()
+
+
+class NoisyBackend(BackendRW):
+    def __init__(self):
+        self.readings = {}
+
+    def get_natural_view_name(self):
+        return "noisy"
+
+    async def trigger(self, dev_id, prop_id):
+        return None
+
+    async def read(self, dev_id, prop_id):
+        return self.readings[(dev_id, prop_id)].pop(0)
+
+    async def set(self, dev_id, prop_id, value):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_filtered_proxy_below_delta_proxy():
+    backend = NoisyBackend()
+    backend.readings[("tune", "x")] = [0.20, 0.22, 0.24, 0.30]
+    backend.readings[("Q1", "current")] = [1.0, 2.0]
+    filtered = FilteredBackendRWProxy(
+        backend=backend,
+        filter_factory=lambda rcmd: MovingAverageFilter(window=2) if rcmd.id == "tune" else None,
+    )
+    delta = DeltaBackendRProxy(backend=filtered, cache=StateCache(name="test"))
+
+    assert await delta.read("tune", "delta_x") == pytest.approx(0.0)
+    # reference 0.20, average of 0.20 and 0.22
+    assert await delta.read("tune", "delta_x") == pytest.approx(0.01)
+    assert await filtered.read("Q1", "current") == 1.0
+    assert await filtered.read_many([ReadCommand(id="Q1", property="current")]) == [2.0]
+
+    # readings before the set are not averaged with the ones after it
+    await filtered.set("Q1", "current", 3.0)
+    assert await filtered.read("tune", "x") == pytest.approx(0.24)
+    assert await filtered.read("tune", "x") == pytest.approx(0.27)
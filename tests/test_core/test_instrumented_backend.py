@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from accml_lib.core.bl.instrumented_backend import (
+    InstrumentedBackendRWProxy,
+    LatencyHistogram,
+    payload_size,
+)
+from accml_lib.core.model.output.orbit import ArrayOrbit
+from accml_lib.core.model.output.tune import Tune
+from accml_lib.core.model.utils.command import BehaviourOnError, Command, ReadCommand
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def test_payload_size():
+    orbit = ArrayOrbit.from_arrays([f"BPM{i}" for i in range(10)], x=np.zeros(10), y=np.zeros(10))
+    # 6 channels per bpm
+    assert payload_size(orbit) == (60, 480)
+    assert payload_size(orbit.to_orbit()) == (1, 0)
+    assert payload_size(np.zeros((2, 10))) == (20, 160)
+    assert payload_size(Tune(x=0.1, y=0.2)) == (1, 0)
+    assert payload_size(2.0) == (1, 8)
+    assert payload_size(None) == (0, 0)
+
+
+def test_histogram_quantiles():
+    h = LatencyHistogram()
+    for ns in [100] * 90 + [10_000] * 10:
+        h.record(ns)
+    assert h.count == 100
+    assert h.min == 100 and h.max == 10_000
+    assert h.quantile(0.5) == 128
+    assert h.quantile(0.99) == 10_000
+    snap = h.snapshot()
+    assert snap["buckets"] == {"128": 90, "16384": 10}
+    assert snap["mean_ns"] == pytest.approx(1090)
+
+
+@pytest.mark.asyncio
+async def test_records_per_operation(tmp_path, fake_backend, clock):
+    fake_backend.values[("BPM", "orbit")] = np.zeros((2, 10))
+    # 1 us per call
+    clock.step = 1000
+    proxy = InstrumentedBackendRWProxy(backend=fake_backend, clock=clock)
+
+    await proxy.set("Q1", "current", 2.0)
+    assert await proxy.read("Q1", "current") == 2.0
+    orbit = await proxy.read("BPM", "orbit")
+    assert orbit.shape == (2, 10)
+    with pytest.raises(ValueError):
+        await proxy.read("broken", "current")
+    await proxy.set_many(
+        [Command(id=f"Q{i}", property="current", value=1.0, behaviour_on_error=BehaviourOnError.stop) for i in range(3)]
+    )
+    await proxy.read_many([ReadCommand(id="Q1", property="current")])
+
+    stats = proxy.statistics
+    assert stats[("Q1", "current", "set")].calls == 1
+    assert stats[("Q1", "current", "read")].values == 1
+    assert stats[("BPM", "orbit", "read")].values == 20
+    assert stats[("BPM", "orbit", "read")].bytes == 160
+    assert stats[("broken", "current", "read")].errors == 1
+    assert stats[("Q2", "current", "set_many")].calls == 1
+    assert stats[("Q1", "current", "read_many")].latency.min == 1000
+
+    path = tmp_path / "stats.json"
+    proxy.dump(path)
+    d = json.loads(path.read_text())
+    assert len(d["operations"]) == len(stats)
+    assert list(tmp_path.iterdir()) == [path]
+
+    proxy.reset()
+    assert proxy.snapshot()["operations"] == []
+
+
+@pytest.mark.asyncio
+async def test_periodic_dump(tmp_path, fake_backend):
+    proxy = InstrumentedBackendRWProxy(backend=fake_backend)
+    await proxy.read("Q1", "current")
+    path = tmp_path / "stats.json"
+    task = proxy.start_periodic_dump(path, interval=0.01)
+    await asyncio.sleep(0.05)
+    proxy.stop_periodic_dump()
+    await asyncio.sleep(0)
+    assert task.cancelled()
+    (entry,) = json.loads(path.read_text())["operations"]
+    assert entry["dev_id"] == "Q1" and entry["calls"] == 1
@@ -133,3 +133,48 @@ def test_command_rewriter_inv_rcmd(command_rewriter):
     chk, = c.inverse_read_command(rcmd)
     assert chk.id == "quad1"
     assert chk.property == "main_strength"
+
+
+@pytest.fixture
+def batch_command_rewriter():
+    from accml_lib.core.bl.unit_conversion import EnergyDependentLinearUnitConversion
+
+    names = ["quad1", "quad2", "quad3"]
+    forward_lut = {
+        LatticeElementPropertyID(element_name=name, property="main_strength"):
+            DevicePropertyID(device_name=f"{name}_pc", property="set_current")
+        for name in names
+    }
+    inverse_lut = {v: [k] for k, v in forward_lut.items()}
+    lut = {
+        ConversionID(k, v): EnergyDependentLinearUnitConversion(
+            slope=1.0 + cnt, intercept=0.5 * cnt, brho=5
+        )
+        for cnt, (k, v) in enumerate(forward_lut.items())
+    }
+    return CommandRewriter(
+        liaison_manager=LiaisonManager(forward_lut=forward_lut, inverse_lut=inverse_lut),
+        translation_service=TranslatorService(lut=lut),
+    )
+
+
+def test_command_rewriter_forward_many_matches_forward(batch_command_rewriter):
+    from accml_lib.core.model.utils.command import TransactionCommand
+
+    c = batch_command_rewriter
+    cmds = [
+        Command(id=name, property="main_strength", value=val, behaviour_on_error=BehaviourOnError.stop)
+        for name, val in [("quad3", 0.1), ("quad1", -2), ("quad2", 7.5)]
+    ]
+    ncmds = c.forward_many(TransactionCommand(transaction=cmds))
+    assert [ncmd.id for ncmd in ncmds] == ["quad3_pc", "quad1_pc", "quad2_pc"]
+    for cmd, ncmd in zip(cmds, ncmds):
+        ref = c.forward(cmd)
+        assert ncmd.property == ref.property
+        assert ncmd.behaviour_on_error == ref.behaviour_on_error
+        assert ncmd.value == pytest.approx(ref.value, rel=1e-12)
+
+    # and back again
+    for cmd, icmd in zip(cmds, c.inverse_many(ncmds)):
+        assert icmd.id == cmd.id
+        assert icmd.value == pytest.approx(cmd.value, rel=1e-12)
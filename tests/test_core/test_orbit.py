@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from accml_lib.core.model.output.orbit import ArrayOrbit, BPMButtons, BPMPosition, BPMReading, Orbit
+
+
+@pytest.fixture
+def orbit():
+    return Orbit(
+        orbit=[
+            BPMReading(name=f"BPM{cnt}", pos=BPMPosition(x=cnt, y=-cnt), btns=BPMButtons(a=1, b=2, c=3, d=4 + cnt))
+            for cnt in range(5)
+        ]
+    )
+
+
+def test_array_orbit_round_trip(orbit):
+    ao = orbit.to_array_orbit()
+    assert ao.identifiers() == orbit.identifiers()
+    assert ao.x == pytest.approx(np.arange(5))
+    assert ao.y == pytest.approx(-np.arange(5))
+    for name in orbit.identifiers():
+        assert ao.get_element(name) == orbit.get_element(name)
+    assert ao.to_orbit() == orbit
+
+
+def test_array_orbit_views_do_not_copy(orbit):
+    ao = ArrayOrbit.from_orbit(orbit)
+    assert np.shares_memory(ao.x, ao.data)
+    assert np.shares_memory(ao.buttons, ao.data)
+    ao.x[2] = 42
+    assert ao.get_element("BPM2").pos.x == 42
+
+
+def test_array_orbit_from_arrays_marks_missing_channels():
+    ao = ArrayOrbit.from_arrays(["a", "b"], x=[1, 2], y=[3, 4])
+    assert np.isnan(ao.buttons).all()
+    assert ao.index("b") == 1
+    with pytest.raises(ValueError):
+        ArrayOrbit(names=["a"], data=np.zeros((6, 2)))
+
+
+def test_array_orbit_arithmetic_aligns_by_name(orbit):
+    ao = orbit.to_array_orbit()
+    # reversed order and one bpm missing
+    other = ArrayOrbit(names=ao.names[:0:-1], data=ao.data[:, :0:-1] * 2)
+
+    diff = other - ao
+    assert diff.names == other.names
+    assert diff.x == pytest.approx(other.x / 2)
+
+    diff = ao - other
+    assert np.isnan(diff.x[0])
+    assert diff.x[1:] == pytest.approx(-ao.x[1:])
+
+    assert (2 * ao).y == pytest.approx(2 * ao.y)
+    assert (-ao + ao).data == pytest.approx(np.zeros_like(ao.data))
+
+
+def test_orbit_list_form_arithmetic(orbit):
+    d = orbit - orbit
+    assert isinstance(d, Orbit)
+    assert d.get_element("BPM3").pos.x == 0
+
+
+def test_orbit_stat(orbit):
+    ao = orbit.to_array_orbit()
+    st = ao.stat()
+    assert st.x.mean == pytest.approx(2)
+    assert st.x.std == pytest.approx(np.std(np.arange(5)))
+    assert st.y.min == pytest.approx(-4)
+    assert st.y.max == pytest.approx(0)
+    assert orbit.stat() == st
+
+
+def test_array_orbit_equality_by_value():
+    ao = ArrayOrbit.from_arrays(["a", "b"], x=[1, np.nan], y=[3, 4])
+    assert ao == ArrayOrbit.from_arrays(["a", "b"], x=[1, np.nan], y=[3, 4])
+    assert ao != ArrayOrbit.from_arrays(["a", "b"], x=[1, 2], y=[3, 4])
+    assert ao != ArrayOrbit.from_arrays(["a", "c"], x=[1, np.nan], y=[3, 4])
+
+
+def test_stat_of_missing_channels_does_not_warn(recwarn):
+    ao = ArrayOrbit.from_arrays(["a", "b"], x=[np.nan, np.nan], y=[3, 4])
+    st = ao.stat()
+    assert np.isnan(st.x.mean) and np.isnan(st.x.max)
+    assert st.y.mean == pytest.approx(3.5)
+    assert np.isnan(ao.mean()[2:]).all()
+    assert np.isnan(ao.std()[2:]).all()
+    assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from accml_lib.core.bl.persistent_state_cache import JournalingStateCache, read_journal
+from accml_lib.core.model.utils.command import ReadCommand
+
+q1 = ReadCommand(id="Q1", property="current")
+q2 = ReadCommand(id="Q2", property="current")
+
+
+def test_reload_after_restart(tmp_path):
+    path = tmp_path / "references.journal"
+    with JournalingStateCache(name="test", path=path) as cache:
+        cache.set(q1, 1.5)
+        cache.set_many([(q2, np.arange(3.0))])
+        cache.snapshot("reference")
+        cache.set(q1, 3.0)
+        cache.restore("reference")
+
+    with JournalingStateCache(name="test", path=path) as cache:
+        assert cache.get(q1) == 1.5
+        np.testing.assert_equal(cache.get(q2), np.arange(3.0))
+        cache.clear()
+
+    with JournalingStateCache(name="test", path=path) as cache:
+        assert list(cache.keys()) == []
+
+
+def test_truncated_record_dropped(tmp_path):
+    path = tmp_path / "references.journal"
+    with JournalingStateCache(name="test", path=path) as cache:
+        cache.set(q1, 1.0)
+        cache.set(q2, 2.0)
+    size = path.stat().st_size
+    # crash while the last record was written
+    with open(path, "r+b") as fp:
+        fp.truncate(size - 3)
+
+    with JournalingStateCache(name="test", path=path) as cache:
+        assert cache.get(q1) == 1.0
+        assert cache.get(q2) is None
+        cache.set(q2, 4.0)
+
+    records, valid = read_journal(path)
+    assert valid == path.stat().st_size
+    assert records[-1] == ("set", q2, 4.0)
+
+
+def test_compact(tmp_path):
+    path = tmp_path / "references.journal"
+    with JournalingStateCache(name="test", path=path) as cache:
+        for value in range(100):
+            cache.set(q1, float(value))
+        cache.flush()
+        size = path.stat().st_size
+        cache.compact()
+        assert path.stat().st_size < size
+        cache.set(q2, 2.0)
+
+    records, _ = read_journal(path)
+    assert records == [("replace", {q1: 99.0}), ("set", q2, 2.0)]
+    with JournalingStateCache(name="test", path=path) as cache:
+        assert cache.get(q1) == 99.0 and cache.get(q2) == 2.0
+
+
+def test_closed_cache_refuses_changes(tmp_path):
+    cache = JournalingStateCache(name="test", path=tmp_path / "references.journal")
+    cache.close()
+    cache.close()
+    with pytest.raises(RuntimeError):
+        cache.set(q1, 1.0)
+    # memory still matches the journal
+    assert cache.get(q1) is None
+
+
+def test_writer_failure_refuses_further_changes(tmp_path):
+    cache = JournalingStateCache(name="test", path=tmp_path / "references.journal")
+    cache.set(q1, 1.0)
+    # can not be pickled by the writer thread
+    cache.set(q2, lambda: None)
+    with pytest.raises(RuntimeError):
+        cache.flush()
+    with pytest.raises(RuntimeError):
+        cache.set(q1, 2.0)
+    assert cache.get(q1) == 1.0
+    with pytest.raises(RuntimeError):
+        cache.close()
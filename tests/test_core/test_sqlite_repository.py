@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import pytest
+
+from accml_lib.core.config.config_service import ConfigService
+from accml_lib.core.config.sqlite_import import import_config, magnet_repository, main
+
+config_dir = Path(__file__).resolve().parents[2] / "src" / "accml_lib" / "custom" / "config_data" / "bessyii"
+
+
+@pytest.fixture(scope="module")
+def file_config():
+    cs = ConfigService(
+        magnet_path=config_dir / "magnets.yaml", pc_path=config_dir / "power_converters.yaml", cache_dir=None
+    )
+    cs.load()
+    return cs
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "config.sqlite"
+    import_config(config_dir / "magnets.yaml", config_dir / "power_converters.yaml", path)
+    return path
+
+
+def test_load_matches_files(db_path, file_config):
+    cs = ConfigService.from_sqlite(db_path)
+    cs.load()
+    assert cs.get_magnets() == file_config.get_magnets()
+    assert cs.get_quadrupoles() == file_config.get_quadrupoles()
+    assert cs.get_power_converter("Q1PDR") == file_config.get_power_converter("Q1PDR")
+    # nothing left open once loaded
+    assert cs.magnet_repo._connection is None
+    assert cs.pc_repo._connection is None
+
+
+def test_config_service_closes_repositories(db_path):
+    with ConfigService.from_sqlite(db_path) as cs:
+        cs.magnet_repo.get("Q1M2D1R")
+        assert cs.magnet_repo._connection is not None
+    assert cs.magnet_repo._connection is None
+
+
+def test_get_and_query(db_path, file_config):
+    with magnet_repository(db_path) as repo:
+        assert repo.get("Q1M2D1R") == file_config.get_magnet("Q1M2D1R")
+        with pytest.raises(KeyError):
+            repo.get("not_a_magnet")
+
+        assert repo.query(type="quadrupole") == list(file_config.get_quadrupoles())
+        assert repo.query(power_converter_id="Q1PTR", type="quadrupole") == list(
+            file_config.get_magnets_on_power_converter("Q1PTR")
+        )
+        assert len(repo.query(dev_id=["Q1M2D1R", "Q1M1T1R"])) == 2
+        with pytest.raises(ValueError):
+            repo.query(family_member="tune_correction")
+
+
+def test_reimport_replaces(db_path, file_config):
+    main([str(config_dir / "magnets.yaml"), str(config_dir / "power_converters.yaml"), str(db_path)])
+    with magnet_repository(db_path) as repo:
+        assert len(repo.load()) == len(file_config.get_magnets())
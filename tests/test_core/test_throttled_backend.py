@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from accml_lib.core.bl.throttled_backend import ThrottledBackend, TokenBucket
+from accml_lib.core.model.utils.command import BehaviourOnError, Command, ReadCommand
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def commands(prefix, n):
+    return [
+        Command(id=f"{prefix}:{i}", property="current", value=float(i), behaviour_on_error=BehaviourOnError.stop)
+        for i in range(n)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_global_limit(fake_backend):
+    backend = fake_backend
+    proxy = ThrottledBackend(backend=backend, max_in_flight=3)
+    await asyncio.gather(proxy.set_many(commands("IOC1", 20)), proxy.set("IOC2:0", "current", 1.0))
+    assert backend.max_in_flight == 3
+    assert proxy.statistics.operations == 21
+    # the single set and the second chunk wait for the first one
+    assert proxy.statistics.max_queued == 4
+    assert proxy.statistics.queued == 0 and proxy.statistics.in_flight == 0
+    assert proxy.statistics.max_wait > 0
+
+    r = await proxy.read_many([ReadCommand(id=cmd.id, property=cmd.property) for cmd in commands("IOC1", 5)])
+    assert r == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.mark.asyncio
+async def test_batches_forwarded_in_chunks(fake_backend, monkeypatch):
+    batches = []
+    set_many = fake_backend.set_many
+
+    async def recording_set_many(cmds):
+        batches.append([cmd.id for cmd in cmds])
+        return await set_many(cmds)
+
+    monkeypatch.setattr(fake_backend, "set_many", recording_set_many)
+    proxy = ThrottledBackend(backend=fake_backend, max_in_flight=4, prefix_limits={"IOC1": 2})
+    assert proxy.chunks(["IOC1:0", "PS:0", "IOC1:1", "IOC1:2", "PS:1"]) == [slice(0, 3), slice(3, 5)]
+
+    await proxy.set_many(commands("IOC1", 3) + commands("PS", 6))
+    assert batches == [["IOC1:0", "IOC1:1"], ["IOC1:2", "PS:0", "PS:1", "PS:2"], ["PS:3", "PS:4", "PS:5"]]
+    assert fake_backend.max_in_flight == 4
+
+    # without limits: one batch, e.g. one transaction of the simulator
+    batches.clear()
+    await ThrottledBackend(backend=fake_backend).set_many(commands("IOC1", 10))
+    assert len(batches) == 1
+
+
+@pytest.mark.asyncio
+async def test_prefix_limits_longest_prefix_wins(fake_backend):
+    backend = fake_backend
+    proxy = ThrottledBackend(backend=backend, prefix_limits={"IOC": 4, "IOC1": 1})
+    assert proxy.prefix_of("IOC1:3") == "IOC1"
+    assert proxy.prefix_of("IOC2:3") == "IOC"
+    assert proxy.prefix_of("PS:3") is None
+
+    await proxy.set_many(commands("IOC1", 5) + commands("IOC2", 10) + commands("PS", 10))
+    assert backend.max_per_prefix["IOC1"] == 1
+    assert backend.max_per_prefix["IOC2"] == 4
+    assert backend.max_per_prefix["PS"] == 10
+
+
+@pytest.mark.asyncio
+async def test_errors_release_slot(fake_backend):
+    fake_backend.fail = True
+    proxy = ThrottledBackend(backend=fake_backend, max_in_flight=1)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            await proxy.read("IOC1:0", "current")
+    assert proxy.statistics.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket(monkeypatch, clock):
+    sleeps = []
+
+    async def fake_sleep(dt):
+        sleeps.append(dt)
+        clock.now += dt
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+    for _ in range(4):
+        await bucket.acquire()
+    # burst of two, then one every 100 ms
+    assert sleeps == pytest.approx([0.1, 0.1])
+    assert clock.now == pytest.approx(0.2)
+
+
+def test_invalid_limits(fake_backend):
+    with pytest.raises(ValueError):
+        ThrottledBackend(backend=fake_backend, max_in_flight=0)
+    with pytest.raises(ValueError):
+        ThrottledBackend(backend=fake_backend, prefix_limits={"IOC": 0})
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from accml_lib.custom.pyat_simulator.rw_lock import ReaderWriterLock
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_readers_share_writer_excludes():
+    lock = ReaderWriterLock()
+    events = []
+
+    async def reader(name):
+        async with lock.reader():
+            events.append(("in", name, lock.readers))
+            await asyncio.sleep(0.01)
+
+    async def writer():
+        async with lock.writer():
+            assert lock.readers == 0
+            events.append(("in", "writer", lock.readers))
+
+    await asyncio.gather(reader("r1"), reader("r2"), writer())
+    assert events[:2] == [("in", "r1", 1), ("in", "r2", 2)]
+    assert events[2] == ("in", "writer", 0)
+    assert lock.statistics.read_acquisitions == 2
+    assert lock.statistics.write_acquisitions == 1
+    assert lock.statistics.write_wait_max > 0
+
+
+@pytest.mark.asyncio
+async def test_waiting_writer_blocks_new_readers_and_readers_go_next():
+    lock = ReaderWriterLock()
+
+    await lock.acquire_read()
+    w1 = asyncio.ensure_future(lock.acquire_write())
+    await settle()
+    # a writer waits: new reader has to wait too
+    r2 = asyncio.ensure_future(lock.acquire_read())
+    w2 = asyncio.ensure_future(lock.acquire_write())
+    await settle()
+    assert not w1.done() and not r2.done()
+
+    lock.release_read()
+    await settle()
+    assert w1.done() and not r2.done()
+
+    # readers waiting before the next writer get in first
+    lock.release_write()
+    await settle()
+    assert r2.done() and not w2.done()
+    lock.release_read()
+    await settle()
+    assert w2.done()
+    lock.release_write()
+    assert not lock.locked_for_writing and lock.readers == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_writer_lets_readers_in():
+    lock = ReaderWriterLock()
+    await lock.acquire_read()
+    w = asyncio.ensure_future(lock.acquire_write())
+    await settle()
+    r = asyncio.ensure_future(lock.acquire_read())
+    await settle()
+    assert not r.done()
+
+    w.cancel()
+    await settle()
+    assert r.done()
+    assert lock.readers == 2
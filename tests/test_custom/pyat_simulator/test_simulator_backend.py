@@ -0,0 +1,384 @@
+"""pyat simulator backend on a small ring, no facility data required"""
+import numpy as np
+import pytest
+
+from accml_lib.core.model.utils.command import BehaviourOnError, Command, ReadCommand
+
+at = pytest.importorskip("at")
+pytest.importorskip("transitions")
+
+
+def small_ring(n_cells: int = 8):
+    elements = []
+    for cnt in range(n_cells):
+        elements += [
+            at.Drift(f"D1C{cnt}", 0.5),
+            at.Quadrupole(f"QF{cnt}", 0.3, 1.2),
+            # carries the corrector kicks
+            at.Sextupole(f"SF{cnt}", 0.1, 0.0, KickAngle=[0.0, 0.0]),
+            at.Monitor(f"BPMA{cnt}"),
+            at.Drift(f"D2C{cnt}", 1.0),
+            at.Quadrupole(f"QD{cnt}", 0.3, -1.2),
+            at.Monitor(f"BPMB{cnt}"),
+            at.Drift(f"D3C{cnt}", 0.5),
+            at.Dipole(f"B{cnt}", 1.0, 2 * np.pi / n_cells),
+        ]
+    return at.Lattice(elements, name="small ring", energy=1.7e9, periodicity=1)
+
+
+@pytest.fixture
+def backend():
+    from accml_lib.custom.pyat_simulator.accelerator_simulator import PyATAcceleratorSimulator
+    from accml_lib.custom.pyat_simulator.simulator_backend import SimulatorBackend
+
+    return SimulatorBackend(name="small_ring", acc=PyATAcceleratorSimulator(at_lattice=small_ring()))
+
+
+@pytest.mark.asyncio
+async def test_set_many_changes_state_once(backend):
+    tune = await backend.read("tune", "transversal")
+    cmds = [
+        Command(id=name, property="main_strength", value=1.25, behaviour_on_error=BehaviourOnError.stop)
+        for name in ("QF0", "QF3", "QF5")
+    ]
+    await backend.set_many(cmds)
+    assert backend.model.is_pending()
+
+    r = await backend.read_many(
+        [ReadCommand(id="QF3", property="main_strength"), ReadCommand(id="tune", property="transversal")]
+    )
+    assert r[0] == pytest.approx(1.25)
+    assert r[1].x != pytest.approx(tune.x, abs=1e-6)
+
+
+def test_simulator_indexes_names_and_caches_proxies():
+    from accml_lib.custom.pyat_simulator.accelerator_simulator import PyATAcceleratorSimulator
+
+    ring = small_ring()
+    sim = PyATAcceleratorSimulator(at_lattice=ring)
+    assert sim.index_of("QF3") == 28
+    with pytest.raises(KeyError):
+        sim.index_of("no such element")
+
+    proxy = sim.get("QF3")
+    assert sim.get("QF3") is proxy
+    # proxies refer to the elements of the lattice
+    (element,) = proxy._obj
+    assert element is ring[28]
+
+    other = small_ring()
+    other[28].update(K=2.0)
+    sim.acc = other
+    assert sim.get("QF3") is not proxy
+    assert sim.get("QF3").peek("main_strength") == pytest.approx(2.0)
+
+    with pytest.raises(ValueError):
+        sim.get("QX3")
+
+
+def test_simulator_caches_add_on_proxies():
+    from accml_lib.custom.pyat_simulator.accelerator_simulator import PyATAcceleratorSimulator
+    from accml_lib.custom.pyat_simulator.element_proxies import KickAngleCorrectorProxy
+
+    ring = small_ring()
+    sim = PyATAcceleratorSimulator(at_lattice=ring)
+    proxy = sim.get("HSF2")
+    assert isinstance(proxy, KickAngleCorrectorProxy)
+    assert proxy.correction_planes == "horizontal"
+    assert proxy._obj is ring[sim.index_of("SF2")]
+    assert sim.get("HSF2") is proxy
+    sim.invalidate()
+    assert sim.get("HSF2") is not proxy
+
+
+@pytest.mark.asyncio
+async def test_set_transaction_vectorised_and_per_element_paths(backend):
+    from accml_lib.core.model.utils.command import TransactionCommand
+
+    ring = backend.acc.acc
+    transaction = TransactionCommand(
+        transaction=[
+            Command(id="QF1", property="main_strength", value=1.3, behaviour_on_error=BehaviourOnError.stop),
+            Command(id="QD1", property="main_strength", value=-1.1, behaviour_on_error=BehaviourOnError.stop),
+            Command(id="SF4", property="main_strength", value=2.5, behaviour_on_error=BehaviourOnError.stop),
+            # not vectorised: handled by the element proxy
+            Command(id="SF2", property="x", value=1e-4, behaviour_on_error=BehaviourOnError.stop),
+        ]
+    )
+    await backend.read("tune", "transversal")
+    await backend.set_transaction(transaction)
+    assert backend.model.is_pending()
+    assert backend.tune is None
+
+    sim = backend.acc
+    assert ring[sim.index_of("QF1")].K == pytest.approx(1.3)
+    assert ring[sim.index_of("QD1")].K == pytest.approx(-1.1)
+    assert ring[sim.index_of("SF4")].H == pytest.approx(2.5)
+    assert ring[sim.index_of("SF2")].T1[0] == pytest.approx(-1e-4)
+
+    with pytest.raises(ValueError):
+        await backend.set_transaction(
+            [Command(id="QF1", property="main_strength", value=np.nan, behaviour_on_error=BehaviourOnError.stop)]
+        )
+    # checked before anything is written, as the per element path does
+    with pytest.raises(ValueError):
+        await backend.set_transaction(
+            [
+                Command(id="QF1", property="main_strength", value=1.0, behaviour_on_error=BehaviourOnError.stop),
+                Command(id="SF2", property="x", value=np.inf, behaviour_on_error=BehaviourOnError.stop),
+            ]
+        )
+    assert ring[sim.index_of("QF1")].K == pytest.approx(1.3)
+    with pytest.raises(ValueError):
+        await backend.set("QF1", "main_strength", np.nan)
+
+
+@pytest.mark.asyncio
+async def test_calculation_does_not_block_event_loop(backend):
+    import asyncio
+    import time
+
+    sim = backend.acc
+    orig_get_optics = sim.get_optics
+    calculating = []
+
+    def slow_get_optics():
+        calculating.append(True)
+        time.sleep(0.2)
+        return orig_get_optics()
+
+    sim.get_optics = slow_get_optics
+    ticks = []
+
+    async def ticker():
+        while not calculating:
+            await asyncio.sleep(0.001)
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    start = time.monotonic()
+    tune, _ = await asyncio.gather(backend.read("tune", "transversal"), ticker())
+    assert len(ticks) == 5
+    # ticked while the calculation was running
+    assert ticks[-1] - start < 0.2
+    assert backend.model.is_finished()
+
+    # a set waits for a calculation in progress
+    backend.model.changed()
+    calculation = asyncio.ensure_future(backend.read("tune", "transversal"))
+    while not backend.model.is_executing():
+        await asyncio.sleep(0.001)
+    await backend.set("QF0", "main_strength", 1.25)
+    assert calculation.done()
+    assert (await calculation).x == pytest.approx(tune.x)
+    assert backend.model.is_pending()
+    backend.close()
+
+
+def count_calls(obj, method: str) -> list:
+    """replace obj.method by a wrapper appending to the returned list"""
+    orig = getattr(obj, method)
+    calls = []
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return orig(*args, **kwargs)
+
+    setattr(obj, method, counted)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_observables_share_one_optics_calculation(backend):
+    sim = backend.acc
+    optics_calls = count_calls(sim, "get_optics")
+    chromaticity_calls = count_calls(sim, "get_chromaticity")
+
+    await backend.set("QF2", "main_strength", 1.22)
+    tune = await backend.read("tune", "transversal")
+    beta, dispersion, closed_orbit = await backend.read_many(
+        [ReadCommand(id="twiss", property=prop) for prop in ("beta", "dispersion", "closed_orbit")]
+    )
+    assert len(optics_calls) == 1
+    # only computed when requested
+    assert len(chromaticity_calls) == 0
+
+    chromaticity = await backend.read("chromaticity", "transversal")
+    await backend.read("chromaticity", "transversal")
+    assert len(chromaticity_calls) == 1
+    assert len(optics_calls) == 1
+    assert chromaticity.x < 0 and chromaticity.y < 0
+
+    # one row per bpm
+    names = await backend.read("twiss", "names")
+    assert names == tuple(f"BPM{plane}{cnt}" for cnt in range(8) for plane in "AB")
+    assert beta.shape == (16, 2)
+    assert dispersion.shape == (16, 4)
+    assert closed_orbit.shape == (16, 6)
+    assert np.all(beta > 0)
+    assert 0 < tune.x < 1 and 0 < tune.y < 1
+
+    # shared result: must not be changed by a consumer
+    with pytest.raises(ValueError):
+        beta[0, 0] = 1.0
+
+    await backend.set("QF2", "main_strength", 1.2)
+    await backend.read("tune", "transversal")
+    assert len(optics_calls) == 2
+    await backend.read("chromaticity", "transversal")
+    assert len(chromaticity_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_optics_locations():
+    from accml_lib.custom.pyat_simulator.accelerator_simulator import PyATAcceleratorSimulator
+    from accml_lib.custom.pyat_simulator.simulator_backend import SimulatorBackend
+
+    ring = small_ring()
+    sim = PyATAcceleratorSimulator(at_lattice=ring, optics_locations=["QF1", "QD1", "QF5"])
+    refpts = sim.optics_refpts
+    assert list(refpts) == [sim.index_of(name) for name in ("QF1", "QD1", "QF5")]
+    assert sim.optics_refpts is refpts
+
+    backend = SimulatorBackend(name="small_ring", acc=sim)
+    assert await backend.read("twiss", "names") == ("QF1", "QD1", "QF5")
+    s = await backend.read("twiss", "s")
+    assert s == pytest.approx(ring.get_s_pos(refpts))
+
+    # default: all monitors, recomputed for a new lattice
+    sim = PyATAcceleratorSimulator(at_lattice=ring)
+    assert len(sim.optics_refpts) == 16
+    sim.acc = small_ring(n_cells=4)
+    assert len(sim.optics_refpts) == 8
+
+
+@pytest.mark.asyncio
+async def test_orbit_follows_corrector_kick(backend):
+    from accml_lib.core.model.output.orbit import ArrayOrbit
+
+    optics_calls = count_calls(backend.acc, "get_optics")
+    orbit = await backend.read("orbit", "transversal")
+    assert isinstance(orbit, ArrayOrbit)
+    assert orbit.names == tuple(f"BPM{plane}{cnt}" for cnt in range(8) for plane in "AB")
+    # ideal ring
+    assert orbit.positions == pytest.approx(0.0, abs=1e-6)
+    assert np.all(np.isnan(orbit.buttons))
+
+    await backend.set("SF2", "x_kick", 1e-5)
+    kicked = await backend.read("orbit", "transversal")
+    await backend.read("orbit", "transversal")
+    await backend.read("tune", "transversal")
+    assert len(optics_calls) == 2
+    # 10 urad: some 10 um, bpm data in nm
+    assert np.max(np.abs(kicked.x)) > 1e3
+    assert kicked.y == pytest.approx(0.0, abs=1e-6)
+
+    await backend.set("SF2", "y_kick", 1e-5)
+    both = await backend.read("orbit", "transversal")
+    assert len(optics_calls) == 3
+    assert np.max(np.abs(both.y)) > 1e3
+    assert both.x == pytest.approx(kicked.x, rel=1e-3, abs=1.0)
+
+
+@pytest.fixture
+def linear_backend():
+    from accml_lib.custom.pyat_simulator.accelerator_simulator import PyATAcceleratorSimulator
+    from accml_lib.custom.pyat_simulator.linear_response import Actuator, LinearResponse
+    from accml_lib.custom.pyat_simulator.simulator_backend import SimulatorBackend
+
+    response = LinearResponse(
+        [
+            Actuator(id="QF1", property="main_strength", step=1e-4, trust_radius=5e-3),
+            Actuator(id="QD4", property="main_strength", step=1e-4, trust_radius=5e-3),
+            Actuator(id="SF2", property="x_kick", step=1e-6, trust_radius=5e-5),
+        ]
+    )
+    return SimulatorBackend(
+        name="small_ring", acc=PyATAcceleratorSimulator(at_lattice=small_ring()), linear_response=response
+    )
+
+
+@pytest.mark.asyncio
+async def test_linear_response_predicts_within_trust_region(linear_backend):
+    backend = linear_backend
+    response = backend.linear_response
+    optics_calls = count_calls(backend.acc, "get_optics")
+
+    # first read: optics at the reference and one per actuator
+    tune0 = await backend.read("tune", "transversal")
+    assert len(optics_calls) == 4
+    assert response.valid and response.refreshes == 1
+
+    await backend.set_many(
+        [
+            Command(id="QF1", property="main_strength", value=1.202, behaviour_on_error=BehaviourOnError.stop),
+            Command(id="QD4", property="main_strength", value=-1.201, behaviour_on_error=BehaviourOnError.stop),
+        ]
+    )
+    await backend.set("SF2", "x_kick", 2e-5)
+    tune, orbit = await backend.read_many(
+        [ReadCommand(id="tune", property="transversal"), ReadCommand(id="orbit", property="transversal")]
+    )
+    assert len(optics_calls) == 4
+    assert response.predictions == 2
+    assert backend.model.is_pending()
+    assert tune.x != pytest.approx(tune0.x, abs=1e-5)
+
+    # compare to the full calculation: twiss is never predicted
+    exact = await backend.read("twiss", "closed_orbit")
+    assert len(optics_calls) == 5
+    exact_tune = backend.tune
+    assert tune.x == pytest.approx(exact_tune.x, abs=1e-5)
+    assert tune.y == pytest.approx(exact_tune.y, abs=1e-5)
+    assert orbit.x == pytest.approx(exact[:, 0] * 1e9, rel=1e-2, abs=10.0)
+    assert np.max(np.abs(orbit.x)) > 1e3
+
+    # calculated for this state: no prediction required
+    assert (await backend.read("tune", "transversal")) == exact_tune
+    assert response.predictions == 2
+
+
+@pytest.mark.asyncio
+async def test_linear_response_recomputes_outside_trust_region(linear_backend):
+    backend = linear_backend
+    response = backend.linear_response
+    optics_calls = count_calls(backend.acc, "get_optics")
+    await backend.read("tune", "transversal")
+    assert len(optics_calls) == 4
+
+    # step of 4 trust radii
+    await backend.set("QF1", "main_strength", 1.22)
+    tune = await backend.read("tune", "transversal")
+    # full calculation, refreshed at the new state
+    assert len(optics_calls) == 8
+    assert response.refreshes == 2 and response.predictions == 0
+    assert backend.model.is_finished()
+    assert tune == backend.tune
+    assert backend.acc.get("QF1").peek("main_strength") == pytest.approx(1.22)
+
+    # not an actuator: the linear response can not tell
+    await backend.set("QF2", "main_strength", 1.21)
+    assert not response.valid
+    await backend.read("orbit", "transversal")
+    assert len(optics_calls) == 12
+    assert response.predictions == 0
+
+    # on demand, e.g. after a change made behind the backend's back
+    await backend.refresh_linear_response()
+    assert len(optics_calls) == 15
+    assert response.refreshes == 4
+
+
+def test_blocking_tune_for_callers_without_event_loop(backend):
+    with pytest.deprecated_call():
+        tune = backend.get_tune_sync()
+    with pytest.deprecated_call():
+        assert backend.result_elements["tune"].get_sync("transversal") == tune
+    backend.close()
+
+
+@pytest.mark.asyncio
+async def test_blocking_tune_refused_within_event_loop(backend):
+    with pytest.deprecated_call(), pytest.raises(RuntimeError):
+        backend.get_tune_sync()